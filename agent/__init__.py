@@ -0,0 +1,15 @@
+"""
+FoodCartOS Cart Agent
+
+Runs on each cart's Raspberry Pi. Readings (transactions, quality checks,
+GPS pings) are written to a local SQLite queue first, so nothing is lost
+in a cellular dead zone, and synced to the API in batches whenever the
+connection allows:
+- offline_queue.py: the offline queue (SQLite in WAL mode)
+- sync.py: batched upload to /webhooks/agent/sync with backoff
+
+Run it with `python -m agent`; sensor scripts queue readings with
+`python -m agent enqueue TABLE` (JSON lines on stdin). Settings come
+from the same environment as the API (AGENT_API_URL, AGENT_HARDWARE_ID,
+SYNC_INTERVAL_SECONDS, OFFLINE_QUEUE_MAX_SIZE, AGENT_DB_PATH).
+"""
@@ -0,0 +1,98 @@
+"""
+Cart agent entry point: `python -m agent`, run by the foodcartos-agent
+systemd service.
+
+Sensor scripts queue readings with `python -m agent enqueue TABLE`,
+writing one JSON object per line to its stdin, e.g.
+
+    echo '{"latitude": 38.3566, "longitude": -121.9877}' | python -m agent enqueue location_pings
+
+Each line is committed to the offline queue as it arrives; the service
+syncs it from there.
+"""
+
+import argparse
+import json
+import signal
+import sqlite3
+import sys
+import threading
+from typing import Optional, Sequence, TextIO
+
+import httpx
+
+from agent.offline_queue import TABLES, OfflineQueue
+from agent.sync import Syncer
+from app.config import settings
+
+
+def enqueue(queue: OfflineQueue, table: str, lines: TextIO) -> int:
+    """Queue one reading per JSON line; returns how many lines were rejected."""
+    rejected = 0
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            print(f"line {number}: expected a JSON object", file=sys.stderr)
+            rejected += 1
+            continue
+        try:
+            queue.add(table, [record])
+        except (sqlite3.InterfaceError, sqlite3.ProgrammingError) as exc:
+            # A value SQLite can't store, e.g. an object where a number goes
+            print(f"line {number}: {exc}", file=sys.stderr)
+            rejected += 1
+    return rejected
+
+
+def run() -> int:
+    if not settings.AGENT_API_URL or not settings.AGENT_HARDWARE_ID:
+        print("AGENT_API_URL and AGENT_HARDWARE_ID must be set", file=sys.stderr)
+        return 1
+
+    queue = OfflineQueue(settings.AGENT_DB_PATH, settings.OFFLINE_QUEUE_MAX_SIZE)
+    client = httpx.Client(base_url=settings.AGENT_API_URL, timeout=30, verify=settings.VERIFY_SSL)
+    syncer = Syncer(
+        queue,
+        client,
+        settings.AGENT_HARDWARE_ID,
+        interval=settings.SYNC_INTERVAL_SECONDS,
+        batch_size=settings.AGENT_SYNC_BATCH_SIZE,
+        batch_bytes=settings.AGENT_SYNC_BATCH_BYTES,
+        backoff=settings.AGENT_SYNC_BACKOFF_SECONDS,
+        backoff_max=settings.AGENT_SYNC_BACKOFF_MAX_SECONDS,
+    )
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    try:
+        syncer.run(stop)
+    finally:
+        client.close()
+        queue.close()
+    return 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m agent", description="FoodCartOS cart agent")
+    commands = parser.add_subparsers(dest="command")
+    queue_parser = commands.add_parser("enqueue", help="Queue JSON readings from stdin")
+    queue_parser.add_argument("table", choices=sorted(TABLES))
+    args = parser.parse_args(argv)
+
+    if args.command != "enqueue":
+        return run()
+    queue = OfflineQueue(settings.AGENT_DB_PATH, settings.OFFLINE_QUEUE_MAX_SIZE)
+    try:
+        return 1 if enqueue(queue, args.table, sys.stdin) else 0
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
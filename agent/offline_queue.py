@@ -0,0 +1,221 @@
+"""
+Offline Queue
+
+The cart's local store: every reading is committed here before any
+attempt to send it, and stays until the API acknowledges it.
+
+SQLite runs in WAL mode, so the sync loop reads batches while sensors
+keep writing, and with synchronous=FULL a committed reading survives the
+cart's power being cut. Inserts go through `executemany` with one fixed
+statement per table, which sqlite3 prepares once per connection.
+
+The three tables are the ones in docs/architecture, each with a `synced`
+flag. Acknowledged rows are kept (they're handy when debugging a cart
+with `sqlite3 cart.db`) until space is needed: past max_size rows in
+total (a running count, so adds don't scan the tables), the oldest rows
+are evicted in this order:
+1. synced rows of any table; they're already in the cloud
+2. location pings; trajectories tolerate gaps
+3. quality checks
+4. transactions; Square keeps its own copy, so these go last
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY,
+    square_id TEXT,
+    amount DECIMAL(10,2),
+    items JSON,
+    timestamp DATETIME,
+    synced BOOLEAN DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS quality_checks (
+    id TEXT PRIMARY KEY,
+    check_type TEXT,
+    photo_path TEXT,
+    employee_id TEXT,
+    timestamp DATETIME,
+    synced BOOLEAN DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS location_pings (
+    id TEXT PRIMARY KEY,
+    latitude DECIMAL(10,8),
+    longitude DECIMAL(11,8),
+    timestamp DATETIME,
+    synced BOOLEAN DEFAULT FALSE
+);
+
+CREATE INDEX IF NOT EXISTS transactions_unsynced ON transactions (synced);
+CREATE INDEX IF NOT EXISTS quality_checks_unsynced ON quality_checks (synced);
+CREATE INDEX IF NOT EXISTS location_pings_unsynced ON location_pings (synced);
+"""
+
+# table -> columns besides id and synced, in insert order
+TABLES: Dict[str, Tuple[str, ...]] = {
+    "transactions": ("square_id", "amount", "items", "timestamp"),
+    "quality_checks": ("check_type", "photo_path", "employee_id", "timestamp"),
+    "location_pings": ("latitude", "longitude", "timestamp"),
+}
+JSON_COLUMNS = {"items"}
+# Unsynced rows are evicted from the first table in this list first
+EVICTION_ORDER = ("location_pings", "quality_checks", "transactions")
+
+
+def _insert_sql(table: str) -> str:
+    columns = ("id", *TABLES[table])
+    placeholders = ", ".join("?" for _ in columns)
+    # A reading re-queued after a crash keeps its first copy
+    return f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+INSERT_SQL = {table: _insert_sql(table) for table in TABLES}
+
+
+class OfflineQueue:
+    """Readings waiting to be synced, in a local SQLite database."""
+
+    def __init__(self, path: str, max_size: int):
+        self.max_size = max_size
+        self.evicted = 0  # Unsynced rows dropped to stay under max_size
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # One connection shared by the sensor and sync threads, one at a time
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+        # Rows in all tables as far as this process knows; other processes
+        # may write the same file, so it's checked before evicting
+        self._rows = self._count()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ===========================================
+    # Writes
+    # ===========================================
+
+    def add(self, table: str, records: Iterable[Dict[str, Any]]) -> int:
+        """Queue readings for `table` in one transaction; returns how many were new."""
+        columns = TABLES[table]
+        rows = []
+        for record in records:
+            row: List[Any] = [record.get("id") or uuid.uuid4().hex]
+            for column in columns:
+                value = record.get(column)
+                if column in JSON_COLUMNS and value is not None:
+                    value = json.dumps(value)
+                elif column == "timestamp" and value is None:
+                    value = datetime.now(timezone.utc).isoformat()
+                row.append(value)
+            rows.append(row)
+        if not rows:
+            return 0
+        with self._lock, self._transaction():
+            before = self._conn.total_changes
+            self._conn.executemany(INSERT_SQL[table], rows)
+            added = self._conn.total_changes - before
+            self._rows += added
+            self._evict()
+        return added
+
+    def mark_synced(self, table: str, ids: Sequence[str]) -> None:
+        """Flag acknowledged rows as synced, all in one transaction."""
+        with self._lock, self._transaction():
+            self._conn.executemany(
+                f"UPDATE {table} SET synced = TRUE WHERE id = ?", [(row_id,) for row_id in ids]
+            )
+
+    def _evict(self) -> None:
+        if self._rows <= self.max_size:
+            return
+        self._rows = self._count()
+        excess = self._rows - self.max_size
+        for table in TABLES:
+            if excess <= 0:
+                break
+            deleted = self._delete_oldest(table, True, excess)
+            self._rows -= deleted
+            excess -= deleted
+        for table in EVICTION_ORDER:
+            if excess <= 0:
+                break
+            deleted = self._delete_oldest(table, False, excess)
+            if deleted:
+                self.evicted += deleted
+                logger.warning("offline_queue_evicted", table=table, rows=deleted)
+            self._rows -= deleted
+            excess -= deleted
+
+    def _delete_oldest(self, table: str, synced: bool, limit: int) -> int:
+        cursor = self._conn.execute(
+            f"DELETE FROM {table} WHERE rowid IN "
+            f"(SELECT rowid FROM {table} WHERE synced = ? ORDER BY rowid LIMIT ?)",
+            (synced, limit),
+        )
+        return cursor.rowcount
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    # ===========================================
+    # Reads
+    # ===========================================
+
+    def _count(self, synced: Optional[bool] = None) -> int:
+        where = "" if synced is None else f" WHERE synced = {int(synced)}"
+        return sum(
+            self._conn.execute(f"SELECT COUNT(*) FROM {table}{where}").fetchone()[0]
+            for table in TABLES
+        )
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._count(synced=False)
+
+    def pending(self, table: str, max_records: int, max_bytes: int) -> List[Dict[str, Any]]:
+        """The oldest unsynced rows of `table`, up to max_records or ~max_bytes of JSON."""
+        columns = ("id", *TABLES[table])
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(columns)} FROM {table} "
+                f"WHERE synced = FALSE ORDER BY rowid LIMIT ?",
+                (max_records,),
+            ).fetchall()
+        batch: List[Dict[str, Any]] = []
+        size = 2  # []
+        for row in rows:
+            record = dict(zip(columns, row))
+            for column in JSON_COLUMNS.intersection(record):
+                if record[column] is not None:
+                    record[column] = json.loads(record[column])
+            size += len(json.dumps(record)) + 2  # ", "
+            if batch and size > max_bytes:
+                break  # A single oversized record still goes, alone
+            batch.append(record)
+        return batch
@@ -0,0 +1,137 @@
+"""
+Sync
+
+Uploads the offline queue to POST /webhooks/agent/sync, one table at a
+time (transactions first), in batches bounded by record count and JSON
+size so a long backlog never turns into one huge request over LTE.
+
+A batch is marked synced only after the API answers 2xx with every
+record processed; until then it stays queued and is sent again. After a
+failure (or an error reading or updating the local queue) the loop backs
+off exponentially (with jitter, so carts that lost signal together don't
+retry together), and never retries sooner than a 429's Retry-After. Once a sync succeeds the regular interval resumes.
+"""
+
+import random
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+import httpx
+import structlog
+
+from agent.offline_queue import OfflineQueue
+
+logger = structlog.get_logger(__name__)
+
+# Queue table -> sync `type` the API expects, in upload order
+SYNC_TYPES = {
+    "transactions": "transactions",
+    "quality_checks": "quality",
+    "location_pings": "gps",
+}
+
+
+class SyncFailed(Exception):
+    """A batch wasn't acknowledged; `retry_after` is the API's hint, if any."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
+
+
+class Syncer:
+    """Drains an OfflineQueue to the API on an interval, backing off on failure."""
+
+    def __init__(
+        self,
+        queue: OfflineQueue,
+        client: httpx.Client,
+        hardware_id: str,
+        interval: float,
+        batch_size: int,
+        batch_bytes: int,
+        backoff: float,
+        backoff_max: float,
+    ):
+        self.queue = queue
+        self.client = client
+        self.hardware_id = hardware_id
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.failures = 0  # Consecutive failed syncs
+
+    def send(self, table: str, batch: List[Dict[str, Any]]) -> None:
+        """POST one batch; raises SyncFailed unless the API acknowledged all of it."""
+        body = {"hardware_id": self.hardware_id, "type": SYNC_TYPES[table], "data": batch}
+        try:
+            response = self.client.post("/webhooks/agent/sync", json=body)
+        except httpx.HTTPError as exc:
+            raise SyncFailed(f"{type(exc).__name__}: {exc}") from exc
+        if not response.is_success:
+            raise SyncFailed(f"HTTP {response.status_code}", _retry_after(response))
+        try:
+            processed = response.json().get("records_processed")
+        except (ValueError, AttributeError):
+            processed = None
+        if processed != len(batch):
+            raise SyncFailed(f"{processed} of {len(batch)} records acknowledged")
+
+    def sync_once(self) -> int:
+        """Send everything queued, batch by batch; returns how many records were synced."""
+        synced = 0
+        for table in SYNC_TYPES:
+            while True:
+                batch = self.queue.pending(table, self.batch_size, self.batch_bytes)
+                if not batch:
+                    break
+                self.send(table, batch)
+                self.queue.mark_synced(table, [record["id"] for record in batch])
+                synced += len(batch)
+        return synced
+
+    def next_delay(self, retry_after: Optional[float] = None) -> float:
+        """Seconds until the next attempt, given the consecutive failures so far."""
+        if not self.failures:
+            return self.interval
+        ceiling = min(self.backoff_max, self.backoff * 2 ** (self.failures - 1))
+        delay = random.uniform(ceiling / 2, ceiling)
+        return max(delay, retry_after or 0.0)
+
+    def _pending_count(self) -> Optional[int]:
+        try:
+            return self.queue.pending_count()
+        except sqlite3.Error:
+            return None
+
+    def run(self, stop: threading.Event) -> None:
+        """Sync until `stop` is set."""
+        while not stop.is_set():
+            retry_after = None
+            try:
+                synced = self.sync_once()
+            except (SyncFailed, sqlite3.Error) as exc:
+                self.failures += 1
+                if isinstance(exc, SyncFailed):
+                    retry_after = exc.retry_after
+                logger.warning(
+                    "agent_sync_failed",
+                    error=str(exc),
+                    failures=self.failures,
+                    pending=self._pending_count(),
+                )
+            else:
+                if synced:
+                    logger.info("agent_synced", records=synced, after_failures=self.failures)
+                self.failures = 0
+            stop.wait(self.next_delay(retry_after))
@@ -4,7 +4,7 @@ FoodCartOS Configuration
 Loads configuration from environment variables with sensible defaults.
 """
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -37,6 +37,9 @@ class Settings(BaseSettings):
             return ["http://localhost:3000", "http://127.0.0.1:3000"]
         return [self.FRONTEND_URL]
 
+    # Response compression (brotli if installed and accepted, else gzip)
+    COMPRESSION_MIN_BYTES: int = 1024  # Smaller responses aren't worth compressing
+
     # Supabase
     SUPABASE_URL: str = ""
     SUPABASE_ANON_KEY: str = ""
@@ -44,6 +47,27 @@ class Settings(BaseSettings):
     SUPABASE_ACCESS_TOKEN: Optional[str] = None
     DATABASE_URL: Optional[str] = None
     DATABASE_SCHEMA: str = "foodcartos"
+    SUPABASE_JWT_SECRET: str = ""  # Legacy HS256 projects; others verify via JWKS
+
+    # Database pool (asyncpg; DATABASE_URL must keep prepared statements,
+    # i.e. a direct or session-mode pooler connection)
+    DATABASE_POOL_MIN_SIZE: int = 2
+    DATABASE_POOL_MAX_SIZE: int = 10
+    DATABASE_ACQUIRE_TIMEOUT_SECONDS: float = 5.0
+    DATABASE_COMMAND_TIMEOUT_SECONDS: float = 30.0
+    DATABASE_IDLE_LIFETIME_SECONDS: float = 300.0  # Close connections idle this long
+    DATABASE_RLS_ROLE: str = "authenticated"  # Role queries run as under RLS
+
+    # Read replica (optional): read-only routes use it once it has caught up
+    DATABASE_REPLICA_URL: Optional[str] = None
+    DATABASE_REPLICA_MAX_LAG_SECONDS: float = 10.0  # Beyond this, all reads go to the primary
+    DATABASE_REPLICA_CHECK_SECONDS: float = 1.0  # Replication position sampling interval
+
+    # Auth (access token verification)
+    AUTH_JWT_AUDIENCE: str = "authenticated"
+    AUTH_JWKS_REFRESH_SECONDS: int = 600
+    AUTH_JWKS_MIN_REFRESH_SECONDS: int = 60  # On unknown key id, refetch at most this often
+    AUTH_TOKEN_CACHE_SIZE: int = 10000  # Verified tokens kept until expiry
 
     # Square
     SQUARE_ACCESS_TOKEN: str = ""
@@ -61,6 +85,12 @@ class Settings(BaseSettings):
     # Weather
     OPENWEATHER_API_KEY: str = ""
 
+    # Photo Storage
+    STORAGE_PROVIDER: str = "supabase"  # supabase, local
+    LOCAL_STORAGE_DIR: str = "storage/photos"
+    PHOTO_DERIVATIVE_DIR: str = "storage/derivatives"
+    PHOTO_DERIVATIVE_CACHE_BYTES: int = 512 * 1024 * 1024
+
     # n8n
     N8N_WEBHOOK_BASE_URL: str = ""
 
@@ -70,14 +100,80 @@ class Settings(BaseSettings):
     AGENT_ORG_ID: str = ""
     GPS_UPDATE_INTERVAL_SECONDS: int = 300
     GPS_GEOFENCE_RADIUS_METERS: int = 100
+    GPS_FULL_RESOLUTION_DAYS: int = 7  # Older pings are compacted into trajectories
+    GPS_STATIONARY_RADIUS_METERS: float = 25.0
+    GPS_SIMPLIFY_TOLERANCE_METERS: float = 15.0
     PHOTO_QUALITY: int = 85
     PHOTO_MAX_WIDTH: int = 1920
+    PHOTO_BUCKET: str = "quality-photos"
+    PHOTO_MAX_UPLOAD_BYTES: int = 15 * 1024 * 1024
+    PHOTO_CHUNK_BYTES: int = 256 * 1024
+    PHOTO_WORKERS: int = 2  # Processes for resize/re-encode
+    PHOTO_TMP_DIR: Optional[str] = None  # Defaults to the system temp dir
+    PHOTO_DUPLICATE_MAX_DISTANCE: int = 6  # dHash bits; at or below = same photo
+    PHOTO_DUPLICATE_WINDOW_DAYS: int = 30
     SYNC_INTERVAL_SECONDS: int = 60
-    OFFLINE_QUEUE_MAX_SIZE: int = 1000
+    OFFLINE_QUEUE_MAX_SIZE: int = 1000  # Rows kept on the cart; see agent/offline_queue.py
+    AGENT_DB_PATH: str = "/opt/foodcartos/data/cart.db"
+    AGENT_SYNC_BATCH_SIZE: int = 200  # Records per sync request
+    AGENT_SYNC_BATCH_BYTES: int = 256 * 1024  # JSON per sync request
+    AGENT_SYNC_BACKOFF_SECONDS: float = 2.0  # First retry after a failed sync; doubles
+    AGENT_SYNC_BACKOFF_MAX_SECONDS: float = 600.0
+    CART_OFFLINE_AFTER_SECONDS: int = 180  # 3 missed syncs
+    HEARTBEAT_TICK_SECONDS: int = 5  # Offline detection resolution
+    LAST_SEEN_FLUSH_SECONDS: int = 30  # carts.last_seen write batching
+
+    # Agent admission control (see app/utils/admission.py)
+    AGENT_SYNC_RATE_PER_MINUTE: float = 12.0  # Sustained syncs per device
+    AGENT_SYNC_BURST: int = 30  # Syncs a device may send back to back (offline queue flush)
+    AGENT_REGISTER_RATE_PER_MINUTE: float = 1.0
+    AGENT_REGISTER_BURST: int = 3
+    AGENT_SYNC_MAX_CONCURRENT: int = 32  # Syncs processed at once across all devices
+    AGENT_SYNC_QUEUE_SECONDS: float = 0.5  # Wait for a slot before answering 429
+    AGENT_SYNC_BUSY_RETRY_SECONDS: float = 10.0  # Retry-After spread when saturated
+    AGENT_SYNC_STAGGER: float = 0.2  # Sync intervals handed out vary ±20% by device
+    AGENT_ADMISSION_MAX_DEVICES: int = 10000  # Rate limit buckets kept (LRU)
+
+    # Live Fleet Status (dashboard push)
+    LIVE_STATUS_PUSH_INTERVAL_SECONDS: float = 1.0  # Max one delta per org per interval
+    LIVE_STATUS_QUEUE_SIZE: int = 32  # Frames buffered per connection before resync
+    LIVE_STATUS_KEEPALIVE_SECONDS: int = 15
+
+    # Quality Checklist (defaults; orgs override in organizations.settings)
+    QUALITY_REQUIRED_CHECKS: List[str] = ["dirty_water", "garlic_butter", "cart_display"]
+    QUALITY_CHECKLIST_DEADLINE: str = "11:00"  # Local time, HH:MM
+    QUALITY_TIMEZONE: str = "America/Los_Angeles"
+    QUALITY_ALERT_THRESHOLD: float = 80.0  # Daily score percentage
+    QUALITY_ALERT_DAYS: int = 3  # Consecutive worked days below threshold
+    QUALITY_DAY_CLOSE_CHECK_SECONDS: int = 60
+    QUALITY_SCORE_HISTORY_DAYS: int = 365  # Score days reloaded per org after a restart
+
+    # Assignment Board Cache
+    ASSIGNMENT_BOARD_TTL_SECONDS: int = 300  # Safety net for edits made outside the API
+    ASSIGNMENT_BOARD_MAX_ENTRIES: int = 1024
+
+    # Monitoring
+    METRICS_ENABLED: bool = True  # Request metrics and /metrics
+    HEALTH_MAX_QUEUE_DEPTH: int = 10000  # /health reports not ready beyond this backlog
+
+    # Request profiling (opt-in; see app/utils/profiling.py)
+    PROFILING_ENABLED: bool = False
+    # X-Profile header value: profiles a request, lists /api/admin/profiles
+    PROFILING_TOKEN: str = ""
+    PROFILING_SAMPLE_RATE: float = 0.0  # Fraction of all requests to profile
+    # Route template -> seconds; slower requests are kept
+    PROFILING_SLOW_ROUTES: Dict[str, float] = {}
+    PROFILING_INTERVAL_SECONDS: float = 0.01  # 100 samples/s
+    PROFILING_DIR: str = "storage/profiles"
+    PROFILING_MAX_FILES: int = 200
 
     # Development
     VERIFY_SSL: bool = True
     LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # json, console (human-readable, for development)
+    LOG_QUEUE_SIZE: int = 10000  # Records waiting to be written; beyond this they're dropped
+    # Fraction of these high-volume events that are logged
+    LOG_SAMPLE_RATES: Dict[str, float] = {"agent_sync": 0.01, "twilio_status_callback": 0.01}
 
 
 # Global settings instance
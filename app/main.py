@@ -5,23 +5,82 @@ This is the main FastAPI application that powers FoodCartOS.
 """
 
 from contextlib import asynccontextmanager
+from typing import Dict, List, Tuple
 
-from fastapi import FastAPI
+import structlog
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.config import settings
-from app.routers import auth, carts, locations, quality, transactions, webhooks
+from app.routers import admin, auth, carts, locations, quality, transactions, webhooks
+from app.services import n8n, photos
+from app.services.assignment_board import assignment_board
+from app.services.checklist import (
+    CHECKLIST_DAY_SQL,
+    INSERT_QUALITY_CHECK_SQL,
+    RECORD_CHECK_SQL,
+)
+from app.services.heartbeat import LAST_SEEN_FLUSH_SQL, heartbeats
+from app.services.live_status import FLEET_STATUS_SQL, live_status
+from app.services.quality_scores import quality_scores
+from app.utils import metrics
+from app.utils.auth import signing_keys, token_cache
+from app.utils.database import db
+from app.utils.log import RequestContextMiddleware, configure_logging, shutdown_logging
+from app.utils.profiling import ProfilingMiddleware
+from app.utils.responses import CompressionMiddleware
+from app.utils.storage import close_storage, loaded_derivatives
+
+logger = structlog.get_logger(__name__)
+
+
+async def bind_carts() -> None:
+    """Link agent hardware and Square locations to their carts."""
+    if not db.connected:
+        return
+    try:
+        async with db.transaction() as conn:
+            bound = await live_status.load_bindings(conn)
+    except Exception as exc:
+        # Links are also looked up on each agent's first sync
+        logger.error("cart_bindings_load_failed", error=str(exc))
+        return
+    logger.info("cart_bindings_loaded", carts=bound)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handle startup and shutdown events."""
     # Startup
-    print(f"Starting FoodCartOS API v{settings.VERSION}")
-    print(f"Environment: {settings.APP_ENV}")
+    configure_logging()
+    logger.info("api_starting", version=settings.VERSION, environment=settings.APP_ENV)
+    # Statements every request path runs: prepared once per connection
+    db.prepare_on_connect(
+        (
+            FLEET_STATUS_SQL,
+            INSERT_QUALITY_CHECK_SQL,
+            CHECKLIST_DAY_SQL,
+            RECORD_CHECK_SQL,
+            LAST_SEEN_FLUSH_SQL,
+        )
+    )
+    await db.connect()
+    await bind_carts()
+    signing_keys.start()
+    heartbeats.start()
+    quality_scores.start()
     yield
     # Shutdown
-    print("Shutting down FoodCartOS API")
+    logger.info("api_stopping")
+    await heartbeats.stop()
+    await quality_scores.stop()
+    await signing_keys.stop()
+    await db.close()
+    await n8n.close()
+    await close_storage()
+    photos.shutdown_pool()
+    shutdown_logging()  # Last, so shutdown logs are written
 
 
 app = FastAPI(
@@ -31,6 +90,12 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_BYTES)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -38,7 +103,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# Outermost, so every log line of a request carries its correlation ID
+app.add_middleware(RequestContextMiddleware)
 
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
@@ -47,18 +115,92 @@ app.include_router(locations.router, prefix="/api/locations", tags=["Locations"]
 app.include_router(transactions.router, prefix="/api/transactions", tags=["Transactions"])
 app.include_router(quality.router, prefix="/api/quality", tags=["Quality Checks"])
 app.include_router(webhooks.router, prefix="/webhooks", tags=["Webhooks"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 
 
-@app.get("/health")
-async def health_check():
-    """Health check endpoint for monitoring."""
+# ===========================================
+# Monitoring
+# ===========================================
+
+
+def queue_depths() -> Dict[str, int]:
+    """Work accepted but not yet written or delivered."""
     return {
-        "status": "healthy",
-        "version": settings.VERSION,
-        "environment": settings.APP_ENV,
+        "last_seen": heartbeats.pending_writes,
+        "n8n": n8n.pending_count(),
+        "live_status": live_status.pending_deltas,
     }
 
 
+def collect_metrics() -> None:
+    """Copy queue, pool and cache state into gauges at scrape time."""
+    for queue, depth in queue_depths().items():
+        metrics.QUEUE_DEPTH.set(depth, queue)
+
+    database = db.status()
+    metrics.DB_POOL_CONNECTIONS.clear()
+    if database["connected"]:
+        pools = [("primary", database)]
+        if "replica" in database:
+            pools.append(("replica", database["replica"]))
+        for pool, status in pools:
+            metrics.DB_POOL_CONNECTIONS.set(status["size"] - status["idle"], pool, "in_use")
+            metrics.DB_POOL_CONNECTIONS.set(status["idle"], pool, "idle")
+        metrics.DB_POOL_CONNECTIONS.set(database["max_size"], "primary", "max")
+        if database.get("replica", {}).get("lag_seconds") is not None:
+            metrics.DB_REPLICA_LAG.set(database["replica"]["lag_seconds"])
+
+    caches: List[Tuple[str, metrics.CacheStats]] = [
+        ("auth_tokens", token_cache),
+        ("assignment_board", assignment_board),
+    ]
+    derivatives = loaded_derivatives()
+    if derivatives is not None:
+        caches.append(("photo_derivatives", derivatives))
+    for name, cache in caches:
+        metrics.CACHE_HITS.set(cache.hits, name)
+        metrics.CACHE_MISSES.set(cache.misses, name)
+
+
+metrics.registry.on_collect(collect_metrics)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/health")
+async def health_check():
+    """
+    Health and readiness for monitoring.
+
+    Not ready (503) when the database is configured but no pooled
+    connection answers within DATABASE_ACQUIRE_TIMEOUT_SECONDS (down, or
+    the pool is exhausted), or when a queue has backed up past
+    HEALTH_MAX_QUEUE_DEPTH (its writes or deliveries are failing).
+    """
+    database = db.status()
+    if database["configured"]:
+        database["ok"] = database["connected"] and await db.ping()
+    queues = queue_depths()
+    backed_up = [name for name, depth in queues.items() if depth > settings.HEALTH_MAX_QUEUE_DEPTH]
+    ready = database.get("ok", True) and not backed_up
+    return JSONResponse(
+        {
+            "status": "healthy" if ready else "degraded",
+            "ready": ready,
+            "version": settings.VERSION,
+            "environment": settings.APP_ENV,
+            "database": database,
+            "queues": queues,
+            "backed_up": backed_up,
+        },
+        status_code=200 if ready else 503,
+    )
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
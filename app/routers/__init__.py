@@ -8,4 +8,5 @@ Each router handles a specific domain of the API:
 - transactions: Revenue tracking from Square
 - quality: Photo verification and quality scores
 - webhooks: External service callbacks (Square, Twilio)
+- admin: Operator tools (request profiles)
 """
@@ -0,0 +1,65 @@
+"""
+Admin Router
+
+Operator endpoints that are not scoped to an organization:
+- Request profiles captured by the profiling middleware
+
+Guarded by the X-Profile header (PROFILING_TOKEN), not by org roles:
+profiles cover requests from every organization.
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+
+from app.config import settings
+from app.utils.profiling import list_profiles, profile_path, token_matches
+
+router = APIRouter()
+
+
+class ProfileInfo(BaseModel):
+    """A stored request profile."""
+
+    name: str
+    id: str
+    reason: str  # header, sampled, slow
+    method: str
+    route: str
+    duration_ms: int
+    created_at: datetime
+    bytes: int
+
+
+async def require_profiling_token(
+    x_profile: Optional[str] = Header(None, alias="X-Profile"),
+) -> None:
+    if not settings.PROFILING_ENABLED or not settings.PROFILING_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiling is disabled")
+    if not token_matches(x_profile):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid profiling token")
+
+
+@router.get(
+    "/profiles",
+    response_model=List[ProfileInfo],
+    dependencies=[Depends(require_profiling_token)],
+)
+async def get_profiles():
+    """List stored profiles, newest first."""
+    return list_profiles()
+
+
+@router.get("/profiles/{name}", dependencies=[Depends(require_profiling_token)])
+async def download_profile(name: str):
+    """
+    Download a profile (by file name or X-Profile-Id) in collapsed-stack
+    format, e.g. for `flamegraph.pl profile.folded > profile.svg` or speedscope.
+    """
+    path = profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=path.rsplit("/", 1)[-1])
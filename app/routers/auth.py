@@ -5,9 +5,11 @@ Handles user registration, login, and token management.
 Uses Supabase Auth under the hood.
 """
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, EmailStr
 
+from app.utils.auth import AuthContext, current_user
+
 router = APIRouter()
 
 
@@ -79,6 +81,14 @@ async def refresh_token(refresh_token: str):
     )
 
 
+@router.get("/me")
+async def me(user: AuthContext = Depends(current_user)):
+    """
+    The caller's identity as resolved from their access token.
+    """
+    return {"user_id": user.user_id, "org_id": user.org_id, "role": user.role}
+
+
 @router.post("/logout")
 async def logout():
     """
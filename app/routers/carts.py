@@ -4,12 +4,42 @@ Carts Router
 Handles cart management, assignments, and real-time status.
 """
 
-from datetime import date, datetime
+from dataclasses import asdict
+from datetime import date, datetime, time, timedelta, timezone
 from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Query, status
+import asyncpg
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
+from app.config import settings
+from app.routers.locations import get_recommendations
+from app.services.assignment_board import ASSIGNMENT_BOARD_SQL, BoardLoader, assignment_board
+from app.services.assignment_planner import (
+    EXISTING_ASSIGNMENTS_SQL,
+    UPSERT_ASSIGNMENTS_SQL,
+    generate_plan,
+    keep_written,
+    upsert_args,
+    validate_plan,
+)
+from app.services import trajectory
+from app.services.checklist import checklists
+from app.services.live_status import FLEET_STATUS_SQL, live_status
+from app.utils.auth import AuthContext, current_org_id, current_user, require_role
+from app.utils.database import db, replica_reads
+from app.utils.responses import fast_list
+
 router = APIRouter()
 
 
@@ -59,6 +89,51 @@ class CartAssignment(BaseModel):
     status: str  # scheduled, in_progress, completed, cancelled
 
 
+class AssignmentPlanItem(BaseModel):
+    """One row of a bulk assignment plan."""
+
+    cart_id: str
+    location_id: str
+    date: date
+    employee_id: Optional[str] = None
+    shift_start: Optional[str] = None  # "10:00"
+    shift_end: Optional[str] = None  # "18:00"
+
+
+class AssignmentPlanGenerate(BaseModel):
+    """Generate plan rows from location recommendation scores."""
+
+    start_date: date
+    end_date: date
+    cart_ids: List[str]
+    shift_start: Optional[str] = None
+    shift_end: Optional[str] = None
+
+
+class AssignmentPlan(BaseModel):
+    """Bulk assignment plan (a week or month at a time)."""
+
+    assignments: List[AssignmentPlanItem] = []
+    generate: Optional[AssignmentPlanGenerate] = None
+
+
+class AssignmentPlanResult(BaseModel):
+    """Outcome of a bulk plan."""
+
+    scheduled: List[AssignmentPlanItem]
+    conflicts: List[dict]  # [{"index": 3, "cart_id": "cart_1", "date": ..., "reason": "..."}]
+
+
+class TrajectoryDay(BaseModel):
+    """Simplified GPS track for one cart and day."""
+
+    date: date
+    points: List[List[float]]  # [[lat, lng, unix_ts], ...]
+    point_count: int
+    raw_point_count: int
+    distance_meters: Optional[float] = None
+
+
 class CartStatus(BaseModel):
     """Real-time cart status."""
 
@@ -78,7 +153,7 @@ class CartStatus(BaseModel):
 
 @router.get("/", response_model=List[Cart])
 async def list_carts(
-    org_id: str = Query(..., description="Organization ID"),
+    org_id: str = Depends(current_org_id),
     status: Optional[str] = Query(None, description="Filter by status"),
 ):
     """
@@ -87,7 +162,7 @@ async def list_carts(
     Returns basic cart information including current location.
     """
     # TODO: Implement with Supabase
-    return [
+    rows = [
         {
             "id": "cart_1",
             "org_id": org_id,
@@ -111,12 +186,18 @@ async def list_carts(
             "created_at": datetime.now(),
         },
     ]
+    return fast_list(rows, Cart)
 
 
-@router.post("/", response_model=Cart, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/",
+    response_model=Cart,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(require_role("owner"))],
+)
 async def create_cart(
     cart: CartCreate,
-    org_id: str = Query(..., description="Organization ID"),
+    org_id: str = Depends(current_org_id),
 ):
     """
     Create a new cart.
@@ -131,8 +212,89 @@ async def create_cart(
     )
 
 
-@router.get("/{cart_id}/status", response_model=CartStatus)
-async def get_cart_status(cart_id: str):
+async def _load_fleet(org_id: str) -> bool:
+    """
+    Make sure the live status store holds the org's fleet for its local
+    day, loading it with FLEET_STATUS_SQL if not. False without a database.
+
+    The snapshot is shared by everyone in the org, so it is loaded with
+    the service role (the query filters by org) rather than under one
+    caller's RLS; the routes serving it are for owners and operators.
+    """
+    now = datetime.now(timezone.utc)
+    if checklists.has_config(org_id):
+        today = checklists.config(org_id).local_day(now)
+        if live_status.hydrated_day(org_id) == today:
+            return True
+    if not db.connected:
+        return False
+
+    async with db.transaction() as conn:
+        config = await checklists.ensure_config(conn, org_id)
+        today = config.local_day(now)
+        day_start = datetime.combine(today, time.min, tzinfo=config.timezone)
+        rows = await conn.fetch(FLEET_STATUS_SQL, org_id, day_start)
+    live_status.hydrate(org_id, rows, len(config.required_checks), now, day=today)
+    return True
+
+
+@router.get(
+    "/status",
+    response_model=List[CartStatus],
+    dependencies=[Depends(require_role("owner", "operator"))],
+)
+async def get_fleet_status(
+    org_id: str = Depends(current_org_id),
+):
+    """
+    Get real-time status for every cart in an organization.
+
+    One call replaces polling /{cart_id}/status per cart. Served from
+    the live status store, which is loaded once per org and org-local
+    day with a single set-based query (FLEET_STATUS_SQL), never one
+    query per cart; live updates keep it current in between. Owners
+    and operators only, like the live streams.
+    """
+    if await _load_fleet(org_id):
+        return live_status.snapshot(org_id)
+
+    # Without a database, live updates are all there is
+    fleet = live_status.snapshot(org_id)
+    if fleet:
+        return fleet
+
+    # Demo fleet until DATABASE_URL is set
+    return [
+        {
+            "cart_id": "cart_1",
+            "online": True,
+            "gps": {"lat": 38.3566, "lng": -121.9877},
+            "last_transaction": datetime.now(),
+            "today_revenue": 347.00,
+            "checklist_complete": True,
+            "signal_strength": 18,
+        },
+        {
+            "cart_id": "cart_2",
+            "online": True,
+            "gps": {"lat": 38.3600, "lng": -121.9800},
+            "last_transaction": datetime.now(),
+            "today_revenue": 212.00,
+            "checklist_complete": False,
+            "signal_strength": 14,
+        },
+    ]
+
+
+@router.get(
+    "/{cart_id}/status",
+    response_model=CartStatus,
+    dependencies=[Depends(require_role("owner", "operator"))],
+)
+async def get_cart_status(
+    cart_id: str,
+    org_id: str = Depends(current_org_id),
+):
     """
     Get real-time status for a cart.
 
@@ -142,8 +304,21 @@ async def get_cart_status(cart_id: str):
     - Today's revenue
     - Checklist completion status
     - Signal strength (cellular)
+
+    Only carts of the caller's org are served; others are 404.
     """
-    # TODO: Implement with real data
+    if await _load_fleet(org_id):
+        live = live_status.get(org_id, cart_id)
+        if live is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found")
+        return live
+
+    # Without a database, live updates are all there is
+    live = live_status.get(org_id, cart_id)
+    if live is not None:
+        return live
+
+    # Demo status until DATABASE_URL is set
     return {
         "cart_id": cart_id,
         "online": True,
@@ -155,48 +330,183 @@ async def get_cart_status(cart_id: str):
     }
 
 
+@router.get(
+    "/{cart_id}/history",
+    response_model=List[TrajectoryDay],
+    dependencies=[Depends(replica_reads)],
+)
+async def get_cart_history(
+    cart_id: str,
+    user: AuthContext = Depends(require_role("owner", "operator")),
+    start_date: date = Query(..., description="First day"),
+    end_date: date = Query(..., description="Last day"),
+):
+    """
+    Get a cart's simplified GPS tracks, one per day.
+
+    Days (UTC) older than GPS_FULL_RESOLUTION_DAYS come from
+    gps_trajectories (TRAJECTORY_HISTORY_SQL). Recent days are
+    simplified from raw gps_pings on the fly, so map payloads stay
+    small either way.
+    """
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must not be before start_date",
+        )
+
+    if db.connected:
+        async with db.transaction(user) as conn:
+            return await trajectory.history(conn, cart_id, start_date, end_date)
+
+    # Demo day until DATABASE_URL is set: parked at the courthouse, short drive, parked at the DMV
+    return [
+        {
+            "date": start_date,
+            "points": [
+                [38.3566, -121.9877, 1705330800],
+                [38.3566, -121.9877, 1705345200],
+                [38.3589, -121.9839, 1705345500],
+                [38.3600, -121.9800, 1705345800],
+                [38.3600, -121.9800, 1705359600],
+            ],
+            "point_count": 5,
+            "raw_point_count": 104,
+            "distance_meters": 861.4,
+        }
+    ]
+
+
+@router.websocket("/live", dependencies=[Depends(require_role("owner", "operator"))])
+async def fleet_status_socket(
+    websocket: WebSocket,
+    org_id: str = Depends(current_org_id),
+):
+    """
+    Push live fleet status over a WebSocket.
+
+    Sends a snapshot of every cart on connect, then coalesced deltas
+    whenever a cart's status, revenue or location changes:
+    {"type": "delta", "carts": {"cart_1": {"today_revenue": 359.0}}}
+
+    Browsers can't set headers on WebSockets, so the access token may be
+    passed as ?access_token=.
+    """
+    await websocket.accept()
+    subscription = live_status.subscribe(org_id)
+    try:
+        async for frame in subscription.frames(settings.LIVE_STATUS_KEEPALIVE_SECONDS):
+            await websocket.send_text(frame)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        subscription.close()
+
+
+@router.get("/live/stream", dependencies=[Depends(require_role("owner", "operator"))])
+async def fleet_status_stream(
+    request: Request,
+    org_id: str = Depends(current_org_id),
+):
+    """
+    Push live fleet status as Server-Sent Events.
+
+    Same frames as the WebSocket endpoint, for dashboards behind
+    proxies that don't pass WebSockets through. EventSource can't set
+    headers either, so ?access_token= is accepted here too.
+    """
+    subscription = live_status.subscribe(org_id)
+
+    async def events():
+        try:
+            async for frame in subscription.frames(settings.LIVE_STATUS_KEEPALIVE_SECONDS):
+                if await request.is_disconnected():
+                    break
+                yield f"data: {frame}\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _assignment_board_loader(user: AuthContext) -> BoardLoader:
+    """Build the assignment board for one date (ASSIGNMENT_BOARD_SQL)."""
+
+    async def load(org_id: str, day: date) -> List[dict]:
+        if db.connected:
+            async with db.transaction(user) as conn:
+                rows = await conn.fetch(ASSIGNMENT_BOARD_SQL, org_id, day)
+            return [dict(row) for row in rows]
+
+        # Demo board until DATABASE_URL is set
+        return [
+            {
+                "id": "assign_1",
+                "cart_id": "cart_1",
+                "cart_name": "Cart 1 - Main",
+                "location_id": "loc_1",
+                "location_name": "Courthouse",
+                "employee_id": "emp_poncho",
+                "employee_name": "Poncho",
+                "date": day,
+                "shift_start": "10:00",
+                "shift_end": "18:00",
+                "status": "in_progress",
+            },
+            {
+                "id": "assign_2",
+                "cart_id": "cart_2",
+                "cart_name": "Cart 2 - Brother-in-law",
+                "location_id": "loc_2",
+                "location_name": "DMV",
+                "employee_id": "emp_brother",
+                "employee_name": "Brother-in-law",
+                "date": day,
+                "shift_start": "10:30",
+                "shift_end": "17:00",
+                "status": "scheduled",
+            },
+        ]
+
+    return load
+
+
 @router.get("/assignments", response_model=List[CartAssignment])
 async def list_assignments(
-    org_id: str = Query(..., description="Organization ID"),
+    request: Request,
+    user: AuthContext = Depends(current_user),
+    org_id: str = Depends(current_org_id),
     date: date = Query(..., description="Assignment date"),
 ):
     """
     Get cart assignments for a specific date.
 
     Shows which cart goes to which location with which employee.
+    Served from a per-(org, date) cache; send If-None-Match with the
+    last ETag to get a 304 when nothing changed.
     """
-    # TODO: Implement with Supabase
-    return [
-        {
-            "id": "assign_1",
-            "cart_id": "cart_1",
-            "cart_name": "Cart 1 - Main",
-            "location_id": "loc_1",
-            "location_name": "Courthouse",
-            "employee_id": "emp_poncho",
-            "employee_name": "Poncho",
-            "date": date,
-            "shift_start": "10:00",
-            "shift_end": "18:00",
-            "status": "in_progress",
-        },
-        {
-            "id": "assign_2",
-            "cart_id": "cart_2",
-            "cart_name": "Cart 2 - Brother-in-law",
-            "location_id": "loc_2",
-            "location_name": "DMV",
-            "employee_id": "emp_brother",
-            "employee_name": "Brother-in-law",
-            "date": date,
-            "shift_start": "10:30",
-            "shift_end": "17:00",
-            "status": "scheduled",
-        },
-    ]
+    board = await assignment_board.get(org_id, date, _assignment_board_loader(user))
+    headers = {"ETag": board.etag, "Cache-Control": "private, no-cache"}
+    if board.matches(request.headers.get("if-none-match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=board.body, media_type="application/json", headers=headers)
+
+
+# $1 = org_id, $2 = cart_id, $3 = location_id, $4 = employee_id, $5 = date,
+# $6 = shift_start, $7 = shift_end
+CREATE_ASSIGNMENT_SQL = """
+INSERT INTO foodcartos.daily_assignments
+    (org_id, cart_id, location_id, employee_id, date, shift_start, shift_end)
+VALUES ($1, $2, $3, $4, $5, $6, $7)
+RETURNING id::text AS id
+"""
 
 
-@router.post("/assignments")
+@router.post("/assignments", status_code=status.HTTP_201_CREATED)
 async def create_assignment(
     cart_id: str,
     location_id: str,
@@ -204,6 +514,8 @@ async def create_assignment(
     employee_id: Optional[str] = None,
     shift_start: Optional[str] = None,
     shift_end: Optional[str] = None,
+    user: AuthContext = Depends(require_role("owner", "operator")),
+    org_id: str = Depends(current_org_id),
 ):
     """
     Create a cart assignment.
@@ -211,26 +523,173 @@ async def create_assignment(
     Assigns a cart to a location for a specific date.
     Can include employee assignment and shift times.
     """
-    # TODO: Implement with Supabase
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="Assignment creation not yet implemented",
+    if not db.connected:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Assignment creation not yet implemented",
+        )
+
+    try:
+        start = time.fromisoformat(shift_start) if shift_start else None
+        end = time.fromisoformat(shift_end) if shift_end else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Shift times must be HH:MM",
+        )
+
+    try:
+        async with db.transaction(user) as conn:
+            assignment_id = await conn.fetchval(
+                CREATE_ASSIGNMENT_SQL,
+                org_id,
+                cart_id,
+                location_id,
+                employee_id,
+                date,
+                start,
+                end,
+            )
+    except asyncpg.UniqueViolationError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Cart is already assigned on this date",
+        )
+    except asyncpg.DataError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cart, location and employee ids must be UUIDs",
+        )
+
+    assignment_board.invalidate(org_id, date)
+    return {"status": "created", "id": assignment_id}
+
+
+MAX_PLAN_DAYS = 62
+
+
+def _plan_too_long() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail=f"Plans may span at most {MAX_PLAN_DAYS} days",
     )
 
 
+@router.post("/assignments/bulk", response_model=AssignmentPlanResult)
+async def plan_assignments(
+    plan: AssignmentPlan,
+    user: AuthContext = Depends(require_role("owner", "operator")),
+    org_id: str = Depends(current_org_id),
+):
+    """
+    Create many cart assignments at once.
+
+    Accepts explicit rows, a request to generate rows from location
+    recommendations, or both, spanning at most MAX_PLAN_DAYS. In one
+    transaction the plan is validated in memory against itself and the
+    stored assignments, then written with one batched upsert. Rows that
+    conflict are returned with a reason; the rest are scheduled.
+    """
+    if not db.connected:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Assignment planning not yet implemented",
+        )
+
+    rows = [item.model_dump() for item in plan.assignments]
+
+    if plan.generate is not None:
+        spec = plan.generate
+        if spec.end_date < spec.start_date:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="end_date must not be before start_date",
+            )
+        if (spec.end_date - spec.start_date).days >= MAX_PLAN_DAYS:
+            raise _plan_too_long()
+        scores = {}
+        day = spec.start_date
+        while day <= spec.end_date:
+            scores[day] = await get_recommendations(
+                org_id=org_id, target_date=day, cart_ids=spec.cart_ids
+            )
+            day += timedelta(days=1)
+        rows.extend(
+            generate_plan(
+                spec.cart_ids,
+                spec.start_date,
+                spec.end_date,
+                scores,
+                shift_start=spec.shift_start,
+                shift_end=spec.shift_end,
+            )
+        )
+
+    if not rows:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Plan has no assignments",
+        )
+
+    dates = [row["date"] for row in rows]
+    if (max(dates) - min(dates)).days >= MAX_PLAN_DAYS:
+        raise _plan_too_long()
+
+    async with db.transaction(user) as conn:
+        existing = await conn.fetch(EXISTING_ASSIGNMENTS_SQL, org_id, min(dates), max(dates))
+        validated = validate_plan(rows, existing)
+        if validated.rows:
+            # Rows it doesn't return were locked by a shift that started meanwhile
+            written = await conn.fetch(UPSERT_ASSIGNMENTS_SQL, *upsert_args(org_id, validated.rows))
+            keep_written(validated, written)
+
+    for day in validated.dates:
+        assignment_board.invalidate(org_id, day)
+
+    return {
+        "scheduled": validated.rows,
+        "conflicts": [asdict(conflict) for conflict in validated.conflicts],
+    }
+
+
+# $1 = cart_id, $2 = hardware_id; RLS keeps it to the caller's org
+REGISTER_HARDWARE_SQL = """
+UPDATE foodcartos.carts
+SET hardware_id = $2, updated_at = NOW()
+WHERE id = $1
+RETURNING org_id::text AS org_id
+"""
+
+
 @router.post("/{cart_id}/register")
 async def register_cart_hardware(
     cart_id: str,
     hardware_id: str = Query(..., description="Raspberry Pi serial number"),
+    user: AuthContext = Depends(require_role("owner")),
 ):
     """
     Register hardware with a cart.
 
     Called during physical cart setup when the Raspberry Pi
-    is first connected and configured.
+    is first connected and configured. From then on the agent's
+    syncs update the cart's live status.
     """
-    # TODO: Implement hardware registration
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="Hardware registration not yet implemented",
-    )
+    if not db.connected:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Hardware registration not yet implemented",
+        )
+
+    try:
+        async with db.transaction(user) as conn:
+            row = await conn.fetchrow(REGISTER_HARDWARE_SQL, cart_id, hardware_id)
+    except asyncpg.UniqueViolationError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Hardware is already registered to another cart",
+        )
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found")
+
+    live_status.bind_hardware(hardware_id, row["org_id"], cart_id)
+    return {"status": "registered", "cart_id": cart_id, "hardware_id": hardware_id}
@@ -8,9 +8,13 @@ This is where the magic happens for Poncho's "which location is best" question.
 from datetime import date, datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from pydantic import BaseModel
 
+from app.utils.auth import current_org_id, current_user, require_role
+from app.utils.database import replica_reads
+from app.utils.responses import fast_list
+
 router = APIRouter()
 
 
@@ -76,7 +80,7 @@ class LocationRecommendation(BaseModel):
 
 @router.get("/", response_model=List[Location])
 async def list_locations(
-    org_id: str = Query(..., description="Organization ID"),
+    org_id: str = Depends(current_org_id),
     location_type: Optional[str] = Query(None, description="Filter by type"),
 ):
     """
@@ -86,7 +90,7 @@ async def list_locations(
     """
     # TODO: Implement with Supabase
     # For now, return example data
-    return [
+    rows = [
         {
             "id": "loc_1",
             "org_id": org_id,
@@ -110,12 +114,18 @@ async def list_locations(
             "created_at": datetime.now(),
         },
     ]
+    return fast_list(rows, Location)
 
 
-@router.post("/", response_model=Location, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/",
+    response_model=Location,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(require_role("owner", "operator"))],
+)
 async def create_location(
     location: LocationCreate,
-    org_id: str = Query(..., description="Organization ID"),
+    org_id: str = Depends(current_org_id),
 ):
     """
     Create a new location.
@@ -130,7 +140,11 @@ async def create_location(
     )
 
 
-@router.get("/{location_id}/performance", response_model=LocationPerformance)
+@router.get(
+    "/{location_id}/performance",
+    response_model=LocationPerformance,
+    dependencies=[Depends(current_user), Depends(replica_reads)],
+)
 async def get_location_performance(location_id: str):
     """
     Get performance metrics for a location.
@@ -168,9 +182,13 @@ async def get_location_performance(location_id: str):
     }
 
 
-@router.get("/recommendations", response_model=List[LocationRecommendation])
+@router.get(
+    "/recommendations",
+    response_model=List[LocationRecommendation],
+    dependencies=[Depends(replica_reads)],
+)
 async def get_recommendations(
-    org_id: str = Query(..., description="Organization ID"),
+    org_id: str = Depends(current_org_id),
     target_date: date = Query(..., description="Date to get recommendations for"),
     cart_ids: Optional[List[str]] = Query(None, description="Specific carts to place"),
 ):
@@ -224,7 +242,10 @@ async def get_recommendations(
     ]
 
 
-@router.get("/{location_id}/compare")
+@router.get(
+    "/{location_id}/compare",
+    dependencies=[Depends(current_user), Depends(replica_reads)],
+)
 async def compare_location(
     location_id: str,
     compare_to: List[str] = Query(..., description="Location IDs to compare"),
@@ -5,12 +5,39 @@ Handles photo verification and quality scoring.
 This is how Poncho ensures garlic butter buns happen even when he's not there.
 """
 
-from datetime import date, datetime
-from typing import List, Optional
+import json
+import uuid
+from datetime import date, datetime, timezone
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, File, HTTPException, Query, UploadFile, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile, status
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel
 
+from app.services.checklist import (
+    BULK_REVIEW_SQL,
+    CHECKLIST_DAY_SQL,
+    INSERT_QUALITY_CHECK_SQL,
+    LOCK_CHECKLIST_DAYS_SQL,
+    RECORD_CHECK_SQL,
+    REVIEW_STATUSES,
+    SAVE_CHECKLIST_CONFIG_SQL,
+    UPSERT_CHECKLIST_DAYS_SQL,
+    ChecklistChange,
+    ChecklistConfig,
+    ChecklistDay,
+    checklists,
+    day_from_row,
+    publish_change,
+)
+from app.services.photo_duplicates import PhotoFingerprint, photo_duplicates, to_signed
+from app.services.photos import InvalidPhoto, PhotoTooLarge, photo_path, store_quality_photo
+from app.services.quality_scores import PERIODS, quality_scores
+from app.utils.auth import AuthContext, current_org_id, current_user, require_role
+from app.utils.database import Session, db, replica_reads
+from app.utils.responses import fast_list
+from app.utils.storage import DERIVATIVE_WIDTHS, StorageNotConfigured, is_photo_hash
+
 router = APIRouter()
 
 
@@ -28,6 +55,8 @@ class QualityCheck(BaseModel):
     employee_name: str
     check_type: str  # dirty_water, garlic_butter, cart_display
     photo_url: str
+    photo_hash: Optional[str] = None  # SHA-256 of the stored JPEG
+    suspected_duplicate_of: Optional[str] = None  # Earlier check the photo looks reused from
     status: str  # pending, approved, rejected
     notes: Optional[str] = None
     timestamp: datetime
@@ -37,7 +66,7 @@ class DailyChecklist(BaseModel):
     """Daily checklist status for a cart."""
 
     cart_id: str
-    cart_name: str
+    cart_name: Optional[str] = None
     date: date
     required_checks: List[str]
     completed_checks: List[str]
@@ -47,6 +76,28 @@ class DailyChecklist(BaseModel):
     late: bool
 
 
+class ChecklistSettings(BaseModel):
+    """An org's checklist: required check types and the daily deadline."""
+
+    required_checks: List[str]
+    checklist_deadline: Optional[str] = None  # HH:MM local time
+    timezone: Optional[str] = None  # IANA name, e.g. America/Los_Angeles
+
+
+class CheckReview(BaseModel):
+    """One owner decision in a bulk review."""
+
+    check_id: str
+    status: str  # approved, rejected
+    notes: Optional[str] = None
+
+
+class BulkReview(BaseModel):
+    """Many review decisions, applied together."""
+
+    reviews: List[CheckReview]
+
+
 class QualityScore(BaseModel):
     """Quality score for an employee over a period."""
 
@@ -68,14 +119,110 @@ class Leaderboard(BaseModel):
     rankings: List[dict]
 
 
+def _checklist_changed(change: ChecklistChange) -> None:
+    """Fan a checklist change out to dashboards, n8n and quality scores."""
+    publish_change(change)
+    quality_scores.record_checklist(change)
+
+
+async def _load_config(user: AuthContext) -> ChecklistConfig:
+    """The org's checklist config, read from organizations.settings on first use."""
+    if db.connected and not checklists.has_config(user.org_id):
+        async with db.transaction(user) as conn:
+            return await checklists.ensure_config(conn, user.org_id)
+    return checklists.config(user.org_id)
+
+
+def _canonical_uuid(value: str) -> Optional[str]:
+    try:
+        return str(uuid.UUID(value))
+    except ValueError:
+        return None
+
+
+async def _apply_reviews(
+    user: AuthContext, reviews: List[CheckReview]
+) -> Tuple[List[CheckReview], List[ChecklistChange]]:
+    """
+    Write review decisions. Returns the decisions that updated a check
+    (unknown ids and other orgs' checks are left out) and one change per
+    checklist day whose counts moved, committed before memory is updated.
+    """
+    if not db.connected:
+        reviews = [item for item in reviews if checklists.tracks(item.check_id)]
+        return reviews, checklists.set_check_statuses(
+            (item.check_id, item.status) for item in reviews
+        )
+
+    reviews = [item for item in reviews if _canonical_uuid(item.check_id)]
+    if not reviews:
+        return [], []
+    async with db.transaction(user) as conn:
+        await checklists.ensure_config(conn, user.org_id)
+        rows = await conn.fetch(
+            BULK_REVIEW_SQL,
+            user.org_id,
+            user.user_id,
+            [item.check_id for item in reviews],
+            [item.status for item in reviews],
+            [item.notes for item in reviews],
+        )
+        # Driven by the returned rows, so checks reviewed after a restart
+        # or long after submission update their checklist days too
+        deltas = checklists.review_deltas(user.org_id, rows)
+        changes: List[ChecklistChange] = []
+        if deltas:
+            locked = await conn.fetch(
+                LOCK_CHECKLIST_DAYS_SQL,
+                user.org_id,
+                [cart_id for _, cart_id, _ in deltas],
+                [day for _, _, day in deltas],
+            )
+            changes = checklists.reviewed_days(deltas, locked)
+            await conn.execute(UPSERT_CHECKLIST_DAYS_SQL, *checklists.upsert_many_args(changes))
+    checklists.keep(changes)
+
+    updated = {row["id"] for row in rows}
+    return [item for item in reviews if _canonical_uuid(item.check_id) in updated], changes
+
+
+async def _load_scores(user: AuthContext) -> None:
+    """Rebuild the org's quality scores from the database on first use."""
+    if db.connected and not quality_scores.is_loaded(user.org_id):
+        async with db.transaction(user) as conn:
+            await quality_scores.ensure_loaded(conn, user.org_id)
+
+
+def _cart_not_found() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found")
+
+
+async def _load_day(conn: Optional[Session], org_id: str, cart_id: str, day: date) -> ChecklistDay:
+    """
+    A (cart, date) of the org, read with CHECKLIST_DAY_SQL when it isn't
+    held in memory; 404 if the cart belongs to another org.
+    """
+    state = checklists.day(org_id, cart_id, day)
+    if state is not None:
+        return state
+    if conn is None:
+        return checklists.load_day(org_id, cart_id, day, None)
+    row = await conn.fetchrow(CHECKLIST_DAY_SQL, org_id, cart_id, day)
+    if row is None:
+        raise _cart_not_found()
+    return checklists.day(org_id, cart_id, day) or checklists.load_day(org_id, cart_id, day, row)
+
+
 # ===========================================
 # Endpoints
 # ===========================================
 
+MAX_BULK_REVIEWS = 500
+
 
 @router.get("/checks", response_model=List[QualityCheck])
 async def list_quality_checks(
-    org_id: str = Query(..., description="Organization ID"),
+    org_id: str = Depends(current_org_id),
     date: date = Query(..., description="Date"),
     cart_id: Optional[str] = Query(None, description="Filter by cart"),
     employee_id: Optional[str] = Query(None, description="Filter by employee"),
@@ -86,7 +233,7 @@ async def list_quality_checks(
     Returns all photo submissions with their status.
     """
     # TODO: Implement with Supabase
-    return [
+    rows = [
         {
             "id": "qc_1",
             "cart_id": "cart_1",
@@ -94,6 +241,8 @@ async def list_quality_checks(
             "employee_name": "Poncho",
             "check_type": "dirty_water",
             "photo_url": "https://storage.supabase.co/photos/qc_1.jpg",
+            "photo_hash": None,
+            "suspected_duplicate_of": None,
             "status": "approved",
             "notes": None,
             "timestamp": datetime.now(),
@@ -105,18 +254,23 @@ async def list_quality_checks(
             "employee_name": "Poncho",
             "check_type": "garlic_butter",
             "photo_url": "https://storage.supabase.co/photos/qc_2.jpg",
+            "photo_hash": None,
+            "suspected_duplicate_of": None,
             "status": "approved",
             "notes": None,
             "timestamp": datetime.now(),
         },
     ]
+    return fast_list(rows, QualityCheck)
 
 
 @router.post("/checks", status_code=status.HTTP_201_CREATED)
 async def submit_quality_check(
+    user: AuthContext = Depends(current_user),
+    org_id: str = Depends(current_org_id),
     cart_id: str = Query(..., description="Cart ID"),
     employee_id: str = Query(..., description="Employee ID"),
-    check_type: str = Query(..., description="Type: dirty_water, garlic_butter, cart_display"),
+    check_type: str = Query(..., description="One of the org's check types"),
     photo: UploadFile = File(..., description="Photo proof"),
 ):
     """
@@ -126,55 +280,216 @@ async def submit_quality_check(
     a checklist item with photo proof.
 
     Triggers n8n workflow for notification if checklist is complete.
+    Photos that look like an earlier submission are flagged for review.
     """
     # Validate check type
-    valid_types = ["dirty_water", "garlic_butter", "cart_display"]
-    if check_type not in valid_types:
+    config = await _load_config(user)
+    if check_type not in config.check_types:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid check type. Must be one of: {valid_types}",
+            detail=f"Invalid check type. Must be one of: {config.check_types}",
         )
 
-    # TODO: Implement
-    # 1. Upload photo to Supabase Storage
-    # 2. Create quality_check record
-    # 3. Check if all required checks complete
-    # 4. Trigger n8n webhook if complete
+    # Resize off the event loop and stream to storage
+    try:
+        stored = await store_quality_photo(photo)
+    except PhotoTooLarge as exc:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(exc),
+        )
+    except InvalidPhoto:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Photo is not a readable image",
+        )
+    except StorageNotConfigured:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Photo storage is not configured",
+        )
+
+    check_id = str(uuid.uuid4())
+    submitted_at = datetime.now(timezone.utc)
+    fingerprint = PhotoFingerprint(
+        check_id=check_id,
+        cart_id=cart_id,
+        employee_id=employee_id,
+        check_type=check_type,
+        day=config.local_day(submitted_at),
+        dhash=stored.dhash,
+    )
+
+    if db.connected:
+        if not photo_duplicates.is_loaded(org_id):
+            # The index covers every employee's photos, and RLS only
+            # shows a submitter their own: load it with the service role
+            async with db.transaction() as conn:
+                await photo_duplicates.ensure_loaded(conn, org_id, config)
+
+        # The check and its checklist day are written together; memory
+        # (checklist and photo index) takes them once committed
+        async with db.transaction(user) as conn:
+            duplicate = photo_duplicates.find_duplicate(org_id, fingerprint)
+            row = await conn.fetchrow(
+                RECORD_CHECK_SQL,
+                org_id,
+                cart_id,
+                config.local_day(submitted_at),
+                config.bit(check_type),
+                employee_id,
+                submitted_at,
+                config.required_mask,
+            )
+            if row is None:
+                raise _cart_not_found()
+            await conn.execute(
+                INSERT_QUALITY_CHECK_SQL,
+                check_id,
+                org_id,
+                cart_id,
+                employee_id,
+                check_type,
+                stored.url,
+                stored.photo_hash,
+                to_signed(stored.dhash),
+                duplicate.fingerprint.check_id if duplicate else None,
+                duplicate.distance if duplicate else None,
+                submitted_at,
+            )
+        change = checklists.recorded_check(org_id, cart_id, submitted_at, row)
+    else:
+        duplicate = photo_duplicates.find_duplicate(org_id, fingerprint)
+        change = checklists.record_check(
+            org_id, cart_id, check_id, check_type, submitted_at, employee_id
+        )
+    photo_duplicates.add(org_id, fingerprint)
+    _checklist_changed(change)
 
     return {
-        "id": "qc_new",
+        "id": check_id,
         "status": "pending",
+        "photo_url": stored.url,
+        "photo_hash": stored.photo_hash,
+        "suspected_duplicate_of": duplicate.fingerprint.check_id if duplicate else None,
+        "duplicate_distance": duplicate.distance if duplicate else None,
+        "checklist_complete": change.state.completion_time is not None,
         "message": "Quality check submitted successfully",
     }
 
 
+@router.get("/photos/{photo_hash}")
+async def get_photo(
+    request: Request,
+    photo_hash: str,
+    size: str = Query("original", description="thumb, review or original"),
+):
+    """
+    Serve a quality check photo by content hash.
+
+    Smaller sizes are generated on first request and cached. Content
+    never changes for a hash, so responses are cacheable forever;
+    range requests are supported.
+    """
+    if size != "original" and size not in DERIVATIVE_WIDTHS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid size. Must be one of: {['original', *DERIVATIVE_WIDTHS]}",
+        )
+    if not is_photo_hash(photo_hash):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found")
+
+    etag = f'"{photo_hash}-{size}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    try:
+        path = await photo_path(photo_hash, size)
+    except StorageNotConfigured:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Photo storage is not configured",
+        )
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found")
+
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
+
+@router.get("/checklist-config", response_model=ChecklistSettings)
+async def get_checklist_config(
+    user: AuthContext = Depends(current_user),
+):
+    """Get the org's required checks and checklist deadline."""
+    return (await _load_config(user)).to_settings()
+
+
+@router.put(
+    "/checklist-config",
+    response_model=ChecklistSettings,
+    dependencies=[Depends(require_role("owner"))],
+)
+async def update_checklist_config(
+    body: ChecklistSettings,
+    user: AuthContext = Depends(current_user),
+):
+    """
+    Set the org's required checks and checklist deadline.
+
+    New check types become valid for submissions right away.
+    """
+    try:
+        config = (await _load_config(user)).updated(
+            body.required_checks, body.checklist_deadline, body.timezone
+        )
+    except (ValueError, KeyError) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    if db.connected:
+        async with db.transaction(user) as conn:
+            await conn.execute(
+                SAVE_CHECKLIST_CONFIG_SQL, user.org_id, json.dumps(config.to_settings())
+            )
+    checklists.configure(user.org_id, config)
+    return config.to_settings()
+
+
 @router.get("/checklist/{cart_id}", response_model=DailyChecklist)
 async def get_daily_checklist(
     cart_id: str,
+    user: AuthContext = Depends(current_user),
+    org_id: str = Depends(current_org_id),
     date: date = Query(..., description="Date"),
 ):
     """
     Get daily checklist status for a cart.
 
     Shows what's required, what's done, and what's missing.
+    Late means not complete by the org's deadline (11 AM by default).
+    Read from quality_checklist_days (CHECKLIST_DAY_SQL) every time, so
+    checks submitted through any worker show up.
     """
-    # TODO: Implement with Supabase
-    return {
-        "cart_id": cart_id,
-        "cart_name": "Cart 1 - Main",
-        "date": date,
-        "required_checks": ["dirty_water", "garlic_butter", "cart_display"],
-        "completed_checks": ["dirty_water", "garlic_butter"],
-        "missing_checks": ["cart_display"],
-        "complete": False,
-        "completion_time": None,
-        "late": True,  # Past 11 AM deadline
-    }
-
-
-@router.get("/scores/{employee_id}", response_model=QualityScore)
+    await _load_config(user)
+    if db.connected:
+        async with db.transaction(user) as conn:
+            row = await conn.fetchrow(CHECKLIST_DAY_SQL, org_id, cart_id, date)
+        if row is None:
+            raise _cart_not_found()
+        state = day_from_row(org_id, row)
+    else:
+        state = await _load_day(None, org_id, cart_id, date)
+    return checklists.view(org_id, cart_id, date, state)
+
+
+@router.get(
+    "/scores/{employee_id}",
+    response_model=QualityScore,
+    dependencies=[Depends(replica_reads)],
+)
 async def get_employee_quality_score(
     employee_id: str,
+    user: AuthContext = Depends(current_user),
+    org_id: str = Depends(current_org_id),
     start_date: date = Query(..., description="Period start"),
     end_date: date = Query(..., description="Period end"),
 ):
@@ -183,61 +498,107 @@ async def get_employee_quality_score(
 
     This is what triggers the alert:
     "Cart 2 (Brother-in-law) has scored below 80% for 3 consecutive days."
+    (raised by the quality score service as each day closes).
+
+    Any range is answered from cumulative daily totals in O(1); after a
+    restart the org's totals are rebuilt once (on the replica when it
+    has caught up).
     """
-    # TODO: Implement with Supabase aggregation
-    return {
-        "employee_id": employee_id,
-        "employee_name": "Brother-in-law",
-        "period_start": start_date,
-        "period_end": end_date,
-        "total_required": 21,  # 7 days × 3 checks
-        "total_completed": 15,
-        "score": 71.4,  # Below 80% threshold!
-        "on_time_percentage": 60.0,
-        "issues": [
-            {"date": "2024-01-15", "missing": ["garlic_butter"], "late": True},
-            {"date": "2024-01-14", "missing": [], "late": True},
-            {"date": "2024-01-13", "missing": ["garlic_butter", "cart_display"], "late": False},
-        ],
-    }
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must not be before start_date",
+        )
+    await _load_scores(user)
+    employee = quality_scores.employee(employee_id)
+    score = None
+    if employee is not None and employee.org_id == org_id:
+        score = quality_scores.employee_score(employee_id, start_date, end_date)
+    if score is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No quality records for this employee",
+        )
+    return score
 
 
-@router.get("/leaderboard", response_model=Leaderboard)
+@router.get("/leaderboard", response_model=Leaderboard, dependencies=[Depends(replica_reads)])
 async def get_quality_leaderboard(
-    org_id: str = Query(..., description="Organization ID"),
+    user: AuthContext = Depends(current_user),
+    org_id: str = Depends(current_org_id),
     period: str = Query("week", description="Period: week or month"),
+    limit: int = Query(10, ge=1, le=100, description="Number of employees"),
 ):
     """
     Get quality leaderboard.
 
     Creates healthy competition between employees.
     Top performers get recognition (and maybe that AC trailer!).
+
+    Rankings are kept sorted as checks come in; this reads the top
+    `limit` for the current calendar week or month.
     """
-    # TODO: Implement with Supabase aggregation
+    if period not in PERIODS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid period. Must be one of: {list(PERIODS)}",
+        )
+    await _load_scores(user)
+    today = checklists.config(org_id).local_day(datetime.now(timezone.utc))
     return {
         "period": period,
-        "rankings": [
-            {
-                "rank": 1,
-                "employee_id": "emp_poncho",
-                "employee_name": "Poncho",
-                "score": 100.0,
-                "streak_days": 30,
-            },
-            {
-                "rank": 2,
-                "employee_id": "emp_new",
-                "employee_name": "New Hire",
-                "score": 95.2,
-                "streak_days": 7,
-            },
+        "rankings": quality_scores.leaderboard(org_id, period, today, limit),
+    }
+
+
+@router.post("/checks/review", dependencies=[Depends(require_role("owner"))])
+async def review_checks(
+    review: BulkReview,
+    user: AuthContext = Depends(current_user),
+    org_id: str = Depends(current_org_id),
+):
+    """
+    Approve or reject many quality checks at once (owner review).
+
+    Lets an owner clear a fleet's morning photos in one request. All
+    decisions are applied in one transaction with a single UPDATE, and
+    each affected checklist and score is updated once.
+    """
+    reviews = review.reviews
+    if not reviews:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No reviews given")
+    if len(reviews) > MAX_BULK_REVIEWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_REVIEWS} reviews per request",
+        )
+    invalid = [item.check_id for item in reviews if item.status not in REVIEW_STATUSES]
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid status for {invalid}. Must be one of: {list(REVIEW_STATUSES)}",
+        )
+    check_ids = [item.check_id for item in reviews]
+    if len(set(check_ids)) != len(check_ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Each check may appear only once",
+        )
+
+    reviews, changes = await _apply_reviews(user, reviews)
+    for change in changes:
+        _checklist_changed(change)
+
+    return {
+        "updated": len(reviews),
+        "reviews": [item.model_dump() for item in reviews],
+        "checklists": [
             {
-                "rank": 3,
-                "employee_id": "emp_brother",
-                "employee_name": "Brother-in-law",
-                "score": 71.4,
-                "streak_days": 0,  # Broken streak
-            },
+                "cart_id": change.cart_id,
+                "date": change.day,
+                "complete": change.state.completion_time is not None,
+            }
+            for change in changes
         ],
     }
 
@@ -245,20 +606,27 @@ async def get_quality_leaderboard(
 @router.patch("/checks/{check_id}")
 async def update_check_status(
     check_id: str,
-    status: str = Query(..., description="New status: approved or rejected"),
+    new_status: str = Query(..., alias="status", description="New status: approved or rejected"),
     notes: Optional[str] = Query(None, description="Reviewer notes"),
+    user: AuthContext = Depends(require_role("owner")),
 ):
     """
     Update quality check status (owner review).
 
     Allows owner to approve or reject submitted photos.
     """
-    valid_statuses = ["approved", "rejected"]
-    if status not in valid_statuses:
+    if new_status not in REVIEW_STATUSES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid status. Must be one of: {valid_statuses}",
+            detail=f"Invalid status. Must be one of: {list(REVIEW_STATUSES)}",
         )
 
-    # TODO: Implement with Supabase
-    return {"id": check_id, "status": status, "notes": notes}
+    applied, changes = await _apply_reviews(
+        user, [CheckReview(check_id=check_id, status=new_status, notes=notes)]
+    )
+    if not applied:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Quality check not found")
+    for change in changes:
+        _checklist_changed(change)
+
+    return {"id": check_id, "status": new_status, "notes": notes}
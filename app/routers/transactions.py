@@ -7,9 +7,13 @@ Handles revenue data from Square POS.
 from datetime import date, datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel
 
+from app.utils.auth import current_org_id
+from app.utils.database import replica_reads
+from app.utils.responses import fast_list
+
 router = APIRouter()
 
 
@@ -61,7 +65,7 @@ class RevenueTrend(BaseModel):
 
 @router.get("/", response_model=List[Transaction])
 async def list_transactions(
-    org_id: str = Query(..., description="Organization ID"),
+    org_id: str = Depends(current_org_id),
     start_date: date = Query(..., description="Start date"),
     end_date: date = Query(..., description="End date"),
     cart_id: Optional[str] = Query(None, description="Filter by cart"),
@@ -74,7 +78,7 @@ async def list_transactions(
     Supports filtering by cart and/or location.
     """
     # TODO: Implement with Supabase
-    return [
+    rows = [
         {
             "id": "txn_1",
             "square_id": "sq_abc123",
@@ -89,11 +93,12 @@ async def list_transactions(
             "payment_method": "card",
         }
     ]
+    return fast_list(rows, Transaction)
 
 
-@router.get("/summary/daily", response_model=DailySummary)
+@router.get("/summary/daily", response_model=DailySummary, dependencies=[Depends(replica_reads)])
 async def get_daily_summary(
-    org_id: str = Query(..., description="Organization ID"),
+    org_id: str = Depends(current_org_id),
     date: date = Query(..., description="Date to summarize"),
 ):
     """
@@ -122,9 +127,9 @@ async def get_daily_summary(
     }
 
 
-@router.get("/trends", response_model=RevenueTrend)
+@router.get("/trends", response_model=RevenueTrend, dependencies=[Depends(replica_reads)])
 async def get_revenue_trends(
-    org_id: str = Query(..., description="Organization ID"),
+    org_id: str = Depends(current_org_id),
     period: str = Query("daily", description="Aggregation period: daily, weekly, monthly"),
     start_date: date = Query(..., description="Start date"),
     end_date: date = Query(..., description="End date"),
@@ -149,9 +154,9 @@ async def get_revenue_trends(
     }
 
 
-@router.get("/compare")
+@router.get("/compare", dependencies=[Depends(replica_reads)])
 async def compare_periods(
-    org_id: str = Query(..., description="Organization ID"),
+    org_id: str = Depends(current_org_id),
     period1_start: date = Query(...),
     period1_end: date = Query(...),
     period2_start: date = Query(...),
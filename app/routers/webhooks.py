@@ -9,14 +9,68 @@ Handles incoming webhooks from external services:
 
 import hashlib
 import hmac
-from datetime import datetime, timezone
-from typing import Optional
+from datetime import datetime, timezone, tzinfo
+from typing import Any, Dict, Optional, Tuple
 
-from fastapi import APIRouter, Header, HTTPException, Request, status
+import structlog
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
 
 from app.config import settings
+from app.services.checklist import checklists
+from app.services.heartbeat import heartbeats
+from app.services.live_status import live_status
+from app.utils.admission import admit_agent_register, admit_agent_sync, staggered_interval
+from app.utils.database import db
+from app.utils.metrics import observe_lag
 
 router = APIRouter()
+logger = structlog.get_logger(__name__)
+
+
+def _epoch(timestamp: Optional[str]) -> Optional[float]:
+    """Epoch seconds of an ISO 8601 event timestamp, for lag metrics."""
+    if not timestamp:
+        return None
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _sale(record: Dict[str, Any]) -> Optional[Tuple[float, datetime]]:
+    """(amount, timestamp) of a synced transaction; None if either is unusable."""
+    timestamp = record.get("timestamp")
+    try:
+        amount = float(record["amount"])
+        at = datetime.fromisoformat(timestamp) if timestamp else datetime.now(timezone.utc)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return amount, at
+
+
+async def _linked_cart(hardware_id: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(org_id, cart_id) of agent hardware; links made by another worker are looked up."""
+    if not hardware_id:
+        return None
+    linked = live_status.resolve_hardware(hardware_id)
+    if linked is None and db.connected:
+        async with db.transaction() as conn:
+            await live_status.load_bindings(conn, hardware_id)
+        linked = live_status.resolve_hardware(hardware_id)
+    return linked
+
+
+async def _org_timezone(org_id: str) -> tzinfo:
+    """The org's timezone; live revenue is counted per org-local day."""
+    if not checklists.has_config(org_id) and db.connected:
+        async with db.transaction() as conn:
+            await checklists.ensure_config(conn, org_id)
+    return checklists.config(org_id).timezone
 
 
 # ===========================================
@@ -96,6 +150,7 @@ async def square_webhook(
 
     event_type = payload.get("type")
     data = payload.get("data", {}).get("object", {})
+    observe_lag("square", _epoch(payload.get("created_at")))
 
     if event_type == "payment.completed":
         # Extract transaction data
@@ -103,11 +158,22 @@ async def square_webhook(
 
         transaction = {
             "square_id": payment.get("id"),
-            "amount": payment.get("total_money", {}).get("amount", 0) / 100,  # Convert cents
+            "amount": (payment.get("total_money", {}).get("amount") or 0) / 100,  # Convert cents
             "timestamp": datetime.now(timezone.utc),
-            # TODO: Look up cart_id and location_id from Square location
         }
 
+        # Carts are linked to their Square location in carts.settings
+        linked = live_status.resolve_square_location(payment.get("location_id"))
+        if linked is not None:
+            org_id, cart_id = linked
+            live_status.record_transaction(
+                org_id,
+                cart_id,
+                transaction["amount"],
+                transaction["timestamp"],
+                await _org_timezone(org_id),
+            )
+
         # TODO: Save to database
         # TODO: Trigger n8n workflow for real-time updates
 
@@ -191,6 +257,8 @@ async def twilio_status_webhook(request: Request):
 
     message_sid = form_data.get("MessageSid")
     message_status = form_data.get("MessageStatus")  # sent, delivered, failed, etc.
+    # One per message state change: sampled (LOG_SAMPLE_RATES)
+    logger.info("twilio_status_callback", message_sid=message_sid, message_status=message_status)
 
     # TODO: Update message record with delivery status
 
@@ -249,7 +317,7 @@ async def n8n_alert(request: Request):
 # ===========================================
 
 
-@router.post("/agent/sync")
+@router.post("/agent/sync", dependencies=[Depends(admit_agent_sync)])
 async def agent_sync(request: Request):
     """
     Receive sync data from cart hardware agent.
@@ -265,11 +333,40 @@ async def agent_sync(request: Request):
     hardware_id = payload.get("hardware_id")
     sync_type = payload.get("type")  # transactions, gps, quality, status
     data = payload.get("data", [])
+    # Every GPS ping of every cart comes through here: sampled (LOG_SAMPLE_RATES)
+    logger.info("agent_sync", hardware_id=hardware_id, sync_type=sync_type, records=len(data))
 
     # TODO: Validate hardware ID
     # TODO: Process sync data based on type
     # TODO: Return acknowledgment for processed records
 
+    linked = await _linked_cart(hardware_id)
+
+    # Every sync (GPS pings included) from a linked cart doubles as a heartbeat
+    if linked is not None:
+        heartbeats.beat(hardware_id)
+
+    # Lag of the oldest reading: how far behind an offline cart's backlog is
+    if data and sync_type in ("transactions", "gps", "quality", "status"):
+        observe_lag(f"agent_{sync_type}", _epoch(data[0].get("timestamp")))
+
+    # Push the newest reading to live dashboards
+    if data and sync_type == "gps":
+        latest = data[-1]
+        live_status.update_hardware(
+            hardware_id,
+            gps={"lat": latest.get("latitude"), "lng": latest.get("longitude")},
+        )
+    elif data and sync_type == "status":
+        live_status.update_hardware(hardware_id, signal_strength=data[-1].get("signal_strength"))
+    elif data and sync_type == "transactions" and linked is not None:
+        org_id, cart_id = linked
+        tz = await _org_timezone(org_id)
+        for record in data:
+            sale = _sale(record)
+            if sale is not None:
+                live_status.record_transaction(org_id, cart_id, *sale, tz)
+
     return {
         "status": "synced",
         "hardware_id": hardware_id,
@@ -277,7 +374,7 @@ async def agent_sync(request: Request):
     }
 
 
-@router.post("/agent/register")
+@router.post("/agent/register", dependencies=[Depends(admit_agent_register)])
 async def agent_register(request: Request):
     """
     Register new hardware agent.
@@ -290,14 +387,17 @@ async def agent_register(request: Request):
     registration_code = payload.get("registration_code")
 
     # TODO: Validate registration code
-    # TODO: Link hardware to cart record
+    # The owner links hardware to its cart with POST /api/carts/{cart_id}/register
     # TODO: Return configuration for agent
 
     return {
         "status": "registered",
         "hardware_id": hardware_id,
         "config": {
-            "sync_interval_seconds": 60,
+            # Spread per device, so carts that reconnect together drift apart
+            "sync_interval_seconds": staggered_interval(
+                hardware_id, settings.SYNC_INTERVAL_SECONDS
+            ),
             "gps_interval_seconds": 300,
             "api_url": settings.API_BASE_URL,
         },
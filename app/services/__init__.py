@@ -0,0 +1,15 @@
+"""
+FoodCartOS Services
+
+Shared application state and integrations used by the routers:
+- live_status: Live cart status store and per-org push broadcasters
+- assignment_board: Cached, denormalized daily assignment boards
+- assignment_planner: Bulk assignment validation and batched upserts
+- checklist: Per-org checklist config and per-(cart, date) completion bitmasks
+- heartbeat: Timing-wheel online/offline detection for cart hardware
+- n8n: Fire-and-forget n8n workflow triggers
+- photo_duplicates: Perceptual-hash index for spotting reused checklist photos
+- photos: Streaming photo upload, process-pool resize and storage
+- quality_scores: Per-employee daily scores, streaks and sorted leaderboards
+- trajectory: GPS track simplification and compaction
+"""
@@ -0,0 +1,145 @@
+"""
+Daily Assignment Board
+
+Every employee's app loads the day's assignments at shift start, so the
+board for an (org, date) is requested many times within a few minutes.
+It is built once with a single query, cached in memory as ready-to-send
+JSON with an ETag, and dropped whenever the API writes an assignment
+for that date. Edits made outside the API (a cart renamed in the
+Supabase dashboard) show up within ASSIGNMENT_BOARD_TTL_SECONDS.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.config import settings
+
+# Denormalized board for one org and date (cart, location and employee names)
+# $1 = org_id, $2 = date
+ASSIGNMENT_BOARD_SQL = """
+SELECT
+    a.id::text AS id,
+    a.cart_id::text AS cart_id,
+    c.name AS cart_name,
+    a.location_id::text AS location_id,
+    l.name AS location_name,
+    a.employee_id::text AS employee_id,
+    u.name AS employee_name,
+    a.date,
+    to_char(a.shift_start, 'HH24:MI') AS shift_start,
+    to_char(a.shift_end, 'HH24:MI') AS shift_end,
+    a.status
+FROM foodcartos.daily_assignments a
+JOIN foodcartos.carts c ON c.id = a.cart_id
+JOIN foodcartos.locations l ON l.id = a.location_id
+LEFT JOIN foodcartos.users u ON u.id = a.employee_id
+WHERE a.org_id = $1 AND a.date = $2
+ORDER BY c.name
+"""
+
+BoardKey = Tuple[str, date]
+BoardLoader = Callable[[str, date], Awaitable[List[Dict[str, Any]]]]
+
+
+@dataclass
+class Board:
+    """A cached assignment board, serialized once for every reader."""
+
+    rows: List[Dict[str, Any]]
+    body: bytes
+    etag: str
+    built_at: float
+
+    @classmethod
+    def build(cls, rows: List[Dict[str, Any]]) -> "Board":
+        body = json.dumps(rows, default=str, separators=(",", ":")).encode()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        return cls(rows=rows, body=body, etag=etag, built_at=time.monotonic())
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True if the client's If-None-Match header already has this board."""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return self.etag in tags or "*" in tags
+
+
+class AssignmentBoardCache:
+    """
+    Per-(org, date) board cache.
+
+    Concurrent misses for the same board share one load, so the morning
+    rush of app opens costs one query. A board invalidated while it is
+    being loaded is not cached, so a stale read never sticks.
+    """
+
+    def __init__(
+        self,
+        ttl: float = settings.ASSIGNMENT_BOARD_TTL_SECONDS,
+        max_entries: int = settings.ASSIGNMENT_BOARD_MAX_ENTRIES,
+    ):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._boards: "OrderedDict[BoardKey, Board]" = OrderedDict()
+        self._loading: Dict[BoardKey, "asyncio.Future[Board]"] = {}
+        self._stale: Set[BoardKey] = set()  # Invalidated while loading
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, org_id: str, day: date, loader: BoardLoader) -> Board:
+        key = (org_id, day)
+        board = self._boards.get(key)
+        if board is not None and time.monotonic() - board.built_at < self._ttl:
+            self._boards.move_to_end(key)
+            self.hits += 1
+            return board
+
+        pending = self._loading.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future: "asyncio.Future[Board]" = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            board = Board.build(await loader(org_id, day))
+        except asyncio.CancelledError:
+            future.cancel()
+            self._stale.discard(key)
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Waiters get the error; don't warn if nobody was waiting
+            future.exception()
+            self._stale.discard(key)
+            raise
+        finally:
+            self._loading.pop(key, None)
+
+        if key in self._stale:
+            self._stale.discard(key)
+        else:
+            self._boards[key] = board
+            self._boards.move_to_end(key)
+            while len(self._boards) > self._max_entries:
+                self._boards.popitem(last=False)
+        future.set_result(board)
+        return board
+
+    def invalidate(self, org_id: str, day: date) -> None:
+        """Drop one board (an assignment for that date was created or changed)."""
+        key = (org_id, day)
+        self._boards.pop(key, None)
+        if key in self._loading:
+            self._stale.add(key)
+
+
+# Global cache instance
+assignment_board = AssignmentBoardCache()
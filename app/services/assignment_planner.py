@@ -0,0 +1,241 @@
+"""
+Assignment Planner
+
+Validates a week or month of cart assignments in memory against the
+stored ones and writes them with one batched upsert, in one
+transaction. Rows that can't be scheduled are reported back
+individually instead of failing the whole plan.
+"""
+
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+# Existing assignments in the plan window, loaded once for validation
+# $1 = org_id, $2 = first date, $3 = last date
+EXISTING_ASSIGNMENTS_SQL = """
+SELECT cart_id::text AS cart_id, employee_id::text AS employee_id, date, status
+FROM foodcartos.daily_assignments
+WHERE org_id = $1 AND date BETWEEN $2 AND $3
+"""
+
+# Batched upsert of a whole plan. Only 'scheduled' rows are replaced;
+# a shift that already started keeps its assignment.
+# $1 = org_id, $2..$7 = column arrays
+UPSERT_ASSIGNMENTS_SQL = """
+INSERT INTO foodcartos.daily_assignments
+    (org_id, cart_id, location_id, employee_id, date, shift_start, shift_end)
+SELECT $1, v.cart_id, v.location_id, v.employee_id, v.date, v.shift_start, v.shift_end
+FROM unnest($2::uuid[], $3::uuid[], $4::uuid[], $5::date[], $6::time[], $7::time[])
+    AS v(cart_id, location_id, employee_id, date, shift_start, shift_end)
+ON CONFLICT (cart_id, date) DO UPDATE SET
+    location_id = EXCLUDED.location_id,
+    employee_id = EXCLUDED.employee_id,
+    shift_start = EXCLUDED.shift_start,
+    shift_end = EXCLUDED.shift_end
+WHERE foodcartos.daily_assignments.status = 'scheduled'
+RETURNING cart_id::text AS cart_id, date
+"""
+
+
+@dataclass
+class PlanConflict:
+    """A plan row that can't be scheduled."""
+
+    index: int
+    cart_id: str
+    date: date
+    reason: str
+
+
+@dataclass
+class ValidatedPlan:
+    """Rows ready to upsert, plus the ones that were rejected."""
+
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+    indexes: List[int] = field(default_factory=list)  # Position of each row in the request
+    conflicts: List[PlanConflict] = field(default_factory=list)
+
+    @property
+    def dates(self) -> List[date]:
+        return sorted({row["date"] for row in self.rows})
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if value is None:
+        return None
+    return datetime.strptime(value, "%H:%M")
+
+
+def _to_time(value: Optional[str]) -> Optional[time]:
+    parsed = _parse_time(value)
+    return parsed.time() if parsed else None
+
+
+def _canonical_ids(row: Dict[str, Any]) -> Dict[str, Any]:
+    """`row` with its cart, location and employee ids as canonical UUID text."""
+    row = dict(row)
+    for column in ("cart_id", "location_id", "employee_id"):
+        if row.get(column) is not None:
+            row[column] = str(uuid.UUID(row[column]))
+    return row
+
+
+def validate_plan(
+    rows: Sequence[Dict[str, Any]],
+    existing: Iterable[Dict[str, Any]] = (),
+) -> ValidatedPlan:
+    """
+    Check a plan for conflicts without touching the database.
+
+    `existing` are the assignments already stored for the plan window
+    (EXISTING_ASSIGNMENTS_SQL). Accepted rows carry canonical UUID text,
+    as the database returns it. A row conflicts when:
+    - its cart, location or employee id isn't a UUID
+    - its shift times are malformed or end before they start
+    - the same cart appears twice on the same date
+    - the employee already works another cart that date
+    - the cart's stored assignment for that date is past 'scheduled'
+    """
+    plan = ValidatedPlan()
+    locked: Dict[Tuple[str, date], str] = {}
+    booked: Dict[Tuple[str, date], str] = {}  # (employee_id, date) -> cart_id
+
+    for row in existing:
+        key = (row["cart_id"], row["date"])
+        if row["status"] != "scheduled":
+            locked[key] = row["status"]
+        if row.get("employee_id"):
+            booked[(row["employee_id"], row["date"])] = row["cart_id"]
+
+    canonical: List[Optional[Dict[str, Any]]] = []
+    for row in rows:
+        try:
+            canonical.append(_canonical_ids(row))
+        except (TypeError, ValueError):
+            canonical.append(None)
+
+    # Stored bookings on carts this plan reassigns no longer count
+    replaced = {(row["cart_id"], row["date"]) for row in canonical if row is not None}
+    booked = {
+        key: cart_id
+        for key, cart_id in booked.items()
+        if (cart_id, key[1]) not in replaced or (cart_id, key[1]) in locked
+    }
+
+    seen: Dict[Tuple[str, date], int] = {}
+    for index, (row, ids) in enumerate(zip(rows, canonical)):
+
+        def reject(reason: str) -> None:
+            plan.conflicts.append(PlanConflict(index, row["cart_id"], row["date"], reason))
+
+        if ids is None:
+            reject("Cart, location and employee ids must be UUIDs")
+            continue
+        row = ids
+        cart_key = (row["cart_id"], row["date"])
+
+        try:
+            start = _parse_time(row.get("shift_start"))
+            end = _parse_time(row.get("shift_end"))
+        except ValueError:
+            reject("Shift times must be HH:MM")
+            continue
+        if start and end and end <= start:
+            reject("Shift ends before it starts")
+            continue
+
+        if cart_key in seen:
+            reject(f"Cart already assigned on this date by row {seen[cart_key]}")
+            continue
+        if cart_key in locked:
+            reject(f"Existing assignment is {locked[cart_key]}")
+            continue
+
+        employee_id = row.get("employee_id")
+        if employee_id:
+            employee_key = (employee_id, row["date"])
+            other_cart = booked.get(employee_key)
+            if other_cart is not None and other_cart != row["cart_id"]:
+                reject(f"Employee already assigned to cart {other_cart}")
+                continue
+            booked[employee_key] = row["cart_id"]
+
+        seen[cart_key] = index
+        plan.rows.append(row)
+        plan.indexes.append(index)
+
+    return plan
+
+
+def upsert_args(org_id: str, rows: Sequence[Dict[str, Any]]) -> Tuple[Any, ...]:
+    """Column arrays for UPSERT_ASSIGNMENTS_SQL."""
+    return (
+        org_id,
+        [row["cart_id"] for row in rows],
+        [row["location_id"] for row in rows],
+        [row.get("employee_id") for row in rows],
+        [row["date"] for row in rows],
+        [_to_time(row.get("shift_start")) for row in rows],
+        [_to_time(row.get("shift_end")) for row in rows],
+    )
+
+
+def keep_written(plan: ValidatedPlan, written: Iterable[Mapping[str, Any]]) -> None:
+    """
+    Reduce `plan` to the rows UPSERT_ASSIGNMENTS_SQL returned.
+
+    A row it skipped had its shift started after the plan was validated;
+    it moves to the conflicts.
+    """
+    stored = {(row["cart_id"], row["date"]) for row in written}
+    rows, indexes = [], []
+    for row, index in zip(plan.rows, plan.indexes):
+        if (row["cart_id"], row["date"]) in stored:
+            rows.append(row)
+            indexes.append(index)
+        else:
+            plan.conflicts.append(
+                PlanConflict(index, row["cart_id"], row["date"], "Existing assignment has started")
+            )
+    plan.rows, plan.indexes = rows, indexes
+    plan.conflicts.sort(key=lambda conflict: conflict.index)
+
+
+def generate_plan(
+    cart_ids: Sequence[str],
+    start_date: date,
+    end_date: date,
+    scores: Dict[date, List[Dict[str, Any]]],
+    shift_start: Optional[str] = None,
+    shift_end: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Build a plan from location recommendation scores.
+
+    Each day, carts take the highest-scoring locations in order, one cart
+    per location. Days without enough scored locations leave the
+    remaining carts unassigned.
+    """
+    rows = []
+    day = start_date
+    while day <= end_date:
+        ranked = sorted(
+            scores.get(day, []),
+            key=lambda rec: rec["predicted_revenue"],
+            reverse=True,
+        )
+        for cart_id, recommendation in zip(cart_ids, ranked):
+            rows.append(
+                {
+                    "cart_id": cart_id,
+                    "location_id": recommendation["location_id"],
+                    "employee_id": None,
+                    "date": day,
+                    "shift_start": shift_start,
+                    "shift_end": shift_end,
+                }
+            )
+        day += timedelta(days=1)
+    return rows
@@ -0,0 +1,635 @@
+"""
+Daily Checklist State
+
+Each (cart, date) keeps a bitmask with one bit per check type, plus the
+time the checklist was completed. Submitting or reviewing a check flips
+bits in place, so checklist reads and "checklist complete" detection
+never scan quality_checks. With a database the bits are flipped in SQL
+and the committed row replaces the day held in memory, so a rolled-back
+transaction never leaves the two apart. Each worker only sees its own
+writes in memory, so checklist reads go to the table.
+
+Check types and the required subset are configured per org (stored in
+organizations.settings under "quality"). A type keeps its bit for the
+life of the org; new types are appended, so stored masks stay valid
+when the required list changes.
+"""
+
+import json
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from app.config import settings
+from app.services import n8n
+from app.services.live_status import live_status
+
+MAX_CHECK_TYPES = 63  # Bits in a BIGINT mask
+RETAIN_DAYS = 7  # Days kept in memory for late reviews; older days are read back from the table
+
+DayKey = Tuple[str, str, date]  # (org_id, cart_id, date)
+
+# $1 = org_id
+ORG_CHECKLIST_CONFIG_SQL = """
+SELECT settings -> 'quality' AS quality
+FROM foodcartos.organizations
+WHERE id = $1
+"""
+
+# $1 = org_id, $2 = quality settings (JSON)
+SAVE_CHECKLIST_CONFIG_SQL = """
+UPDATE foodcartos.organizations
+SET settings = jsonb_set(COALESCE(settings, '{}'), '{quality}', $2::jsonb),
+    updated_at = NOW()
+WHERE id = $1
+"""
+
+# One cart's day; no row if the cart isn't the org's, day columns NULL
+# if nothing was submitted that day
+# $1 = org_id, $2 = cart_id, $3 = date
+CHECKLIST_DAY_SQL = """
+SELECT d.employee_id::text AS employee_id, d.completed_mask, d.check_counts, d.completion_time
+FROM foodcartos.carts c
+LEFT JOIN foodcartos.quality_checklist_days d ON d.cart_id = c.id AND d.date = $3
+WHERE c.id = $2 AND c.org_id = $1
+"""
+
+# Count one submitted check toward its day. The bit and count change in
+# SQL, so concurrent submissions and other workers never overwrite each
+# other; completion_time is set when this check completes the day.
+# No row is written or returned if the cart isn't the org's.
+# $1 = org_id, $2 = cart_id, $3 = date, $4 = bit, $5 = employee_id,
+# $6 = submitted_at, $7 = required mask
+RECORD_CHECK_SQL = """
+INSERT INTO foodcartos.quality_checklist_days AS d
+    (org_id, cart_id, date, completed_mask, check_counts, completion_time, employee_id)
+SELECT c.org_id, c.id, $3, 1::bigint << $4::int, array_fill(0, ARRAY[$4::int]) || 1,
+       CASE WHEN (1::bigint << $4::int) & $7::bigint = $7::bigint THEN $6::timestamptz END,
+       $5::uuid
+FROM foodcartos.carts c
+WHERE c.id = $2 AND c.org_id = $1
+ON CONFLICT (cart_id, date) DO UPDATE SET
+    employee_id = COALESCE(EXCLUDED.employee_id, d.employee_id),
+    completed_mask = d.completed_mask | EXCLUDED.completed_mask,
+    check_counts = (
+        SELECT array_agg(COALESCE(d.check_counts[i], 0) + (i = $4::int + 1)::int ORDER BY i)
+        FROM generate_series(1, GREATEST(cardinality(d.check_counts), $4::int + 1)) AS i
+    ),
+    completion_time = COALESCE(
+        d.completion_time,
+        CASE WHEN (d.completed_mask | EXCLUDED.completed_mask) & $7::bigint = $7::bigint
+             THEN $6::timestamptz END
+    ),
+    updated_at = NOW()
+RETURNING d.employee_id::text AS employee_id, d.completed_mask, d.check_counts,
+          d.completion_time
+"""
+
+# Many days in one statement (bulk review). check_counts are passed as
+# array literals because unnest() would flatten a 2-D array.
+# $1 = org_ids, $2 = cart_ids, $3 = dates, $4 = completed_masks,
+# $5 = check_counts ('{1,0,1}'), $6 = completion_times, $7 = employee_ids
+UPSERT_CHECKLIST_DAYS_SQL = """
+INSERT INTO foodcartos.quality_checklist_days
+    (org_id, cart_id, date, completed_mask, check_counts, completion_time, employee_id)
+SELECT v.org_id, v.cart_id, v.date, v.completed_mask, v.check_counts::integer[],
+       v.completion_time, v.employee_id
+FROM unnest($1::uuid[], $2::uuid[], $3::date[], $4::bigint[], $5::text[],
+            $6::timestamptz[], $7::uuid[])
+    AS v(org_id, cart_id, date, completed_mask, check_counts, completion_time, employee_id)
+ON CONFLICT (cart_id, date) DO UPDATE SET
+    employee_id = COALESCE(EXCLUDED.employee_id, quality_checklist_days.employee_id),
+    completed_mask = EXCLUDED.completed_mask,
+    check_counts = EXCLUDED.check_counts,
+    completion_time = EXCLUDED.completion_time,
+    updated_at = NOW()
+"""
+
+# $1 = id, $2 = org_id, $3 = cart_id, $4 = employee_id, $5 = check_type,
+# $6 = photo_url, $7 = photo_hash, $8 = photo_dhash (signed),
+# $9 = suspected_duplicate_of, $10 = duplicate_distance, $11 = timestamp
+INSERT_QUALITY_CHECK_SQL = """
+INSERT INTO foodcartos.quality_checks
+    (id, org_id, cart_id, employee_id, check_type, photo_url, photo_hash,
+     photo_dhash, suspected_duplicate_of, duplicate_distance, timestamp)
+VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
+"""
+
+# Apply many review decisions with one set-based UPDATE. Each row comes
+# back with the status the check had before (old_status), read under the
+# row lock, so callers know which decisions changed whether it counts.
+# $1 = org_id, $2 = reviewer_id, $3 = check ids, $4 = statuses, $5 = notes
+BULK_REVIEW_SQL = """
+WITH old AS (
+    SELECT id, status
+    FROM foodcartos.quality_checks
+    WHERE id = ANY($3::uuid[]) AND org_id = $1
+    FOR UPDATE
+)
+UPDATE foodcartos.quality_checks AS q
+SET status = r.status,
+    reviewer_notes = COALESCE(r.notes, q.reviewer_notes),
+    reviewer_id = $2
+FROM unnest($3::uuid[], $4::text[], $5::text[]) AS r(id, status, notes), old
+WHERE q.id = r.id AND old.id = q.id
+RETURNING q.id::text AS id, q.cart_id::text AS cart_id, q.check_type, q.timestamp,
+          q.status, old.status AS old_status
+"""
+
+# The checklist days reviewed checks count toward, locked so their counts
+# change from committed values
+# $1 = org_id, $2 = cart_ids, $3 = dates
+LOCK_CHECKLIST_DAYS_SQL = """
+SELECT d.cart_id::text AS cart_id, d.date, d.employee_id::text AS employee_id,
+       d.completed_mask, d.check_counts, d.completion_time
+FROM foodcartos.quality_checklist_days d
+JOIN unnest($2::uuid[], $3::date[]) AS k(cart_id, date)
+    ON d.cart_id = k.cart_id AND d.date = k.date
+WHERE d.org_id = $1
+FOR UPDATE OF d
+"""
+
+REVIEW_STATUSES = ("approved", "rejected")
+
+
+def _parse_time(value: str) -> time:
+    hours, minutes = value.split(":")
+    return time(int(hours), int(minutes))
+
+
+# ===========================================
+# Configuration
+# ===========================================
+
+
+class ChecklistConfig:
+    """An org's check types (bit order) and which of them are required."""
+
+    def __init__(
+        self,
+        check_types: List[str],
+        required_checks: List[str],
+        deadline: str = settings.QUALITY_CHECKLIST_DEADLINE,
+        timezone_name: str = settings.QUALITY_TIMEZONE,
+    ):
+        if len(check_types) > MAX_CHECK_TYPES:
+            raise ValueError(f"At most {MAX_CHECK_TYPES} check types are supported")
+        unknown = [check for check in required_checks if check not in check_types]
+        if unknown:
+            raise ValueError(f"Unknown required checks: {unknown}")
+
+        self.check_types = list(check_types)
+        self.required_checks = list(required_checks)
+        self.deadline = _parse_time(deadline)
+        self.timezone = ZoneInfo(timezone_name)
+        self._bits = {check: i for i, check in enumerate(self.check_types)}
+        self.required_mask = self.mask(required_checks)
+
+    def bit(self, check_type: str) -> int:
+        """Bit index of a check type; KeyError if the org doesn't use it."""
+        return self._bits[check_type]
+
+    def mask(self, check_types: Iterable[str]) -> int:
+        value = 0
+        for check in check_types:
+            value |= 1 << self._bits[check]
+        return value
+
+    def names(self, mask: int) -> List[str]:
+        """Check types set in `mask`, in bit order."""
+        return [check for i, check in enumerate(self.check_types) if mask >> i & 1]
+
+    def local_day(self, at: datetime) -> date:
+        return at.astimezone(self.timezone).date()
+
+    def deadline_at(self, day: date) -> datetime:
+        return datetime.combine(day, self.deadline, tzinfo=self.timezone)
+
+    def updated(
+        self,
+        required_checks: List[str],
+        deadline: Optional[str] = None,
+        timezone_name: Optional[str] = None,
+    ) -> "ChecklistConfig":
+        """A new config; unseen check types are appended so existing bits don't move."""
+        check_types = self.check_types + [
+            check for check in dict.fromkeys(required_checks) if check not in self._bits
+        ]
+        return ChecklistConfig(
+            check_types,
+            list(dict.fromkeys(required_checks)),
+            deadline or self.deadline.strftime("%H:%M"),
+            timezone_name or str(self.timezone),
+        )
+
+    def to_settings(self) -> Dict[str, Any]:
+        """Value stored at organizations.settings -> 'quality'."""
+        return {
+            "check_types": self.check_types,
+            "required_checks": self.required_checks,
+            "checklist_deadline": self.deadline.strftime("%H:%M"),
+            "timezone": str(self.timezone),
+        }
+
+    @classmethod
+    def from_settings(cls, quality: Optional[Dict[str, Any]]) -> "ChecklistConfig":
+        quality = quality or {}
+        required = quality.get("required_checks", settings.QUALITY_REQUIRED_CHECKS)
+        return cls(
+            quality.get("check_types", required),
+            required,
+            quality.get("checklist_deadline", settings.QUALITY_CHECKLIST_DEADLINE),
+            quality.get("timezone", settings.QUALITY_TIMEZONE),
+        )
+
+
+# ===========================================
+# State
+# ===========================================
+
+
+@dataclass
+class ChecklistDay:
+    """Completion state for one cart on one day."""
+
+    org_id: str
+    employee_id: Optional[str] = None  # Who ran the cart (credited in quality scores)
+    mask: int = 0  # Bit set while at least one non-rejected check of that type exists
+    counts: Dict[int, int] = field(default_factory=dict)  # bit -> non-rejected checks
+    completion_time: Optional[datetime] = None
+
+    def apply(self, bit: int, delta: int) -> None:
+        """Add or remove one non-rejected check of the type at `bit`."""
+        count = self.counts.get(bit, 0) + delta
+        if count > 0:
+            self.counts[bit] = count
+            self.mask |= 1 << bit
+        else:
+            self.counts.pop(bit, None)
+            self.mask &= ~(1 << bit)
+
+
+def day_from_row(org_id: str, row: Optional[Dict[str, Any]]) -> ChecklistDay:
+    """A day from a CHECKLIST_DAY_SQL, RECORD_CHECK_SQL or LOCK_CHECKLIST_DAYS_SQL row."""
+    state = ChecklistDay(org_id=org_id)
+    if row is not None and row["completed_mask"] is not None:
+        state.mask = row["completed_mask"]
+        state.counts = {bit: count for bit, count in enumerate(row["check_counts"] or []) if count}
+        state.completion_time = row["completion_time"]
+        state.employee_id = row["employee_id"]
+    return state
+
+
+@dataclass
+class ChecklistChange:
+    """A day's state after a submission or review."""
+
+    cart_id: str
+    day: date
+    state: ChecklistDay
+    just_completed: bool  # This change completed the checklist
+    reopened: bool  # This change un-completed it (a rejection)
+
+
+@dataclass
+class _TrackedCheck:
+    key: DayKey
+    bit: int
+    rejected: bool
+
+
+class ChecklistStore:
+    """
+    Per-org checklist configuration and per-(org, cart, date) completion
+    masks. Only days in the last RETAIN_DAYS are held; other dates are
+    read back from the table on each request.
+    """
+
+    def __init__(self):
+        self._configs: Dict[str, ChecklistConfig] = {}
+        self._configured: Set[str] = set()  # Orgs whose config was loaded or set
+        self._days: Dict[DayKey, ChecklistDay] = {}
+        self._checks: Dict[str, _TrackedCheck] = {}  # check_id -> where it counts (no database)
+        self._newest_day = date.min
+
+    def config(self, org_id: str) -> ChecklistConfig:
+        config = self._configs.get(org_id)
+        if config is None:
+            config = self._configs[org_id] = ChecklistConfig.from_settings(None)
+        return config
+
+    def configure(self, org_id: str, config: ChecklistConfig) -> None:
+        self._configs[org_id] = config
+        self._configured.add(org_id)
+
+    def has_config(self, org_id: str) -> bool:
+        """False until the org's config is loaded or set (config() falls back to defaults)."""
+        return org_id in self._configured
+
+    async def ensure_config(self, conn: Any, org_id: str) -> ChecklistConfig:
+        """The org's config, read with ORG_CHECKLIST_CONFIG_SQL on first use."""
+        if org_id not in self._configured:
+            quality = await conn.fetchval(ORG_CHECKLIST_CONFIG_SQL, org_id)
+            if org_id not in self._configured:
+                self.configure(
+                    org_id, ChecklistConfig.from_settings(json.loads(quality) if quality else None)
+                )
+        return self.config(org_id)
+
+    def _retained(self, day: date) -> bool:
+        """Whether a day is recent enough to hold in memory (any timezone's today)."""
+        today = datetime.now(timezone.utc).date()
+        return today - timedelta(days=RETAIN_DAYS + 1) <= day <= today + timedelta(days=1)
+
+    def _keep(self, key: DayKey, state: ChecklistDay) -> None:
+        if self._retained(key[2]):
+            self._days[key] = state
+
+    def load_day(
+        self,
+        org_id: str,
+        cart_id: str,
+        day: date,
+        row: Optional[Dict[str, Any]],
+    ) -> ChecklistDay:
+        """A day from a CHECKLIST_DAY_SQL or RECORD_CHECK_SQL row (None if there is none)."""
+        state = day_from_row(org_id, row)
+        self._keep((org_id, cart_id, day), state)
+        return state
+
+    def day(self, org_id: str, cart_id: str, day: date) -> Optional[ChecklistDay]:
+        return self._days.get((org_id, cart_id, day))
+
+    def _advance(self, day: date) -> None:
+        if day > self._newest_day:
+            self._newest_day = day
+            self.prune(day - timedelta(days=RETAIN_DAYS))
+
+    def _apply(
+        self,
+        cart_id: str,
+        day: date,
+        state: ChecklistDay,
+        deltas: Dict[int, int],
+        at: datetime,
+    ) -> ChecklistChange:
+        """Change `state`'s counts by bit, setting or clearing its completion time."""
+        required = self.config(state.org_id).required_mask
+        was_complete = state.mask & required == required
+        for bit, delta in deltas.items():
+            state.apply(bit, delta)
+        complete = state.mask & required == required
+
+        if complete and not was_complete:
+            state.completion_time = at
+        elif was_complete and not complete:
+            state.completion_time = None
+        return ChecklistChange(
+            cart_id=cart_id,
+            day=day,
+            state=state,
+            just_completed=complete and not was_complete,
+            reopened=was_complete and not complete,
+        )
+
+    def _transition(
+        self, org_id: str, cart_id: str, day: date, bit: int, delta: int, at: datetime
+    ) -> ChecklistChange:
+        self._advance(day)
+        state = self._days.get((org_id, cart_id, day))
+        if state is None:
+            state = ChecklistDay(org_id=org_id)
+            self._keep((org_id, cart_id, day), state)
+        return self._apply(cart_id, day, state, {bit: delta}, at)
+
+    def record_check(
+        self,
+        org_id: str,
+        cart_id: str,
+        check_id: str,
+        check_type: str,
+        at: Optional[datetime] = None,
+        employee_id: Optional[str] = None,
+    ) -> ChecklistChange:
+        """Count a newly submitted (pending) check toward its day, in memory only."""
+        config = self.config(org_id)
+        at = at or datetime.now(timezone.utc)
+        day = config.local_day(at)
+        bit = config.bit(check_type)
+        self._checks[check_id] = _TrackedCheck(key=(org_id, cart_id, day), bit=bit, rejected=False)
+        change = self._transition(org_id, cart_id, day, bit, 1, at)
+        if employee_id is not None:
+            change.state.employee_id = employee_id
+        return change
+
+    def recorded_check(
+        self, org_id: str, cart_id: str, at: datetime, row: Dict[str, Any]
+    ) -> ChecklistChange:
+        """Apply the committed RECORD_CHECK_SQL result of a submission."""
+        day = self.config(org_id).local_day(at)
+        self._advance(day)
+        state = self.load_day(org_id, cart_id, day, row)
+        return ChecklistChange(
+            cart_id=cart_id,
+            day=day,
+            state=state,
+            just_completed=state.completion_time == at,  # Set by this statement
+            reopened=False,
+        )
+
+    def review_deltas(
+        self, org_id: str, rows: Iterable[Dict[str, Any]]
+    ) -> Dict[DayKey, Dict[int, int]]:
+        """
+        Count changes per day and bit from BULK_REVIEW_SQL rows. Rejected
+        checks stop counting; approving a previously rejected check counts
+        it again; other decisions change nothing.
+        """
+        config = self.config(org_id)
+        deltas: Dict[DayKey, Dict[int, int]] = {}
+        for row in rows:
+            was_rejected = row["old_status"] == "rejected"
+            if (
+                was_rejected == (row["status"] == "rejected")
+                or row["check_type"] not in config.check_types
+            ):
+                continue
+            key = (org_id, row["cart_id"], config.local_day(row["timestamp"]))
+            bits = deltas.setdefault(key, {})
+            bit = config.bit(row["check_type"])
+            bits[bit] = bits.get(bit, 0) + (1 if was_rejected else -1)
+        return deltas
+
+    def reviewed_days(
+        self,
+        deltas: Dict[DayKey, Dict[int, int]],
+        rows: Iterable[Dict[str, Any]],
+        at: Optional[datetime] = None,
+    ) -> List[ChecklistChange]:
+        """
+        Apply review deltas to the days' locked LOCK_CHECKLIST_DAYS_SQL rows
+        (a day without a row starts empty). Nothing is cached: pass the
+        changes to `keep` once they're committed.
+        """
+        at = at or datetime.now(timezone.utc)
+        locked = {(row["cart_id"], row["date"]): row for row in rows}
+        return [
+            self._apply(cart_id, day, day_from_row(org_id, locked.get((cart_id, day))), bits, at)
+            for (org_id, cart_id, day), bits in deltas.items()
+        ]
+
+    def keep(self, changes: Iterable[ChecklistChange]) -> None:
+        """Cache committed day states."""
+        for change in changes:
+            self._advance(change.day)
+            self._keep((change.state.org_id, change.cart_id, change.day), change.state)
+
+    def tracks(self, check_id: str) -> bool:
+        """Whether a check submitted without a database is known (it can be reviewed)."""
+        return check_id in self._checks
+
+    def set_check_status(
+        self, check_id: str, status: str, at: Optional[datetime] = None
+    ) -> Optional[ChecklistChange]:
+        """
+        Apply a review decision in memory only (no database). Rejected
+        checks stop counting; approving a previously rejected check counts
+        it again. None if that changes nothing or the check isn't tracked.
+        """
+        tracked = self._checks.get(check_id)
+        if tracked is None:
+            return None
+        rejected = status == "rejected"
+        if rejected == tracked.rejected:
+            return None
+        tracked.rejected = rejected
+
+        org_id, cart_id, day = tracked.key
+        return self._transition(
+            org_id,
+            cart_id,
+            day,
+            tracked.bit,
+            -1 if rejected else 1,
+            at or datetime.now(timezone.utc),
+        )
+
+    def set_check_statuses(
+        self, decisions: Iterable[Tuple[str, str]], at: Optional[datetime] = None
+    ) -> List[ChecklistChange]:
+        """
+        Apply many review decisions in memory only; returns one net change
+        per affected day, so downstream state is updated once per day
+        however many of its checks were reviewed.
+        """
+        at = at or datetime.now(timezone.utc)
+        before: Dict[DayKey, bool] = {}
+        for check_id, status in decisions:
+            tracked = self._checks.get(check_id)
+            if tracked is None:
+                continue
+            if tracked.key not in before:
+                state = self._days[tracked.key]
+                required = self.config(state.org_id).required_mask
+                before[tracked.key] = state.mask & required == required
+            self.set_check_status(check_id, status, at)
+
+        changes = []
+        for (org_id, cart_id, day), was_complete in before.items():
+            state = self._days[(org_id, cart_id, day)]
+            required = self.config(state.org_id).required_mask
+            complete = state.mask & required == required
+            changes.append(
+                ChecklistChange(
+                    cart_id=cart_id,
+                    day=day,
+                    state=state,
+                    just_completed=complete and not was_complete,
+                    reopened=was_complete and not complete,
+                )
+            )
+        return changes
+
+    def view(
+        self,
+        org_id: str,
+        cart_id: str,
+        day: date,
+        state: Optional[ChecklistDay] = None,
+        now: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """Required/completed/missing checks and lateness (DailyChecklist fields)."""
+        config = self.config(org_id)
+        state = state or self._days.get((org_id, cart_id, day)) or ChecklistDay(org_id=org_id)
+        completed = state.mask & config.required_mask
+        complete = completed == config.required_mask
+        deadline = config.deadline_at(day)
+        if complete:
+            late = state.completion_time is not None and state.completion_time > deadline
+        else:
+            late = (now or datetime.now(timezone.utc)) > deadline
+        return {
+            "cart_id": cart_id,
+            "date": day,
+            "required_checks": config.required_checks,
+            "completed_checks": config.names(completed),
+            "missing_checks": config.names(config.required_mask & ~state.mask),
+            "complete": complete,
+            "completion_time": state.completion_time if complete else None,
+            "late": late,
+        }
+
+    def upsert_many_args(self, changes: Iterable[ChecklistChange]) -> Tuple[List[Any], ...]:
+        """Column arrays for UPSERT_CHECKLIST_DAYS_SQL."""
+        columns: Tuple[List[Any], ...] = ([], [], [], [], [], [], [])
+        for change in changes:
+            state = change.state
+            width = max(state.counts, default=-1) + 1
+            counts = [state.counts.get(bit, 0) for bit in range(width)]
+            for column, value in zip(
+                columns,
+                (
+                    state.org_id,
+                    change.cart_id,
+                    change.day,
+                    state.mask,
+                    "{" + ",".join(map(str, counts)) + "}",
+                    state.completion_time,
+                    state.employee_id,
+                ),
+            ):
+                column.append(value)
+        return columns
+
+    def prune(self, before: date) -> None:
+        """Forget days older than `before`; they're persisted and no longer change."""
+        for key in [key for key in self._days if key[2] < before]:
+            del self._days[key]
+        for check_id in [cid for cid, tracked in self._checks.items() if tracked.key[2] < before]:
+            del self._checks[check_id]
+
+
+# Global store instance
+checklists = ChecklistStore()
+
+
+def publish_change(change: ChecklistChange) -> None:
+    """Push a completion change to dashboards and n8n."""
+    if not (change.just_completed or change.reopened):
+        return
+    state = change.state
+    config = checklists.config(state.org_id)
+    if change.day == config.local_day(datetime.now(timezone.utc)):
+        live_status.update(state.org_id, change.cart_id, checklist_complete=change.just_completed)
+    if change.just_completed and state.completion_time is not None:
+        n8n.notify(
+            "checklist-complete",
+            {
+                "org_id": state.org_id,
+                "cart_id": change.cart_id,
+                "date": change.day.isoformat(),
+                "completion_time": state.completion_time.isoformat(),
+                "late": state.completion_time > config.deadline_at(change.day),
+            },
+        )
@@ -0,0 +1,194 @@
+"""
+Cart Heartbeats
+
+Tracks which carts are online from agent syncs and GPS pings. Only
+hardware linked to a registered cart is tracked (live_status bindings).
+
+Every heartbeat re-arms the cart's offline deadline on a timing wheel, an
+O(1) move between slots, and a background tick expires one slot at a time.
+All carts share the same timeout, so a single wheel spanning that timeout
+is enough; no hierarchy or per-read timestamp comparison is needed.
+`last_seen` writes are coalesced and flushed as one batched UPDATE.
+
+The wheel lives in the worker's memory and only sees the heartbeats that
+worker receives, so the API must run as a single worker (uvicorn's
+default): with several, each would report carts offline whose beats went
+to another worker.
+"""
+
+import asyncio
+import math
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set
+
+import structlog
+
+from app.config import settings
+from app.services import n8n
+from app.services.live_status import live_status
+from app.utils.database import db
+
+logger = structlog.get_logger(__name__)
+
+# Batched last_seen write; newer values only, so late flushes never rewind
+# $1 = hardware_ids, $2 = last_seen timestamps
+LAST_SEEN_FLUSH_SQL = """
+UPDATE foodcartos.carts AS c
+SET last_seen = v.last_seen
+FROM unnest($1::text[], $2::timestamptz[]) AS v(hardware_id, last_seen)
+WHERE c.hardware_id = v.hardware_id
+  AND (c.last_seen IS NULL OR c.last_seen < v.last_seen)
+"""
+
+
+class HeartbeatTracker:
+    """
+    Online/offline detection for cart hardware.
+
+    A cart goes offline when no heartbeat arrives for `timeout` seconds
+    (accurate to one tick), and back online on its next heartbeat.
+    Transitions update live dashboards and notify n8n.
+    """
+
+    def __init__(
+        self,
+        timeout: int = settings.CART_OFFLINE_AFTER_SECONDS,
+        tick: int = settings.HEARTBEAT_TICK_SECONDS,
+        flush_every: int = settings.LAST_SEEN_FLUSH_SECONDS,
+    ):
+        self._tick = tick
+        self._flush_every = flush_every
+        self._ticks_ahead = max(1, math.ceil(timeout / tick))
+        self._slots: List[Set[str]] = [set() for _ in range(self._ticks_ahead + 1)]
+        self._cursor = 0
+        self._slot_of: Dict[str, int] = {}  # Online hardware -> slot index
+        self._offline: Set[str] = set()  # Hardware we've reported offline
+        self._dirty: Dict[str, datetime] = {}  # Pending last_seen writes
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def online_count(self) -> int:
+        return len(self._slot_of)
+
+    @property
+    def pending_writes(self) -> int:
+        return len(self._dirty)
+
+    def is_online(self, hardware_id: str) -> bool:
+        return hardware_id in self._slot_of
+
+    def beat(self, hardware_id: str, at: Optional[datetime] = None) -> bool:
+        """
+        Record a heartbeat from cart hardware. Hardware not linked to a
+        cart is not tracked; returns whether the beat was recorded.
+        """
+        if live_status.resolve_hardware(hardware_id) is None:
+            return False
+        slot = self._slot_of.get(hardware_id)
+        if slot is not None:
+            self._slots[slot].discard(hardware_id)
+        else:
+            self._went_online(hardware_id)
+
+        slot = (self._cursor + self._ticks_ahead) % len(self._slots)
+        self._slots[slot].add(hardware_id)
+        self._slot_of[hardware_id] = slot
+        self._dirty[hardware_id] = at or datetime.now(timezone.utc)
+        return True
+
+    def advance(self) -> None:
+        """Move the wheel one tick and expire carts whose deadline passed."""
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        expired, self._slots[self._cursor] = self._slots[self._cursor], set()
+        for hardware_id in expired:
+            del self._slot_of[hardware_id]
+            self._went_offline(hardware_id)
+
+    def drain(self) -> Dict[str, datetime]:
+        """Take the pending last_seen writes."""
+        dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    async def flush(self) -> None:
+        """
+        Persist coalesced last_seen values in one statement. If the write
+        fails they are put back for the next flush, unless a newer beat
+        has replaced them meanwhile.
+        """
+        dirty = self.drain()
+        if not dirty or not db.connected:
+            return
+        try:
+            async with db.transaction() as conn:
+                await conn.execute(LAST_SEEN_FLUSH_SQL, list(dirty), list(dirty.values()))
+        except BaseException:
+            for hardware_id, last_seen in dirty.items():
+                newer = self._dirty.get(hardware_id)
+                if newer is None or newer < last_seen:
+                    self._dirty[hardware_id] = last_seen
+            raise
+
+    def _went_online(self, hardware_id: str) -> None:
+        live_status.update_hardware(hardware_id, online=True)
+        if hardware_id in self._offline:
+            self._offline.discard(hardware_id)
+            self._alert("cart-online", hardware_id)
+
+    def _went_offline(self, hardware_id: str) -> None:
+        live_status.update_hardware(hardware_id, online=False)
+        self._offline.add(hardware_id)
+        self._alert("cart-offline", hardware_id)
+
+    def _alert(self, workflow: str, hardware_id: str) -> None:
+        linked = live_status.resolve_hardware(hardware_id)
+        if linked is None:
+            return
+        org_id, cart_id = linked
+        n8n.notify(
+            workflow,
+            {
+                "hardware_id": hardware_id,
+                "org_id": org_id,
+                "cart_id": cart_id,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+            },
+        )
+
+    # ===========================================
+    # Background loop
+    # ===========================================
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time() + self._tick
+        next_flush = loop.time() + self._flush_every
+        while True:
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            # Catch up if the loop was blocked for more than a tick
+            while loop.time() >= next_tick:
+                self.advance()
+                next_tick += self._tick
+            if loop.time() >= next_flush:
+                next_flush = loop.time() + self._flush_every
+                try:
+                    await self.flush()
+                except Exception as exc:
+                    logger.error("last_seen_flush_failed", error=str(exc))
+
+
+# Global tracker instance
+heartbeats = HeartbeatTracker()
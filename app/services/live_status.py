@@ -0,0 +1,407 @@
+"""
+Live Cart Status
+
+Keeps the latest known status of every cart in memory and pushes changes
+to owner dashboards. Each organization gets a single broadcaster that
+coalesces changes and serializes each delta once, no matter how many
+dashboards are connected.
+"""
+
+import asyncio
+import json
+import time
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from app.config import settings
+
+# Fields that make up a cart's live status (mirrors carts.CartStatus)
+STATUS_FIELDS = (
+    "online",
+    "gps",
+    "last_transaction",
+    "today_revenue",
+    "checklist_complete",
+    "signal_strength",
+)
+
+
+# One set-based query for the whole fleet: latest GPS fix, today's revenue
+# and today's checklist progress for every cart in an org.
+# $1 = org_id, $2 = start of today (org local time, as timestamptz)
+FLEET_STATUS_SQL = """
+SELECT
+    c.id::text AS cart_id,
+    c.last_seen,
+    gps.latitude,
+    gps.longitude,
+    rev.last_transaction,
+    COALESCE(rev.today_revenue, 0) AS today_revenue,
+    COALESCE(qc.completed_checks, 0) AS completed_checks
+FROM foodcartos.carts c
+LEFT JOIN LATERAL (
+    SELECT g.latitude, g.longitude
+    FROM foodcartos.gps_pings g
+    WHERE g.cart_id = c.id
+    ORDER BY g.timestamp DESC
+    LIMIT 1
+) gps ON TRUE
+LEFT JOIN (
+    SELECT cart_id, SUM(amount) AS today_revenue, MAX(timestamp) AS last_transaction
+    FROM foodcartos.transactions
+    WHERE org_id = $1 AND timestamp >= $2
+    GROUP BY cart_id
+) rev ON rev.cart_id = c.id
+LEFT JOIN (
+    SELECT cart_id, COUNT(DISTINCT check_type) AS completed_checks
+    FROM foodcartos.quality_checks
+    WHERE org_id = $1 AND timestamp >= $2 AND status <> 'rejected'
+    GROUP BY cart_id
+) qc ON qc.cart_id = c.id
+WHERE c.org_id = $1
+ORDER BY c.name
+"""
+
+# Carts linked to agent hardware or to a Square location (carts.settings),
+# so agent syncs and Square payments can be attributed.
+# $1 = one hardware_id, or NULL for every linked cart
+CART_BINDINGS_SQL = """
+SELECT c.id::text AS cart_id, c.org_id::text AS org_id, c.hardware_id,
+       c.settings->>'square_location_id' AS square_location_id
+FROM foodcartos.carts c
+WHERE (c.hardware_id IS NOT NULL OR c.settings ? 'square_location_id')
+  AND ($1::text IS NULL OR c.hardware_id = $1)
+"""
+
+
+def _default_status(cart_id: str) -> Dict[str, Any]:
+    return {
+        "cart_id": cart_id,
+        "online": False,
+        "gps": None,
+        "last_transaction": None,
+        "today_revenue": 0.0,
+        "checklist_complete": False,
+        "signal_strength": None,
+    }
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def encode_frame(payload: Dict[str, Any]) -> str:
+    """Serialize a push frame to JSON."""
+    return json.dumps(payload, default=_json_default, separators=(",", ":"))
+
+
+# ===========================================
+# Subscriptions
+# ===========================================
+
+
+class Subscription:
+    """
+    A single dashboard connection.
+
+    Frames are pre-serialized by the broadcaster and shared by every
+    subscriber. A slow client that lets its queue fill up is not allowed
+    to hold frames back: its backlog is dropped and it gets a fresh
+    snapshot instead.
+    """
+
+    _RESYNC = None  # Queue marker: send a full snapshot
+
+    def __init__(self, broadcaster: "OrgBroadcaster", maxsize: int):
+        self._broadcaster = broadcaster
+        self._queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize=maxsize)
+
+    def push(self, frame: str) -> None:
+        try:
+            self._queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(self._RESYNC)
+
+    async def frames(self, keepalive: float) -> AsyncIterator[str]:
+        """
+        Yield serialized frames for this connection.
+
+        Starts with a full snapshot of the fleet, then deltas. A keepalive
+        frame is sent when nothing changed for `keepalive` seconds so dead
+        connections are noticed.
+        """
+        yield self._broadcaster.snapshot_frame()
+        while True:
+            try:
+                frame = await asyncio.wait_for(self._queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield encode_frame({"type": "keepalive"})
+                continue
+            if frame is self._RESYNC:
+                yield self._broadcaster.snapshot_frame()
+            else:
+                yield frame
+
+    def close(self) -> None:
+        self._broadcaster.unsubscribe(self)
+
+
+# ===========================================
+# Broadcasting
+# ===========================================
+
+
+class OrgBroadcaster:
+    """
+    Fan-out of live status changes for one organization.
+
+    Changes are merged per cart while a flush is pending, so a cart that
+    reports GPS, revenue and signal in the same second produces a single
+    delta. Flushes are rate-limited to one per `interval` seconds.
+    """
+
+    def __init__(self, store: "LiveStatusStore", org_id: str, interval: float, queue_size: int):
+        self._store = store
+        self.org_id = org_id
+        self._interval = interval
+        self._queue_size = queue_size
+        self._subscribers: Set[Subscription] = set()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._last_flush = 0.0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def pending_count(self) -> int:
+        """Carts with changes waiting for the next flush."""
+        return len(self._pending)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self, self._queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+        if not self._subscribers:
+            self._pending.clear()
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+                self._flush_handle = None
+
+    def snapshot_frame(self) -> str:
+        return encode_frame({"type": "snapshot", "carts": self._store.snapshot(self.org_id)})
+
+    def publish(self, cart_id: str, changes: Dict[str, Any]) -> None:
+        """Queue changed fields for the next flush."""
+        if not self._subscribers:
+            # Nobody is watching; new subscribers start from a snapshot
+            return
+
+        self._pending.setdefault(cart_id, {}).update(changes)
+
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            delay = max(0.0, self._last_flush + self._interval - time.monotonic())
+            self._flush_handle = loop.call_later(delay, self._flush)
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        frame = encode_frame({"type": "delta", "carts": pending})
+        for subscription in list(self._subscribers):
+            subscription.push(frame)
+
+
+# ===========================================
+# Store
+# ===========================================
+
+
+class LiveStatusStore:
+    """Latest status of every cart, grouped by organization."""
+
+    def __init__(
+        self,
+        interval: float = settings.LIVE_STATUS_PUSH_INTERVAL_SECONDS,
+        queue_size: int = settings.LIVE_STATUS_QUEUE_SIZE,
+    ):
+        self._interval = interval
+        self._queue_size = queue_size
+        self._carts: Dict[str, Dict[str, Dict[str, Any]]] = {}  # org_id -> cart_id -> status
+        self._hardware: Dict[str, Tuple[str, str]] = {}  # hardware_id -> (org_id, cart_id)
+        self._square: Dict[str, Tuple[str, str]] = {}  # Square location_id -> (org_id, cart_id)
+        self._revenue_dates: Dict[str, date] = {}
+        self._hydrated: Dict[str, date] = {}  # org_id -> local day the org was loaded for
+        self._broadcasters: Dict[str, OrgBroadcaster] = {}
+
+    def broadcaster(self, org_id: str) -> OrgBroadcaster:
+        broadcaster = self._broadcasters.get(org_id)
+        if broadcaster is None:
+            broadcaster = OrgBroadcaster(self, org_id, self._interval, self._queue_size)
+            self._broadcasters[org_id] = broadcaster
+        return broadcaster
+
+    def subscribe(self, org_id: str) -> Subscription:
+        return self.broadcaster(org_id).subscribe()
+
+    @property
+    def pending_deltas(self) -> int:
+        """Cart changes across all orgs waiting to be pushed to dashboards."""
+        return sum(broadcaster.pending_count for broadcaster in self._broadcasters.values())
+
+    def get(self, org_id: str, cart_id: str) -> Optional[Dict[str, Any]]:
+        """A cart's status, if it is tracked for `org_id`."""
+        status = self._carts.get(org_id, {}).get(cart_id)
+        return dict(status) if status is not None else None
+
+    def snapshot(self, org_id: str) -> List[Dict[str, Any]]:
+        return [dict(status) for status in self._carts.get(org_id, {}).values()]
+
+    def bind_hardware(self, hardware_id: str, org_id: str, cart_id: str) -> None:
+        """Link a Raspberry Pi to its cart so agent syncs can update status."""
+        self._hardware[hardware_id] = (org_id, cart_id)
+
+    def resolve_hardware(self, hardware_id: str) -> Optional[Tuple[str, str]]:
+        return self._hardware.get(hardware_id)
+
+    def resolve_square_location(self, location_id: str) -> Optional[Tuple[str, str]]:
+        return self._square.get(location_id)
+
+    async def load_bindings(self, conn: Any, hardware_id: Optional[str] = None) -> int:
+        """
+        Bind carts from CART_BINDINGS_SQL: every linked cart (at startup),
+        or the one with `hardware_id` (an agent linked by another worker).
+        Returns the number of carts bound.
+        """
+        rows = await conn.fetch(CART_BINDINGS_SQL, hardware_id)
+        for row in rows:
+            if row["hardware_id"]:
+                self.bind_hardware(row["hardware_id"], row["org_id"], row["cart_id"])
+            if row["square_location_id"]:
+                self._square[row["square_location_id"]] = (row["org_id"], row["cart_id"])
+        return len(rows)
+
+    def update(self, org_id: str, cart_id: str, **fields: Any) -> Dict[str, Any]:
+        """
+        Apply status fields for a cart.
+
+        Returns only the fields that actually changed; unchanged values
+        are not pushed to dashboards.
+        """
+        carts = self._carts.setdefault(org_id, {})
+        status = carts.get(cart_id)
+        if status is None:
+            status = carts[cart_id] = _default_status(cart_id)
+
+        changes = {
+            key: value
+            for key, value in fields.items()
+            if key in STATUS_FIELDS and status.get(key) != value
+        }
+        if changes:
+            status.update(changes)
+            broadcaster = self._broadcasters.get(org_id)
+            if broadcaster is not None:
+                broadcaster.publish(cart_id, changes)
+        return changes
+
+    def hydrated_day(self, org_id: str) -> Optional[date]:
+        """The org-local day the org's fleet was last loaded for, if any."""
+        return self._hydrated.get(org_id)
+
+    def hydrate(
+        self,
+        org_id: str,
+        rows: List[Dict[str, Any]],
+        required_checks: int,
+        now: Optional[datetime] = None,
+        day: Optional[date] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Load the fleet from FLEET_STATUS_SQL rows for the org-local `day`.
+
+        Used when an org's fleet hasn't been loaded for the current day
+        (process start, new org, day rollover) so the fleet endpoint never
+        falls back to one query per cart. Carts only seen through live
+        updates so far are completed by the load.
+        """
+        now = now or datetime.now(timezone.utc)
+        offline_after = timedelta(seconds=settings.CART_OFFLINE_AFTER_SECONDS)
+
+        for row in rows:
+            last_seen = row.get("last_seen")
+            gps = None
+            if row.get("latitude") is not None:
+                gps = {"lat": float(row["latitude"]), "lng": float(row["longitude"])}
+            last_transaction = row.get("last_transaction")
+            if last_transaction is not None:
+                self._revenue_dates[row["cart_id"]] = last_transaction.date()
+
+            self.update(
+                org_id,
+                row["cart_id"],
+                online=last_seen is not None and now - last_seen <= offline_after,
+                gps=gps,
+                last_transaction=last_transaction,
+                today_revenue=float(row.get("today_revenue") or 0),
+                checklist_complete=(row.get("completed_checks") or 0) >= required_checks,
+            )
+        if day is not None:
+            self._hydrated[org_id] = day
+        return self.snapshot(org_id)
+
+    def update_hardware(self, hardware_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+        """Apply status fields for the cart linked to `hardware_id`, if known."""
+        linked = self._hardware.get(hardware_id)
+        if linked is None:
+            return None
+        org_id, cart_id = linked
+        return self.update(org_id, cart_id, **fields)
+
+    def record_transaction(
+        self,
+        org_id: str,
+        cart_id: str,
+        amount: float,
+        timestamp: datetime,
+        tz: tzinfo,
+    ) -> Dict[str, Any]:
+        """
+        Add a sale to today's revenue, starting a new total on a new day.
+
+        Days are the org's local days (`tz`), as in `hydrate`. Only sales
+        from the current day count: a backlog from an earlier day (a cart
+        catching up after a dead zone) is ignored rather than replacing
+        today's total.
+        """
+        today = datetime.now(tz).date()
+        if timestamp.astimezone(tz).date() != today:
+            return {}
+        status = self.get(org_id, cart_id)
+        revenue = status["today_revenue"] if status else 0.0
+        if self._revenue_dates.get(cart_id) != today:
+            self._revenue_dates[cart_id] = today
+            revenue = 0.0
+
+        return self.update(
+            org_id,
+            cart_id,
+            today_revenue=round(revenue + amount, 2),
+            last_transaction=timestamp,
+        )
+
+
+# Global store instance
+live_status = LiveStatusStore()
@@ -0,0 +1,60 @@
+"""
+n8n Workflow Triggers
+
+Fire-and-forget calls to n8n webhooks (alerts, checklist completion).
+Request handlers never wait on n8n; failures are reported, not raised.
+"""
+
+import asyncio
+from typing import Any, Dict, Optional, Set
+
+import httpx
+import structlog
+
+from app.config import settings
+
+_client: Optional[httpx.AsyncClient] = None
+_pending: Set["asyncio.Task[None]"] = set()
+
+logger = structlog.get_logger(__name__)
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=10.0, verify=settings.VERIFY_SSL)
+    return _client
+
+
+async def trigger(workflow: str, payload: Dict[str, Any]) -> None:
+    """POST a payload to an n8n webhook, e.g. trigger("cart-offline", {...})."""
+    if not settings.N8N_WEBHOOK_BASE_URL:
+        return
+    url = f"{settings.N8N_WEBHOOK_BASE_URL.rstrip('/')}/{workflow}"
+    try:
+        response = await _get_client().post(url, json=payload)
+        response.raise_for_status()
+    except httpx.HTTPError as exc:
+        logger.warning("n8n_webhook_failed", workflow=workflow, error=str(exc))
+
+
+def pending_count() -> int:
+    """Triggers scheduled but not yet delivered."""
+    return len(_pending)
+
+
+def notify(workflow: str, payload: Dict[str, Any]) -> None:
+    """Schedule trigger() without waiting for it."""
+    task = asyncio.get_running_loop().create_task(trigger(workflow, payload))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+async def close() -> None:
+    """Wait for queued triggers and close the HTTP client (shutdown)."""
+    global _client
+    if _pending:
+        await asyncio.gather(*_pending, return_exceptions=True)
+    if _client is not None:
+        await _client.aclose()
+        _client = None
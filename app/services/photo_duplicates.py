@@ -0,0 +1,300 @@
+"""
+Reused Photo Detection
+
+A quality check is only worth something if the photo was taken today.
+Every processed photo gets a 64-bit difference hash (dHash), which barely
+changes under re-compression, resizing or small crops, so yesterday's
+garlic-butter shot resubmitted today lands within a few bits of the
+original.
+
+Each org keeps an in-memory index of its recent photo hashes. Lookups use
+multi-index hashing: the hash is split into four 16-bit chunks, and any
+hash within `r` bits of the query must match at least one chunk to within
+r // 4 bits (pigeonhole), so a lookup probes a handful of buckets instead
+of scanning every stored hash.
+
+An org's index is rebuilt from quality_checks (RECENT_FINGERPRINTS_SQL)
+the first time the worker sees a submission for it, and a photo joins the
+index only once its check is committed. Each worker keeps its own index,
+so it misses photos other workers accepted since its load.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from itertools import combinations
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.services.checklist import ChecklistConfig
+
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+# Fingerprints inside the duplicate window, to rebuild an org's index
+# $1 = org_id, $2 = start of the first day, $3 = org timezone (local days)
+RECENT_FINGERPRINTS_SQL = """
+SELECT id::text AS check_id, cart_id::text AS cart_id, employee_id::text AS employee_id,
+       check_type, (timestamp AT TIME ZONE $3)::date AS day, photo_dhash
+FROM foodcartos.quality_checks
+WHERE org_id = $1 AND photo_dhash IS NOT NULL
+  AND timestamp >= $2
+ORDER BY timestamp
+"""
+
+
+def dhash(image: Any) -> int:
+    """
+    64-bit difference hash of a PIL image.
+
+    The image is shrunk to 9x8 grayscale; each bit records whether a pixel
+    is brighter than its right-hand neighbour.
+    """
+    from PIL import Image
+
+    small = image.convert("L").resize((9, 8), Image.Resampling.BOX)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def to_signed(value: int) -> int:
+    """Unsigned 64-bit hash -> Postgres BIGINT."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value: int) -> int:
+    """Postgres BIGINT -> unsigned 64-bit hash."""
+    return value & ((1 << 64) - 1)
+
+
+def _chunks(value: int) -> List[int]:
+    return [(value >> (i * CHUNK_BITS)) & CHUNK_MASK for i in range(CHUNKS)]
+
+
+def _flip_masks(bits: int, max_flips: int) -> List[int]:
+    """Every mask over `bits` bits with at most `max_flips` bits set."""
+    return [
+        sum(1 << bit for bit in flipped)
+        for count in range(max_flips + 1)
+        for flipped in combinations(range(bits), count)
+    ]
+
+
+# ===========================================
+# Index
+# ===========================================
+
+
+@dataclass
+class PhotoFingerprint:
+    """A submitted photo's hash and the check it belongs to."""
+
+    check_id: str
+    cart_id: str
+    employee_id: str
+    check_type: str
+    day: date
+    dhash: int
+
+
+@dataclass
+class DuplicateMatch:
+    """An earlier photo that a new submission looks like."""
+
+    fingerprint: PhotoFingerprint
+    distance: int  # Differing bits out of 64
+
+
+class HammingIndex:
+    """
+    Multi-index hash table over 64-bit hashes for radius queries.
+
+    `max_distance` fixes how many bit flips each chunk probe covers; a
+    query with a smaller radius is still exact.
+    """
+
+    def __init__(self, max_distance: int):
+        self._max_distance = max_distance
+        self._probes = _flip_masks(CHUNK_BITS, max_distance // CHUNKS)
+        self._tables: List[Dict[int, Set[int]]] = [{} for _ in range(CHUNKS)]
+        self._items: Dict[int, PhotoFingerprint] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, fingerprint: PhotoFingerprint) -> int:
+        """Index a fingerprint; returns a handle for remove()."""
+        handle = self._next_id
+        self._next_id += 1
+        self._items[handle] = fingerprint
+        for table, chunk in zip(self._tables, _chunks(fingerprint.dhash)):
+            table.setdefault(chunk, set()).add(handle)
+        return handle
+
+    def get(self, handle: int) -> PhotoFingerprint:
+        return self._items[handle]
+
+    def remove(self, handle: int) -> None:
+        fingerprint = self._items.pop(handle, None)
+        if fingerprint is None:
+            return
+        for table, chunk in zip(self._tables, _chunks(fingerprint.dhash)):
+            bucket = table[chunk]
+            bucket.discard(handle)
+            if not bucket:
+                del table[chunk]
+
+    def search(self, value: int, max_distance: Optional[int] = None) -> List[DuplicateMatch]:
+        """Every indexed fingerprint within `max_distance` bits, closest first."""
+        if max_distance is None:
+            max_distance = self._max_distance
+        if max_distance > self._max_distance:
+            raise ValueError(f"Index was built for distances up to {self._max_distance}")
+
+        seen: Set[int] = set()
+        matches: List[DuplicateMatch] = []
+        for table, chunk in zip(self._tables, _chunks(value)):
+            for probe in self._probes:
+                bucket = table.get(chunk ^ probe)
+                if not bucket:
+                    continue
+                for handle in bucket:
+                    if handle in seen:
+                        continue
+                    seen.add(handle)
+                    fingerprint = self._items[handle]
+                    distance = (fingerprint.dhash ^ value).bit_count()
+                    if distance <= max_distance:
+                        matches.append(DuplicateMatch(fingerprint, distance))
+        matches.sort(key=lambda match: match.distance)
+        return matches
+
+
+class OrgPhotoIndex:
+    """An org's fingerprints from the last `window_days` days."""
+
+    def __init__(self, max_distance: int, window_days: int):
+        self._window = timedelta(days=window_days)
+        self.index = HammingIndex(max_distance)
+        self._order: Deque[Tuple[date, int]] = deque()  # (day, handle), oldest first
+
+    def add(self, fingerprint: PhotoFingerprint) -> None:
+        handle = self.index.add(fingerprint)
+        self._order.append((fingerprint.day, handle))
+
+    def fingerprints(self) -> List[PhotoFingerprint]:
+        return [self.index.get(handle) for _, handle in self._order]
+
+    def prune(self, today: date) -> None:
+        cutoff = today - self._window
+        while self._order and self._order[0][0] < cutoff:
+            _, handle = self._order.popleft()
+            self.index.remove(handle)
+
+
+class DuplicatePhotoIndex:
+    """
+    Per-org recent photo fingerprints.
+
+    A match is suspicious unless it's a retake: the same cart and check
+    type on the same day.
+    """
+
+    def __init__(
+        self,
+        max_distance: int = settings.PHOTO_DUPLICATE_MAX_DISTANCE,
+        window_days: int = settings.PHOTO_DUPLICATE_WINDOW_DAYS,
+    ):
+        self._max_distance = max_distance
+        self._window_days = window_days
+        self._orgs: Dict[str, OrgPhotoIndex] = {}
+        self._loaded: Set[str] = set()  # Orgs rebuilt from RECENT_FINGERPRINTS_SQL
+
+    def _org(self, org_id: str) -> OrgPhotoIndex:
+        org = self._orgs.get(org_id)
+        if org is None:
+            org = self._orgs[org_id] = OrgPhotoIndex(self._max_distance, self._window_days)
+        return org
+
+    def size(self, org_id: str) -> int:
+        org = self._orgs.get(org_id)
+        return len(org.index) if org else 0
+
+    def is_loaded(self, org_id: str) -> bool:
+        return org_id in self._loaded
+
+    async def ensure_loaded(self, conn: Any, org_id: str, config: ChecklistConfig) -> None:
+        """Rebuild the org's index with RECENT_FINGERPRINTS_SQL on first use."""
+        if org_id in self._loaded:
+            return
+        today = config.local_day(datetime.now(timezone.utc))
+        first_day = today - timedelta(days=self._window_days)
+        rows = await conn.fetch(
+            RECENT_FINGERPRINTS_SQL,
+            org_id,
+            datetime.combine(first_day, time.min, tzinfo=config.timezone),
+            str(config.timezone),
+        )
+        if org_id not in self._loaded:
+            self.load(org_id, rows)
+
+    def load(self, org_id: str, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        Rebuild an org's index from RECENT_FINGERPRINTS_SQL rows (oldest
+        first). Photos added while the rows were read are kept.
+        """
+        previous = self._orgs.get(org_id)
+        org = self._orgs[org_id] = OrgPhotoIndex(self._max_distance, self._window_days)
+        self._loaded.add(org_id)
+        loaded = set()
+        for row in rows:
+            loaded.add(row["check_id"])
+            org.add(
+                PhotoFingerprint(
+                    check_id=row["check_id"],
+                    cart_id=row["cart_id"],
+                    employee_id=row["employee_id"],
+                    check_type=row["check_type"],
+                    day=row["day"],
+                    dhash=to_unsigned(row["photo_dhash"]),
+                )
+            )
+        if previous is not None:
+            for fingerprint in previous.fingerprints():
+                if fingerprint.check_id not in loaded:
+                    org.add(fingerprint)
+
+    def find_duplicate(
+        self, org_id: str, fingerprint: PhotoFingerprint
+    ) -> Optional[DuplicateMatch]:
+        """The closest earlier photo this one appears to reuse, if any."""
+        org = self._orgs.get(org_id)
+        if org is None:
+            return None
+        org.prune(fingerprint.day)
+        for match in org.index.search(fingerprint.dhash):
+            earlier = match.fingerprint
+            retake = (
+                earlier.day == fingerprint.day
+                and earlier.cart_id == fingerprint.cart_id
+                and earlier.check_type == fingerprint.check_type
+            )
+            if not retake:
+                return match
+        return None
+
+    def add(self, org_id: str, fingerprint: PhotoFingerprint) -> None:
+        """Remember a photo whose check was saved."""
+        self._org(org_id).add(fingerprint)
+
+
+# Global index instance
+photo_duplicates = DuplicatePhotoIndex()
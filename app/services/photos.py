@@ -0,0 +1,192 @@
+"""
+Quality Check Photos
+
+Camera shots arrive as 5MP JPEGs. The upload is streamed to a temp file in
+chunks, downscaled to PHOTO_MAX_WIDTH and re-encoded at PHOTO_QUALITY in a
+worker process, then streamed to storage. Decoding and resizing are
+CPU-bound; doing them in a process pool keeps the event loop free to serve
+other requests while photos are processed.
+"""
+
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from fastapi import UploadFile
+
+from app.config import settings
+from app.services.photo_duplicates import dhash
+from app.utils.storage import get_derivatives, get_storage
+
+
+class PhotoTooLarge(ValueError):
+    """The upload exceeds PHOTO_MAX_UPLOAD_BYTES."""
+
+
+class InvalidPhoto(ValueError):
+    """The upload is not a readable image."""
+
+
+@dataclass
+class ProcessedPhoto:
+    """A resized photo on local disk, ready to upload."""
+
+    path: str
+    width: int
+    height: int
+    size: int
+    sha256: str
+    dhash: int
+
+
+@dataclass
+class StoredPhoto:
+    """A photo saved to storage, addressed by its content hash."""
+
+    url: str
+    photo_hash: str
+    dhash: int  # Perceptual hash, for spotting reused photos
+
+
+# ===========================================
+# Worker process
+# ===========================================
+
+
+def resize_photo(src_path: str, dst_path: str, max_width: int, quality: int) -> Dict[str, Any]:
+    """
+    Downscale and re-encode a photo (runs in a worker process).
+
+    JPEG draft mode lets the decoder skip straight to a reduced scale,
+    so a 5MP shot is never fully decoded just to be shrunk.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(src_path) as source:
+            if source.width > max_width:
+                source.draft("RGB", (max_width, max_width * source.height // source.width))
+            image = ImageOps.exif_transpose(source)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            if image.width > max_width:
+                height = round(image.height * max_width / image.width)
+                image = image.resize((max_width, height), Image.Resampling.LANCZOS)
+            image.save(dst_path, "JPEG", quality=quality, optimize=True, progressive=True)
+            width, height = image.size
+            perceptual = dhash(image)
+    except (UnidentifiedImageError, OSError) as exc:
+        raise InvalidPhoto(str(exc)) from None
+
+    digest = hashlib.sha256()
+    with open(dst_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    return {
+        "width": width,
+        "height": height,
+        "size": os.path.getsize(dst_path),
+        "sha256": digest.hexdigest(),
+        "dhash": perceptual,
+    }
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.PHOTO_WORKERS,
+            # Forking a process that runs an event loop and threads is unsafe
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+# ===========================================
+# Pipeline
+# ===========================================
+
+
+def _temp_path(suffix: str) -> str:
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=settings.PHOTO_TMP_DIR)
+    os.close(fd)
+    return path
+
+
+async def spool_upload(upload: UploadFile, path: str) -> int:
+    """Copy an upload to `path` in chunks; returns the byte count."""
+    total = 0
+    with open(path, "wb") as f:
+        while True:
+            chunk = await upload.read(settings.PHOTO_CHUNK_BYTES)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > settings.PHOTO_MAX_UPLOAD_BYTES:
+                raise PhotoTooLarge(f"Photo exceeds {settings.PHOTO_MAX_UPLOAD_BYTES} bytes")
+            await asyncio.to_thread(f.write, chunk)
+    return total
+
+
+async def process_upload(upload: UploadFile, dst_path: str) -> ProcessedPhoto:
+    """Spool an upload to disk and resize it in the worker pool."""
+    src_path = _temp_path(".upload")
+    try:
+        await spool_upload(upload, src_path)
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            get_pool(),
+            resize_photo,
+            src_path,
+            dst_path,
+            settings.PHOTO_MAX_WIDTH,
+            settings.PHOTO_QUALITY,
+        )
+    finally:
+        os.unlink(src_path)
+    return ProcessedPhoto(path=dst_path, **result)
+
+
+async def store_quality_photo(upload: UploadFile) -> StoredPhoto:
+    """Process a quality check photo and store it under its content hash."""
+    dst_path = _temp_path(".jpg")
+    try:
+        processed = await process_upload(upload, dst_path)
+        url = await get_storage().put_file(processed.path, processed.sha256)
+        return StoredPhoto(url=url, photo_hash=processed.sha256, dhash=processed.dhash)
+    finally:
+        os.unlink(dst_path)
+
+
+async def render_derivative(src_path: str, dst_path: str, max_width: int) -> None:
+    """Render a smaller copy of a stored photo in the worker pool."""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(
+        get_pool(),
+        resize_photo,
+        src_path,
+        dst_path,
+        max_width,
+        settings.PHOTO_QUALITY,
+    )
+
+
+async def photo_path(photo_hash: str, size: str) -> Optional[str]:
+    """Local file for a stored photo at `size` (thumb, review or original)."""
+    return await get_derivatives().get(get_storage(), photo_hash, size, render_derivative)
@@ -0,0 +1,547 @@
+"""
+Quality Scores
+
+Per-employee daily checklist scores, streaks and leaderboards, maintained
+as checks are submitted and reviewed instead of recomputed on every view.
+
+- Each employee has one score record per worked day (required checks,
+  completed checks, on time or not), taken from the checklist state of
+  the cart they ran that day.
+- A streak is the run of consecutive worked days with every required
+  check done. Today doesn't break a streak until it's over.
+- Each (org, period) keeps employees sorted by score; a day's change
+  moves one employee, so reading the top k costs O(k).
+- Each employee keeps cumulative per-day totals, so a score over any
+  date range is two lookups.
+- When an org's day closes, a sliding window over each employee's last
+  worked days raises the "below threshold for N days" alert once per run.
+  Every worker closes days, but only the one holding the day-close
+  advisory lock sends alerts, so several workers don't alert twice.
+
+After a restart, an org's records are rebuilt from quality_checklist_days
+(SCORE_DAYS_SQL, the last QUALITY_SCORE_HISTORY_DAYS) the first time its
+scores are read or its day is closed.
+"""
+
+import asyncio
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import structlog
+
+from app.config import settings
+from app.services import n8n
+from app.services.checklist import ChecklistChange, checklists
+from app.utils.database import db
+
+logger = structlog.get_logger(__name__)
+
+PERIODS = ("week", "month")
+RETAIN_PERIODS_DAYS = 62  # Rankings for periods that ended earlier are dropped
+
+PeriodKey = Tuple[str, str, date]  # (org_id, period, period start)
+
+# Advisory lock key of the worker that sends day-close alerts
+DAY_CLOSE_LOCK_KEY = 0x51C0_DA75
+
+# Daily score records for an org, from persisted checklist days
+# $1 = org_id, $2 = first day
+SCORE_DAYS_SQL = """
+SELECT d.employee_id::text AS employee_id, u.name AS employee_name, d.date,
+       d.completed_mask, d.completion_time
+FROM foodcartos.quality_checklist_days d
+JOIN foodcartos.users u ON u.id = d.employee_id
+WHERE d.org_id = $1 AND d.date >= $2
+ORDER BY d.date
+"""
+
+# Employees scheduled on a day; those who submitted nothing score zero
+# $1 = org_id, $2 = date
+CLOSING_ASSIGNMENTS_SQL = """
+SELECT employee_id::text AS employee_id
+FROM foodcartos.daily_assignments
+WHERE org_id = $1 AND date = $2 AND employee_id IS NOT NULL AND status <> 'cancelled'
+"""
+
+
+def period_start(period: str, day: date) -> date:
+    if period == "week":
+        return day - timedelta(days=day.weekday())  # Monday
+    if period == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown period: {period}")
+
+
+def percent(completed: int, required: int) -> float:
+    return round(100.0 * completed / required, 1) if required else 0.0
+
+
+@dataclass
+class DayScore:
+    """One employee's checklist result for one day."""
+
+    required: int
+    completed: int
+    on_time: bool
+    missing: Tuple[str, ...] = ()
+
+    @property
+    def perfect(self) -> bool:
+        return self.required > 0 and self.completed >= self.required
+
+
+@dataclass
+class RangeTotals:
+    """Sums over a date range."""
+
+    required: int = 0
+    completed: int = 0
+    on_time_days: int = 0
+    worked_days: int = 0
+
+
+class EmployeeScores:
+    """
+    An employee's daily records, cumulative totals and cached streak.
+
+    `_cum_*[i]` holds the running total through day `_base + i`, so a
+    range sum is one subtraction. Today's updates touch only the tail;
+    a late review of an older day shifts the totals after it.
+    """
+
+    def __init__(self, org_id: str):
+        self.org_id = org_id
+        self.name: Optional[str] = None
+        self.days: Dict[date, DayScore] = {}
+        self.order: List[date] = []  # Worked days, ascending
+        self.streak = 0  # Perfect days ending at the last closed day
+        self.open_perfect = False  # Latest day is perfect (counts once it closes too)
+        self._base: Optional[date] = None
+        self._cum_required: List[int] = []
+        self._cum_completed: List[int] = []
+        self._cum_on_time: List[int] = []
+        self._cum_worked: List[int] = []
+
+    def set_day(self, day: date, score: DayScore) -> Optional[DayScore]:
+        """Store a day's record; returns the previous one."""
+        previous = self.days.get(day)
+        if previous is None:
+            insort(self.order, day)
+        self.days[day] = score
+        self._add_to_totals(
+            day,
+            (
+                score.required - (previous.required if previous else 0),
+                score.completed - (previous.completed if previous else 0),
+                int(score.on_time) - int(previous.on_time if previous else 0),
+                0 if previous else 1,
+            ),
+        )
+        return previous
+
+    def _add_to_totals(self, day: date, deltas: Tuple[int, int, int, int]) -> None:
+        columns = (self._cum_required, self._cum_completed, self._cum_on_time, self._cum_worked)
+        if self._base is None:
+            self._base = day
+        elif day < self._base:
+            gap = (self._base - day).days
+            for column in columns:
+                column[:0] = [0] * gap
+            self._base = day
+
+        index = (day - self._base).days
+        for column, delta in zip(columns, deltas):
+            if len(column) <= index:
+                column.extend([column[-1] if column else 0] * (index + 1 - len(column)))
+            if delta:
+                for i in range(index, len(column)):
+                    column[i] += delta
+
+    def totals(self, start: date, end: date) -> RangeTotals:
+        """Sums for start..end inclusive, in O(1)."""
+        if self._base is None:
+            return RangeTotals()
+        first = max((start - self._base).days, 0)
+        last = min((end - self._base).days, len(self._cum_required) - 1)
+        if first > last:
+            return RangeTotals()
+
+        def span(column: List[int]) -> int:
+            return column[last] - (column[first - 1] if first > 0 else 0)
+
+        return RangeTotals(
+            required=span(self._cum_required),
+            completed=span(self._cum_completed),
+            on_time_days=span(self._cum_on_time),
+            worked_days=span(self._cum_worked),
+        )
+
+    def issues(self, start: date, end: date, limit: int = 5) -> List[Dict[str, Any]]:
+        """Most recent days in the range with missing or late checks."""
+        found = []
+        stop = bisect_left(self.order, start)
+        for i in range(bisect_right(self.order, end) - 1, stop - 1, -1):
+            day = self.order[i]
+            score = self.days[day]
+            if score.perfect and score.on_time:
+                continue
+            found.append({"date": day, "missing": list(score.missing), "late": not score.on_time})
+            if len(found) == limit:
+                break
+        return found
+
+    def below_run(self, through: date, threshold: float, limit: int) -> int:
+        """Consecutive worked days up to `through` scoring under `threshold` (counted up to `limit`)."""
+        run = 0
+        for i in range(bisect_right(self.order, through) - 1, -1, -1):
+            score = self.days[self.order[i]]
+            if percent(score.completed, score.required) >= threshold:
+                break
+            run += 1
+            if run == limit:
+                break
+        return run
+
+    def refresh_streak(self) -> None:
+        """Recount the trailing perfect run; O(streak length), only on updates."""
+        if not self.order:
+            self.streak, self.open_perfect = 0, False
+            return
+        latest = self.days[self.order[-1]]
+        self.open_perfect = latest.perfect
+        run = 0
+        for day in reversed(self.order[:-1]):
+            if not self.days[day].perfect:
+                break
+            run += 1
+        self.streak = run
+
+    def streak_days(self, today: date) -> int:
+        """
+        Consecutive perfect worked days. The latest day adds to the streak
+        if it's perfect; if it is today and not done yet, it doesn't end it.
+        """
+        if not self.order:
+            return 0
+        if self.open_perfect:
+            return self.streak + 1
+        return self.streak if self.order[-1] >= today else 0
+
+
+class Ranking:
+    """Employees in one (org, period), sorted by score."""
+
+    def __init__(self):
+        self._totals: Dict[str, List[int]] = {}  # employee_id -> [required, completed]
+        self._sorted: List[Tuple[float, int, str]] = []  # (-score, -completed, employee_id)
+        self._keys: Dict[str, Tuple[float, int, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def apply(self, employee_id: str, required_delta: int, completed_delta: int) -> None:
+        totals = self._totals.setdefault(employee_id, [0, 0])
+        totals[0] += required_delta
+        totals[1] += completed_delta
+
+        old = self._keys.pop(employee_id, None)
+        if old is not None:
+            del self._sorted[bisect_left(self._sorted, old)]
+        if totals[0] <= 0:
+            del self._totals[employee_id]
+            return
+        key = (-percent(totals[1], totals[0]), -totals[1], employee_id)
+        insort(self._sorted, key)
+        self._keys[employee_id] = key
+
+    def top(self, limit: int) -> List[Tuple[str, float, int, int]]:
+        """(employee_id, score, required, completed) for the first `limit`."""
+        rows = []
+        for neg_score, _, employee_id in self._sorted[:limit]:
+            required, completed = self._totals[employee_id]
+            rows.append((employee_id, -neg_score, required, completed))
+        return rows
+
+
+# ===========================================
+# Store
+# ===========================================
+
+
+class QualityScoreStore:
+    """Daily scores, streaks and per-(org, period) rankings."""
+
+    def __init__(self):
+        self._employees: Dict[str, EmployeeScores] = {}
+        self._rankings: Dict[PeriodKey, Ranking] = {}
+        self._org_employees: Dict[str, Set[str]] = {}
+        self._closed_through: Dict[str, date] = {}  # org_id -> last closed local day
+        self._loaded: Set[str] = set()  # Orgs rebuilt from SCORE_DAYS_SQL
+        self._newest_day = date.min
+        self._lock_conn: Any = None  # Holds DAY_CLOSE_LOCK_KEY while this worker alerts
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def employee(self, employee_id: str) -> Optional[EmployeeScores]:
+        return self._employees.get(employee_id)
+
+    def record_day(
+        self,
+        org_id: str,
+        employee_id: str,
+        day: date,
+        required: int,
+        completed: int,
+        on_time: bool,
+        employee_name: Optional[str] = None,
+        missing: Tuple[str, ...] = (),
+    ) -> None:
+        """Set an employee's result for a day and move them in the rankings."""
+        if day > self._newest_day:
+            self._newest_day = day
+            self.prune(day)
+        scores = self._employees.get(employee_id)
+        if scores is None:
+            scores = self._employees[employee_id] = EmployeeScores(org_id)
+            self._org_employees.setdefault(org_id, set()).add(employee_id)
+        if employee_name:
+            scores.name = employee_name
+
+        score = DayScore(required=required, completed=completed, on_time=on_time, missing=missing)
+        previous = scores.set_day(day, score)
+        required_delta = required - (previous.required if previous else 0)
+        completed_delta = completed - (previous.completed if previous else 0)
+        if required_delta or completed_delta:
+            for period in PERIODS:
+                key = (org_id, period, period_start(period, day))
+                ranking = self._rankings.get(key)
+                if ranking is None:
+                    ranking = self._rankings[key] = Ranking()
+                ranking.apply(employee_id, required_delta, completed_delta)
+        scores.refresh_streak()
+
+    def record_checklist(self, change: ChecklistChange) -> None:
+        """Update the credited employee's day from a checklist change."""
+        state = change.state
+        if state.employee_id is None:
+            return
+        config = checklists.config(state.org_id)
+        completed = (state.mask & config.required_mask).bit_count()
+        on_time = state.completion_time is not None and state.completion_time <= config.deadline_at(
+            change.day
+        )
+        self.record_day(
+            state.org_id,
+            state.employee_id,
+            change.day,
+            len(config.required_checks),
+            completed,
+            on_time,
+            missing=tuple(config.names(config.required_mask & ~state.mask)),
+        )
+
+    def is_loaded(self, org_id: str) -> bool:
+        return org_id in self._loaded
+
+    async def ensure_loaded(self, conn: Any, org_id: str) -> None:
+        """Rebuild the org's records with SCORE_DAYS_SQL on first use."""
+        if org_id in self._loaded:
+            return
+        config = await checklists.ensure_config(conn, org_id)
+        first_day = config.local_day(datetime.now(timezone.utc)) - timedelta(
+            days=settings.QUALITY_SCORE_HISTORY_DAYS
+        )
+        rows = await conn.fetch(SCORE_DAYS_SQL, org_id, first_day)
+        if org_id not in self._loaded:
+            self._loaded.add(org_id)
+            self.load(org_id, rows)
+
+    def load(self, org_id: str, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        Replay SCORE_DAYS_SQL rows (oldest first). Days already held are
+        replaced by their persisted state, which includes them.
+        """
+        config = checklists.config(org_id)
+        for row in rows:
+            completion_time = row["completion_time"]
+            self.record_day(
+                org_id,
+                row["employee_id"],
+                row["date"],
+                len(config.required_checks),
+                (row["completed_mask"] & config.required_mask).bit_count(),
+                completion_time is not None and completion_time <= config.deadline_at(row["date"]),
+                row["employee_name"],
+                tuple(config.names(config.required_mask & ~row["completed_mask"])),
+            )
+
+    def leaderboard(
+        self, org_id: str, period: str, today: date, limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Top `limit` employees for the period containing `today`."""
+        ranking = self._rankings.get((org_id, period, period_start(period, today)))
+        if ranking is None:
+            return []
+        rankings = []
+        for rank, (employee_id, score, _, _) in enumerate(ranking.top(limit), start=1):
+            scores = self._employees[employee_id]
+            rankings.append(
+                {
+                    "rank": rank,
+                    "employee_id": employee_id,
+                    "employee_name": scores.name or employee_id,
+                    "score": score,
+                    "streak_days": scores.streak_days(today),
+                }
+            )
+        return rankings
+
+    def employee_score(self, employee_id: str, start: date, end: date) -> Optional[Dict[str, Any]]:
+        """QualityScore fields for any date range; None if the employee has no records."""
+        scores = self._employees.get(employee_id)
+        if scores is None:
+            return None
+        totals = scores.totals(start, end)
+        return {
+            "employee_id": employee_id,
+            "employee_name": scores.name or employee_id,
+            "period_start": start,
+            "period_end": end,
+            "total_required": totals.required,
+            "total_completed": totals.completed,
+            "score": percent(totals.completed, totals.required),
+            "on_time_percentage": percent(totals.on_time_days, totals.worked_days),
+            "issues": scores.issues(start, end),
+        }
+
+    # ===========================================
+    # Day close and threshold alerts
+    # ===========================================
+
+    def close_day(
+        self, org_id: str, day: date, scheduled: Iterable[str] = (), alert: bool = True
+    ) -> List[str]:
+        """
+        Close an org's day: scheduled employees with no record score zero,
+        then every employee who worked it is checked against the alert
+        threshold. Returns the employees whose run just reached
+        QUALITY_ALERT_DAYS; each run alerts once (if `alert`).
+        """
+        config = checklists.config(org_id)
+        for employee_id in scheduled:
+            scores = self._employees.get(employee_id)
+            if scores is None or day not in scores.days:
+                self.record_day(
+                    org_id,
+                    employee_id,
+                    day,
+                    len(config.required_checks),
+                    0,
+                    False,
+                    missing=tuple(config.required_checks),
+                )
+
+        breached = []
+        needed = settings.QUALITY_ALERT_DAYS
+        for employee_id in self._org_employees.get(org_id, ()):
+            scores = self._employees[employee_id]
+            if day not in scores.days:
+                continue
+            # Alert exactly when the run reaches the window; longer runs already alerted
+            run = scores.below_run(day, settings.QUALITY_ALERT_THRESHOLD, needed + 1)
+            if run == needed:
+                breached.append(employee_id)
+                if alert:
+                    self._alert(org_id, employee_id, day)
+        self._closed_through[org_id] = max(day, self._closed_through.get(org_id, day))
+        return breached
+
+    def _alert(self, org_id: str, employee_id: str, day: date) -> None:
+        scores = self._employees[employee_id]
+        start = scores.order[bisect_right(scores.order, day) - settings.QUALITY_ALERT_DAYS]
+        summary = self.employee_score(employee_id, start, day)
+        assert summary is not None  # The employee has scores
+        n8n.notify(
+            "quality-alert",
+            {
+                "org_id": org_id,
+                "employee_id": employee_id,
+                "employee_name": scores.name,
+                "threshold": settings.QUALITY_ALERT_THRESHOLD,
+                "days": settings.QUALITY_ALERT_DAYS,
+                "start_date": start.isoformat(),
+                "end_date": day.isoformat(),
+                "score": summary["score"],
+            },
+        )
+
+    async def _holds_alert_lock(self) -> bool:
+        """Whether this worker sends day-close alerts; retakes a dropped lock."""
+        if not db.connected:
+            return True
+        if self._lock_conn is not None and self._lock_conn.is_closed():
+            await db.release_advisory_lock(self._lock_conn)
+            self._lock_conn = None
+        if self._lock_conn is None:
+            self._lock_conn = await db.try_advisory_lock(DAY_CLOSE_LOCK_KEY)
+        return self._lock_conn is not None
+
+    async def close_elapsed_days(self, now: Optional[datetime] = None) -> None:
+        """Close every org day that has ended in the org's timezone."""
+        now = now or datetime.now(timezone.utc)
+        alert = await self._holds_alert_lock()
+        if db.connected:
+            for org_id in [org for org in self._org_employees if org not in self._loaded]:
+                # Runs before the threshold check, so it sees pre-restart days
+                async with db.transaction() as conn:
+                    await self.ensure_loaded(conn, org_id)
+        for org_id in list(self._org_employees):
+            yesterday = checklists.config(org_id).local_day(now) - timedelta(days=1)
+            closed = self._closed_through.get(org_id)
+            if closed is None:
+                # Days before the process started were closed by the previous run
+                self._closed_through[org_id] = yesterday
+                continue
+            while closed < yesterday:
+                closed += timedelta(days=1)
+                scheduled: List[str] = []
+                if db.connected:
+                    async with db.transaction() as conn:
+                        rows = await conn.fetch(CLOSING_ASSIGNMENTS_SQL, org_id, closed)
+                    scheduled = [row["employee_id"] for row in rows]
+                self.close_day(org_id, closed, scheduled, alert)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock_conn is not None:
+            await db.release_advisory_lock(self._lock_conn)
+            self._lock_conn = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.QUALITY_DAY_CLOSE_CHECK_SECONDS)
+            try:
+                await self.close_elapsed_days()
+            except Exception as exc:
+                logger.error("quality_day_close_failed", error=str(exc))
+
+    def prune(self, today: date) -> None:
+        """Drop rankings for periods that ended long ago."""
+        cutoff = today - timedelta(days=RETAIN_PERIODS_DAYS)
+        for key in [key for key in self._rankings if key[2] < cutoff]:
+            del self._rankings[key]
+
+
+# Global store instance
+quality_scores = QualityScoreStore()
@@ -0,0 +1,360 @@
+"""
+GPS Trajectories
+
+Carts ping GPS every few minutes and spend most of the day parked, so raw
+`gps_pings` are mostly duplicates. Once a day is older than the
+full-resolution window, its pings are simplified into one
+`gps_trajectories` row per cart and day, and the raw pings are removed:
+- Stationary runs collapse to their first and last point (arrival, departure)
+- Driving segments are simplified with Douglas-Peucker
+
+`history` serves both: stored trajectories for compacted days, and raw
+pings simplified on the fly for recent ones.
+
+Run the compaction from cron (or an n8n schedule):
+    python -m app.services.trajectory
+"""
+
+import asyncio
+import json
+import math
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import structlog
+
+from app.config import settings
+from app.utils.log import configure_logging, shutdown_logging
+
+logger = structlog.get_logger(__name__)
+
+# (latitude, longitude, unix timestamp)
+Point = Tuple[float, float, float]
+
+EARTH_RADIUS_METERS = 6371000.0
+
+# Cart-days with raw pings older than the cutoff. $1 = cutoff
+COMPACTION_CANDIDATES_SQL = """
+SELECT DISTINCT org_id, cart_id, (timestamp AT TIME ZONE 'UTC')::date AS day
+FROM foodcartos.gps_pings
+WHERE timestamp < $1
+ORDER BY day
+"""
+
+# $1 = cart_id, $2 = start, $3 = end
+DAY_PINGS_SQL = """
+SELECT latitude, longitude, timestamp
+FROM foodcartos.gps_pings
+WHERE cart_id = $1 AND timestamp >= $2 AND timestamp < $3
+ORDER BY timestamp
+"""
+
+# $1 = cart_id, $2 = day
+EXISTING_TRAJECTORY_SQL = """
+SELECT points, raw_point_count
+FROM foodcartos.gps_trajectories
+WHERE cart_id = $1 AND date = $2
+"""
+
+# $1 = org_id, $2 = cart_id, $3 = day, $4 = points, $5 = point_count,
+# $6 = raw_point_count, $7 = distance_meters
+UPSERT_TRAJECTORY_SQL = """
+INSERT INTO foodcartos.gps_trajectories
+    (org_id, cart_id, date, points, point_count, raw_point_count, distance_meters)
+VALUES ($1, $2, $3, $4::jsonb, $5, $6, $7)
+ON CONFLICT (cart_id, date) DO UPDATE SET
+    points = EXCLUDED.points,
+    point_count = EXCLUDED.point_count,
+    raw_point_count = EXCLUDED.raw_point_count,
+    distance_meters = EXCLUDED.distance_meters
+"""
+
+# $1 = cart_id, $2 = day start, $3 = day end
+DELETE_DAY_PINGS_SQL = """
+DELETE FROM foodcartos.gps_pings
+WHERE cart_id = $1 AND timestamp >= $2 AND timestamp < $3
+"""
+
+# $1 = cart_id, $2 = first day, $3 = last day
+TRAJECTORY_HISTORY_SQL = """
+SELECT date, points, point_count, raw_point_count, distance_meters
+FROM foodcartos.gps_trajectories
+WHERE cart_id = $1 AND date BETWEEN $2 AND $3
+ORDER BY date
+"""
+
+
+# ===========================================
+# Geometry
+# ===========================================
+
+
+def haversine_meters(a: Point, b: Point) -> float:
+    """Great-circle distance between two points."""
+    lat1, lng1 = math.radians(a[0]), math.radians(a[1])
+    lat2, lng2 = math.radians(b[0]), math.radians(b[1])
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(h))
+
+
+def _offset_from_segment(point: Point, start: Point, end: Point) -> float:
+    """
+    Distance in meters from `point` to the segment start-end.
+
+    Uses an equirectangular projection around the segment, which is
+    accurate to well under a meter at city scale.
+    """
+    scale = math.cos(math.radians(start[0]))
+    bx = math.radians(end[1] - start[1]) * scale * EARTH_RADIUS_METERS
+    by = math.radians(end[0] - start[0]) * EARTH_RADIUS_METERS
+    px = math.radians(point[1] - start[1]) * scale * EARTH_RADIUS_METERS
+    py = math.radians(point[0] - start[0]) * EARTH_RADIUS_METERS
+
+    length_sq = bx * bx + by * by
+    if length_sq == 0:
+        return math.hypot(px, py)
+    t = max(0.0, min(1.0, (px * bx + py * by) / length_sq))
+    return math.hypot(px - t * bx, py - t * by)
+
+
+def _runs(points: Sequence[Point], radius_meters: float) -> List[List[Point]]:
+    """Split a track into runs of points within `radius_meters` of the run's first point."""
+    runs: List[List[Point]] = []
+    for point in points:
+        if runs and haversine_meters(runs[-1][0], point) <= radius_meters:
+            runs[-1].append(point)
+        else:
+            runs.append([point])
+    return runs
+
+
+def collapse_stationary(points: Sequence[Point], radius_meters: float) -> List[Point]:
+    """
+    Collapse runs of points within `radius_meters` of where the run began.
+
+    Each run keeps its first and last point, so the track still shows
+    when the cart arrived and when it left.
+    """
+    collapsed: List[Point] = []
+    for run in _runs(points, radius_meters):
+        collapsed.append(run[0])
+        if len(run) > 1:
+            collapsed.append(run[-1])
+    return collapsed
+
+
+def douglas_peucker(points: Sequence[Point], tolerance_meters: float) -> List[Point]:
+    """Douglas-Peucker line simplification (iterative, no recursion limit)."""
+    if len(points) <= 2:
+        return list(points)
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        farthest, max_offset = first, 0.0
+        for i in range(first + 1, last):
+            offset = _offset_from_segment(points[i], points[first], points[last])
+            if offset > max_offset:
+                farthest, max_offset = i, offset
+        if max_offset > tolerance_meters:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def simplify_track(
+    points: Sequence[Point],
+    stationary_radius: float = settings.GPS_STATIONARY_RADIUS_METERS,
+    tolerance: float = settings.GPS_SIMPLIFY_TOLERANCE_METERS,
+) -> List[Point]:
+    """
+    Simplify a day's track.
+
+    Stops collapse to their arrival and departure points, which are always
+    kept. Douglas-Peucker only thins the driving legs between stops, so
+    simplification never erases when a cart arrived or left.
+    """
+    simplified: List[Point] = []
+    leg: List[Point] = []  # Driving points since the last departure
+
+    def close_leg(arrival: Point) -> None:
+        start = simplified[-1:]  # Previous departure, if any
+        thinned = douglas_peucker(start + leg + [arrival], tolerance)
+        simplified.extend(thinned[len(start) :])
+        leg.clear()
+
+    for run in _runs(points, stationary_radius):
+        if len(run) == 1:
+            leg.append(run[0])
+            continue
+        close_leg(run[0])
+        simplified.append(run[-1])
+
+    if leg:
+        close_leg(leg.pop())
+    return simplified
+
+
+def track_distance(points: Sequence[Point]) -> float:
+    return sum(haversine_meters(a, b) for a, b in zip(points, points[1:]))
+
+
+def rounded_points(points: Sequence[Point]) -> List[List[float]]:
+    """[[lat, lng, unix_ts], ...] at the precision gps_trajectories stores."""
+    return [[round(lat, 6), round(lng, 6), int(ts)] for lat, lng, ts in points]
+
+
+def encode_points(points: Sequence[Point]) -> str:
+    """JSON for gps_trajectories.points: [[lat, lng, unix_ts], ...]."""
+    return json.dumps(rounded_points(points), separators=(",", ":"))
+
+
+def _stored_points(points: Any) -> List[Point]:
+    if isinstance(points, str):
+        points = json.loads(points)
+    return [tuple(point) for point in points]
+
+
+def _ping_points(rows: Sequence[Any]) -> List[Point]:
+    return [
+        (float(row["latitude"]), float(row["longitude"]), row["timestamp"].timestamp())
+        for row in rows
+    ]
+
+
+# ===========================================
+# Compaction job
+# ===========================================
+
+
+def _day_bounds(day: date) -> Tuple[datetime, datetime]:
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+async def compact_day(conn: Any, org_id: Any, cart_id: Any, day: date) -> Tuple[int, int]:
+    """
+    Replace one cart-day of raw pings with its simplified trajectory.
+
+    Pings that arrive late for an already compacted day (offline queue
+    flushes) are merged with the stored trajectory. Returns
+    (raw points, stored points).
+    """
+    start, end = _day_bounds(day)
+    async with conn.transaction():
+        points = _ping_points(await conn.fetch(DAY_PINGS_SQL, cart_id, start, end))
+        raw_count = len(points)
+
+        existing = await conn.fetchrow(EXISTING_TRAJECTORY_SQL, cart_id, day)
+        if existing is not None:
+            points = sorted(points + _stored_points(existing["points"]), key=lambda p: p[2])
+            raw_count += existing["raw_point_count"]
+
+        simplified = simplify_track(points)
+        await conn.execute(
+            UPSERT_TRAJECTORY_SQL,
+            org_id,
+            cart_id,
+            day,
+            encode_points(simplified),
+            len(simplified),
+            raw_count,
+            round(track_distance(simplified), 1),
+        )
+        await conn.execute(DELETE_DAY_PINGS_SQL, cart_id, start, end)
+    return raw_count, len(simplified)
+
+
+async def compact(conn: Any, now: Optional[datetime] = None) -> Tuple[int, int]:
+    """Compact every cart-day older than GPS_FULL_RESOLUTION_DAYS."""
+    now = now or datetime.now(timezone.utc)
+    cutoff_day = now.date() - timedelta(days=settings.GPS_FULL_RESOLUTION_DAYS)
+    cutoff = datetime.combine(cutoff_day, time.min, tzinfo=timezone.utc)
+
+    raw_total = stored_total = 0
+    for row in await conn.fetch(COMPACTION_CANDIDATES_SQL, cutoff):
+        raw, stored = await compact_day(conn, row["org_id"], row["cart_id"], row["day"])
+        raw_total += raw
+        stored_total += stored
+    return raw_total, stored_total
+
+
+# ===========================================
+# History
+# ===========================================
+
+
+async def history(conn: Any, cart_id: str, first: date, last: date) -> List[Dict[str, Any]]:
+    """
+    A cart's simplified track for each UTC day from `first` to `last`.
+
+    Compacted days come from gps_trajectories. Raw pings (recent days,
+    or late ones not compacted yet) are simplified on the fly, merged
+    with the stored track when the day has one. Days without GPS data
+    are left out.
+    """
+    stored = {
+        row["date"]: row for row in await conn.fetch(TRAJECTORY_HISTORY_SQL, cart_id, first, last)
+    }
+    start, end = _day_bounds(first)[0], _day_bounds(last)[1]
+    pings: Dict[date, List[Point]] = {}
+    for point in _ping_points(await conn.fetch(DAY_PINGS_SQL, cart_id, start, end)):
+        day = datetime.fromtimestamp(point[2], timezone.utc).date()
+        pings.setdefault(day, []).append(point)
+
+    days = []
+    for day in sorted(stored.keys() | pings.keys()):
+        row = stored.get(day)
+        raw = pings.get(day)
+        if raw is None:
+            assert row is not None  # The day came from `stored`
+            days.append(
+                {
+                    "date": day,
+                    "points": [list(point) for point in _stored_points(row["points"])],
+                    "point_count": row["point_count"],
+                    "raw_point_count": row["raw_point_count"],
+                    "distance_meters": row["distance_meters"],
+                }
+            )
+            continue
+
+        points, raw_count = raw, len(raw)
+        if row is not None:
+            points = sorted(points + _stored_points(row["points"]), key=lambda p: p[2])
+            raw_count += row["raw_point_count"]
+        simplified = simplify_track(points)
+        days.append(
+            {
+                "date": day,
+                "points": rounded_points(simplified),
+                "point_count": len(simplified),
+                "raw_point_count": raw_count,
+                "distance_meters": round(track_distance(simplified), 1),
+            }
+        )
+    return days
+
+
+async def _main() -> None:
+    import asyncpg
+
+    configure_logging()
+    conn = await asyncpg.connect(settings.DATABASE_URL)
+    try:
+        raw, stored = await compact(conn)
+        logger.info("gps_compacted", raw_points=raw, stored_points=stored)
+    finally:
+        await conn.close()
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,8 @@
+"""
+FoodCartOS Utilities
+
+Helpers shared across routers and services:
+- auth: Access token verification and org/role dependencies
+- database: Pooled asyncpg access with per-transaction RLS context
+- storage: Photo storage backends
+"""
@@ -0,0 +1,150 @@
+"""
+Agent Admission Control
+
+Cart agents sync on a timer, so their traffic is smooth until LTE comes
+back after an outage and every cart flushes its offline queue at once,
+or a misbehaving Pi retries in a loop. Admission control keeps those
+from crowding out everything else:
+- a token bucket per hardware_id (per client address for hardware not
+  linked to a cart) for /webhooks/agent/sync, and a stricter one for
+  /webhooks/agent/register: a device gets a burst (an offline queue
+  flush) and then a sustained rate
+- a cap on syncs processed at once across all devices; a sync waits up
+  to AGENT_SYNC_QUEUE_SECONDS for a slot
+
+Rejected requests get 429 with a Retry-After hint, jittered so devices
+turned away together don't come back together. For the same reason the
+config returned at registration spreads sync_interval_seconds across
+devices (`staggered_interval`).
+
+Buckets live in process memory, in an LRU of AGENT_ADMISSION_MAX_DEVICES;
+with several workers each one enforces the limits separately.
+"""
+
+import asyncio
+import hashlib
+import math
+import random
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, List, Optional
+
+from fastapi import HTTPException, Request, status
+
+from app.config import settings
+from app.services.live_status import live_status
+from app.utils.metrics import registry
+
+AGENT_REJECTED = registry.counter(
+    "foodcartos_agent_requests_rejected_total",
+    "Agent requests answered 429, by endpoint and reason (rate_limited, busy).",
+    ("endpoint", "reason"),
+)
+
+
+class RateLimiter:
+    """Token buckets keyed by device, in a bounded LRU."""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self._max_keys = max_keys
+        # key -> [tokens, monotonic time they were counted]
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def acquire(self, key: str, now: Optional[float] = None) -> float:
+        """Take a token for `key`: 0 if one was available, else seconds until there is one."""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            # An evicted bucket comes back full, as it would have refilled
+            bucket = self._buckets[key] = [float(self.burst), now]
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / self.rate
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+
+sync_limiter = RateLimiter(
+    settings.AGENT_SYNC_RATE_PER_MINUTE,
+    settings.AGENT_SYNC_BURST,
+    settings.AGENT_ADMISSION_MAX_DEVICES,
+)
+register_limiter = RateLimiter(
+    settings.AGENT_REGISTER_RATE_PER_MINUTE,
+    settings.AGENT_REGISTER_BURST,
+    settings.AGENT_ADMISSION_MAX_DEVICES,
+)
+_sync_slots = asyncio.Semaphore(settings.AGENT_SYNC_MAX_CONCURRENT)
+
+
+def staggered_interval(hardware_id: Optional[str], base: int) -> int:
+    """`base` spread by up to ±AGENT_SYNC_STAGGER across devices, stable per device."""
+    if not hardware_id or not settings.AGENT_SYNC_STAGGER:
+        return base
+    digest = hashlib.sha256(hardware_id.encode()).digest()
+    fraction = int.from_bytes(digest[:8], "big") / 2**64  # Uniform in [0, 1)
+    return max(1, round(base * (1 + settings.AGENT_SYNC_STAGGER * (2 * fraction - 1))))
+
+
+# ===========================================
+# Dependencies
+# ===========================================
+
+
+def _too_many_requests(endpoint: str, reason: str, wait: float) -> HTTPException:
+    AGENT_REJECTED.inc(endpoint, reason)
+    retry_after = math.ceil(wait + random.uniform(0, max(1.0, wait) / 2))
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=f"Too many agent requests ({reason}), retry in {retry_after}s",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+async def _device_key(request: Request) -> str:
+    """
+    The payload's hardware_id if it belongs to a registered cart, else the
+    client address, so made-up ids can't each get a fresh allowance.
+    """
+    try:
+        payload: Any = await request.json()  # Cached for the endpoint
+    except ValueError:
+        payload = None
+    hardware_id = payload.get("hardware_id") if isinstance(payload, dict) else None
+    if isinstance(hardware_id, str) and live_status.resolve_hardware(hardware_id) is not None:
+        return hardware_id
+    return f"addr:{request.client.host if request.client else 'unknown'}"
+
+
+async def admit_agent_sync(request: Request) -> AsyncIterator[None]:
+    """Rate-limit a sync by device, then hold one of the global processing slots."""
+    wait = sync_limiter.acquire(await _device_key(request))
+    if wait:
+        raise _too_many_requests("sync", "rate_limited", wait)
+    try:
+        await asyncio.wait_for(_sync_slots.acquire(), settings.AGENT_SYNC_QUEUE_SECONDS)
+    except asyncio.TimeoutError:
+        # Saturated: send the device away for a spread-out few seconds
+        wait = random.uniform(1, settings.AGENT_SYNC_BUSY_RETRY_SECONDS)
+        raise _too_many_requests("sync", "busy", wait)
+    try:
+        yield
+    finally:
+        _sync_slots.release()
+
+
+async def admit_agent_register(request: Request) -> None:
+    """Rate-limit registration attempts by device."""
+    wait = register_limiter.acquire(await _device_key(request))
+    if wait:
+        raise _too_many_requests("register", "rate_limited", wait)
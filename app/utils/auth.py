@@ -0,0 +1,292 @@
+"""
+Request Authentication
+
+Routes get the caller's org and role from their Supabase access token
+instead of trusting an org_id query parameter.
+
+Tokens are verified locally against Supabase's signing keys (JWKS),
+which are cached and refreshed in the background; projects on the
+legacy shared secret use SUPABASE_JWT_SECRET instead. Decoded claims are
+memoized in a bounded LRU keyed by the token's hash until the token
+expires, so a request costs no database or network round trip.
+
+The org and role come from the `org_id` and `role` claims that the RLS
+policies read (falling back to app_metadata).
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+import structlog
+from fastapi import Depends, HTTPException, WebSocket, WebSocketException, status
+from fastapi.requests import HTTPConnection
+from jose import JWTError, jwt
+
+from app.config import settings
+from app.utils.metrics import route_template
+
+logger = structlog.get_logger(__name__)
+
+ROLES = ("owner", "operator", "employee")
+
+
+class AuthError(Exception):
+    """The token is missing, invalid, expired or lacks org claims."""
+
+
+class UnknownSigningKey(AuthError):
+    """The token's key id isn't in the cached JWKS (keys may have rotated)."""
+
+
+@dataclass(frozen=True)
+class AuthContext:
+    """Who is calling: resolved from a verified access token."""
+
+    user_id: str
+    org_id: str
+    role: str
+    expires_at: float
+
+
+# ===========================================
+# Signing keys
+# ===========================================
+
+
+class SigningKeys:
+    """Supabase JWT signing keys, fetched from JWKS and refreshed periodically."""
+
+    def __init__(self):
+        self._keys: Dict[str, Dict[str, Any]] = {}  # kid -> JWK
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def jwks_url(self) -> Optional[str]:
+        if not settings.SUPABASE_URL:
+            return None
+        return f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json"
+
+    def get(self, kid: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self._keys.get(kid) if kid else None
+
+    def set_keys(self, keys: Dict[str, Dict[str, Any]]) -> None:
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+
+    async def refresh(self, min_age: float = 0.0) -> None:
+        """Fetch the JWKS unless it was fetched within `min_age` seconds."""
+        url = self.jwks_url
+        if url is None:
+            return
+        async with self._lock:
+            if time.monotonic() - self._fetched_at < min_age:
+                return
+            if self._client is None:
+                self._client = httpx.AsyncClient(timeout=10.0, verify=settings.VERIFY_SSL)
+            response = await self._client.get(url)
+            response.raise_for_status()
+            self.set_keys(
+                {key["kid"]: key for key in response.json().get("keys", []) if "kid" in key}
+            )
+
+    def start(self) -> None:
+        if self._task is None and self.jwks_url is not None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except httpx.HTTPError as exc:
+                logger.warning("jwks_refresh_failed", error=str(exc))
+            await asyncio.sleep(settings.AUTH_JWKS_REFRESH_SECONDS)
+
+
+# ===========================================
+# Verification
+# ===========================================
+
+
+class TokenCache:
+    """LRU of verified tokens (by SHA-256) -> AuthContext, dropped at expiry."""
+
+    def __init__(self, max_entries: int):
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[bytes, AuthContext]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: bytes, now: float) -> Optional[AuthContext]:
+        context = self._entries.get(key)
+        if context is None:
+            self.misses += 1
+            return None
+        if context.expires_at <= now:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return context
+
+    def put(self, key: bytes, context: AuthContext) -> None:
+        self._entries[key] = context
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+signing_keys = SigningKeys()
+token_cache = TokenCache(settings.AUTH_TOKEN_CACHE_SIZE)
+
+
+def _decode(token: str) -> Dict[str, Any]:
+    try:
+        header = jwt.get_unverified_header(token)
+    except JWTError as exc:
+        raise AuthError(f"Malformed token: {exc}") from None
+
+    algorithm = header.get("alg")
+    if algorithm == "HS256":
+        if not settings.SUPABASE_JWT_SECRET:
+            raise AuthError("HS256 tokens are not accepted (SUPABASE_JWT_SECRET not set)")
+        key: Any = settings.SUPABASE_JWT_SECRET
+    else:
+        key = signing_keys.get(header.get("kid"))
+        if key is None:
+            raise UnknownSigningKey("Unknown signing key")
+        algorithm = key.get("alg", algorithm)
+
+    try:
+        return jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=settings.AUTH_JWT_AUDIENCE,
+        )
+    except JWTError as exc:
+        raise AuthError(str(exc)) from None
+
+
+def _context(claims: Dict[str, Any]) -> AuthContext:
+    metadata = claims.get("app_metadata") or {}
+    org_id = claims.get("org_id") or metadata.get("org_id")
+    role = claims.get("role") if claims.get("role") in ROLES else metadata.get("role")
+    if not claims.get("exp"):
+        raise AuthError("Token has no expiry")
+    if not claims.get("sub") or not org_id or role not in ROLES:
+        raise AuthError("Token has no organization membership")
+    return AuthContext(
+        user_id=claims["sub"],
+        org_id=str(org_id),
+        role=role,
+        expires_at=float(claims["exp"]),
+    )
+
+
+def verify_token(token: str, now: Optional[float] = None) -> AuthContext:
+    """Verify a token (or reuse its cached claims) and return the caller."""
+    now = now or time.time()
+    key = hashlib.sha256(token.encode()).digest()
+    context = token_cache.get(key, now)
+    if context is None:
+        context = _context(_decode(token))
+        if context.expires_at <= now:
+            raise AuthError("Token has expired")
+        token_cache.put(key, context)
+    return context
+
+
+async def authenticate(token: str) -> AuthContext:
+    """verify_token, refreshing the JWKS once if the key was rotated."""
+    try:
+        return verify_token(token)
+    except UnknownSigningKey:
+        pass
+    try:
+        await signing_keys.refresh(min_age=settings.AUTH_JWKS_MIN_REFRESH_SECONDS)
+    except httpx.HTTPError:
+        pass
+    return verify_token(token)
+
+
+# ===========================================
+# Dependencies
+# ===========================================
+
+
+# Browsers can't set headers on WebSocket or EventSource connections, so
+# these routes (and only these) take ?access_token= instead
+QUERY_TOKEN_PATHS = frozenset({"/api/carts/live", "/api/carts/live/stream"})
+
+
+def _bearer(connection: HTTPConnection) -> Optional[str]:
+    header = connection.headers.get("authorization", "")
+    scheme, _, token = header.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token
+    if route_template(connection.scope) in QUERY_TOKEN_PATHS:
+        return connection.query_params.get("access_token")
+    return None
+
+
+async def current_user(connection: HTTPConnection) -> AuthContext:
+    """The verified caller; 401 (or WebSocket close 1008) otherwise."""
+    token = _bearer(connection)
+    try:
+        if token is None:
+            raise AuthError("Missing bearer token")
+        return await authenticate(token)
+    except AuthError as exc:
+        if isinstance(connection, WebSocket):
+            raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=str(exc))
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(exc),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+async def current_org_id(user: AuthContext = Depends(current_user)) -> str:
+    """The caller's organization, for routes scoped to one org."""
+    return user.org_id
+
+
+def require_role(*roles: str) -> Callable[..., Any]:
+    """Dependency that allows only callers with one of `roles`."""
+
+    async def check(
+        connection: HTTPConnection,
+        user: AuthContext = Depends(current_user),
+    ) -> AuthContext:
+        if user.role not in roles:
+            detail = f"Requires role: {', '.join(roles)}"
+            if isinstance(connection, WebSocket):
+                raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=detail)
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+        return user
+
+    return check
@@ -0,0 +1,350 @@
+"""
+Database Access
+
+Queries go straight to Postgres over a pooled asyncpg connection instead
+of one HTTP round trip to the Supabase REST API per query. The pool is
+opened in the app lifespan and sized from settings.
+
+Each unit of work runs in a transaction whose first statement sets, in
+one round trip and only for that transaction:
+- search_path to DATABASE_SCHEMA
+- request.jwt.claims to the caller's claims (read by auth.jwt())
+- role to DATABASE_RLS_ROLE, so the policies in 002_row_level_security.sql
+  apply exactly as they do for Supabase clients
+
+Background jobs open a transaction without a caller and run as the
+connecting (service) role.
+
+With DATABASE_REPLICA_URL set, endpoints marked with the `replica_reads`
+dependency run read-only transactions on the replica. Replication is
+tracked by pairing timestamped primary WAL positions with the replica's
+replay position; an org's reads stay on the primary until the replica
+has replayed past that org's last write (read-after-write, e.g. a
+just-submitted quality check), and all reads do while the replica lags
+more than DATABASE_REPLICA_MAX_LAG_SECONDS or is down. Writes are
+tracked per process.
+
+Hot statements are prepared when a connection is opened and every other
+statement on first use, then reused for the connection's lifetime.
+DATABASE_URL must be a direct or session-mode pooler connection:
+transaction-mode pgbouncer does not keep prepared statements.
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, List, Optional, Tuple
+
+import asyncpg
+import structlog
+from asyncpg.prepared_stmt import PreparedStatement
+
+from app.config import settings
+from app.utils.auth import AuthContext
+
+logger = structlog.get_logger(__name__)
+
+# Per-transaction RLS context: $1 = search_path, $2 = JWT claims, $3 = role
+RLS_CONTEXT_SQL = """
+SELECT set_config('search_path', $1, true),
+       set_config('request.jwt.claims', $2, true),
+       set_config('role', $3, true)
+"""
+
+# Background jobs: schema only, connecting role
+SERVICE_CONTEXT_SQL = "SELECT set_config('search_path', $1, true)"
+
+# WAL positions as byte offsets, for replica lag
+PRIMARY_LSN_SQL = "SELECT (pg_current_wal_lsn() - '0/0'::pg_lsn)::bigint"
+REPLAY_LSN_SQL = "SELECT (pg_last_wal_replay_lsn() - '0/0'::pg_lsn)::bigint"
+
+# Session-level, so it is held for as long as the connection is kept
+# $1 = lock key
+TRY_ADVISORY_LOCK_SQL = "SELECT pg_try_advisory_lock($1)"
+
+LSN_SAMPLES = 600  # Primary positions awaiting replay; older ones are dropped
+
+# Set by the replica_reads route dependency for the current request
+_replica_reads: ContextVar[bool] = ContextVar("replica_reads", default=False)
+
+
+class DatabaseNotConfigured(RuntimeError):
+    """Raised when DATABASE_URL is not set."""
+
+
+def _claims(user: AuthContext) -> str:
+    """The JWT claims the RLS helper functions read."""
+    return json.dumps(
+        {
+            "sub": user.user_id,
+            "org_id": user.org_id,
+            "role": user.role,
+            "exp": int(user.expires_at),
+        },
+        separators=(",", ":"),
+    )
+
+
+class Connection(asyncpg.Connection):
+    """asyncpg connection that keeps its prepared statements by SQL text."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._prepared: Dict[str, PreparedStatement] = {}
+
+    async def prepared(self, sql: str) -> PreparedStatement:
+        statement = self._prepared.get(sql)
+        if statement is None:
+            statement = self._prepared[sql] = await self.prepare(sql)
+        return statement
+
+
+class Session:
+    """
+    One transaction on one connection.
+
+    Offers the asyncpg query methods, so services written against a raw
+    connection (`conn.fetch(SQL, ...)`) accept a session unchanged.
+    """
+
+    def __init__(self, conn: Connection):
+        self.conn = conn
+
+    async def fetch(self, sql: str, *args: Any) -> List[asyncpg.Record]:
+        return await (await self.conn.prepared(sql)).fetch(*args)
+
+    async def fetchrow(self, sql: str, *args: Any) -> Optional[asyncpg.Record]:
+        return await (await self.conn.prepared(sql)).fetchrow(*args)
+
+    async def fetchval(self, sql: str, *args: Any) -> Any:
+        return await (await self.conn.prepared(sql)).fetchval(*args)
+
+    async def execute(self, sql: str, *args: Any) -> None:
+        await (await self.conn.prepared(sql)).fetch(*args)
+
+    def transaction(self) -> Any:
+        """A savepoint inside the session's transaction."""
+        return self.conn.transaction()
+
+
+class Database:
+    """The asyncpg pools (primary and optional replica) and per-transaction RLS context."""
+
+    def __init__(self):
+        self._pool: Optional[asyncpg.Pool] = None
+        self._replica: Optional[asyncpg.Pool] = None
+        self._hot_statements: List[str] = []
+        self._lsn_samples: Deque[Tuple[float, int]] = deque(maxlen=LSN_SAMPLES)
+        self._replica_synced_at = 0.0  # Primary state as of this time is on the replica
+        self._last_write: Dict[str, float] = {}  # org_id -> monotonic time of last commit
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(settings.DATABASE_URL)
+
+    @property
+    def connected(self) -> bool:
+        return self._pool is not None
+
+    def prepare_on_connect(self, statements: Iterable[str]) -> None:
+        """Statements to prepare on every new connection (the hot path)."""
+        self._hot_statements.extend(statements)
+
+    async def _init_connection(self, conn: Connection) -> None:
+        for sql in (RLS_CONTEXT_SQL, SERVICE_CONTEXT_SQL, *self._hot_statements):
+            try:
+                await conn.prepared(sql)
+            except asyncpg.PostgresError as exc:
+                # A missing migration shouldn't take the pool down with it
+                logger.warning("statement_prepare_failed", error=str(exc))
+
+    async def _create_pool(self, dsn: str) -> asyncpg.Pool:
+        return await asyncpg.create_pool(
+            dsn,
+            min_size=settings.DATABASE_POOL_MIN_SIZE,
+            max_size=settings.DATABASE_POOL_MAX_SIZE,
+            max_inactive_connection_lifetime=settings.DATABASE_IDLE_LIFETIME_SECONDS,
+            command_timeout=settings.DATABASE_COMMAND_TIMEOUT_SECONDS,
+            connection_class=Connection,
+            init=self._init_connection,
+            server_settings={"application_name": settings.APP_NAME},
+        )
+
+    async def connect(self) -> None:
+        """Open the pools and check that the database answers."""
+        dsn = settings.DATABASE_URL
+        if self._pool is not None or not dsn:
+            return
+        self._pool = await self._create_pool(dsn)
+        if not await self.ping():
+            logger.error("database_unreachable_at_startup")
+        if settings.DATABASE_REPLICA_URL:
+            self._replica = await self._create_pool(settings.DATABASE_REPLICA_URL)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for pool in (self._replica, self._pool):
+            if pool is not None:
+                await pool.close()
+        self._pool = self._replica = None
+
+    async def ping(self) -> bool:
+        """Health check: a pooled connection answers SELECT 1 in time."""
+        if self._pool is None:
+            return False
+        try:
+            async with self._pool.acquire(
+                timeout=settings.DATABASE_ACQUIRE_TIMEOUT_SECONDS
+            ) as conn:
+                return (
+                    await conn.fetchval(
+                        "SELECT 1", timeout=settings.DATABASE_ACQUIRE_TIMEOUT_SECONDS
+                    )
+                    == 1
+                )
+        except (asyncpg.PostgresError, OSError, asyncio.TimeoutError):
+            return False
+
+    async def try_advisory_lock(self, key: int) -> Optional[Connection]:
+        """
+        Take a session advisory lock on a connection kept out of the pool.
+        Returns that connection, or None if another session holds the lock;
+        the lock lasts until `release_advisory_lock` or the connection drops.
+        """
+        if self._pool is None:
+            raise DatabaseNotConfigured("Database is not connected (DATABASE_URL not set)")
+        conn = await self._pool.acquire(timeout=settings.DATABASE_ACQUIRE_TIMEOUT_SECONDS)
+        try:
+            locked = await conn.fetchval(TRY_ADVISORY_LOCK_SQL, key)
+        except BaseException:
+            await self._pool.release(conn)
+            raise
+        if not locked:
+            await self._pool.release(conn)
+            return None
+        return conn
+
+    async def release_advisory_lock(self, conn: Connection) -> None:
+        """Return a lock connection to the pool; its reset drops the lock."""
+        if self._pool is not None:
+            await self._pool.release(conn)
+
+    def status(self) -> Dict[str, Any]:
+        """Pool size, idle connections and replica lag, for /health."""
+        if self._pool is None:
+            return {"configured": self.configured, "connected": False}
+        status: Dict[str, Any] = {
+            "configured": True,
+            "connected": True,
+            "size": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+            "max_size": self._pool.get_max_size(),
+        }
+        if self._replica is not None:
+            status["replica"] = {
+                "size": self._replica.get_size(),
+                "idle": self._replica.get_idle_size(),
+                "lag_seconds": round(self.replica_lag(), 1) if self._replica_synced_at else None,
+                "in_use": self.replica_lag() <= settings.DATABASE_REPLICA_MAX_LAG_SECONDS,
+            }
+        return status
+
+    # ===========================================
+    # Replica routing
+    # ===========================================
+
+    def replica_lag(self, now: Optional[float] = None) -> float:
+        """Seconds of primary history the replica has not replayed yet (upper bound)."""
+        return (now or time.monotonic()) - self._replica_synced_at
+
+    def record_write(self, org_id: str, at: Optional[float] = None) -> None:
+        """Send the org's replica-routed reads to the primary until this write replicates."""
+        self._last_write[org_id] = at or time.monotonic()
+
+    def _use_replica(self, user: Optional[AuthContext]) -> bool:
+        if self._replica is None or user is None or not _replica_reads.get():
+            return False
+        if self.replica_lag() > settings.DATABASE_REPLICA_MAX_LAG_SECONDS:
+            return False
+        return self._last_write.get(user.org_id, 0.0) < self._replica_synced_at
+
+    async def sample_replication(self) -> None:
+        """
+        Pair a timestamped primary WAL position with the replica's replay
+        position. Once the replica replays past a sample, every commit
+        before that sample's time is readable there.
+        """
+        assert self._pool is not None and self._replica is not None
+        sampled_at = time.monotonic()
+        self._lsn_samples.append((sampled_at, await self._pool.fetchval(PRIMARY_LSN_SQL)))
+        replayed = await self._replica.fetchval(REPLAY_LSN_SQL)
+        if replayed is None:
+            return  # Not a standby
+        while self._lsn_samples and self._lsn_samples[0][1] <= replayed:
+            self._replica_synced_at = self._lsn_samples.popleft()[0]
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sample_replication()
+            except (asyncpg.PostgresError, OSError, asyncio.TimeoutError) as exc:
+                logger.warning("replica_lag_check_failed", error=str(exc))
+            await asyncio.sleep(settings.DATABASE_REPLICA_CHECK_SECONDS)
+
+    # ===========================================
+    # Transactions
+    # ===========================================
+
+    @asynccontextmanager
+    async def transaction(self, user: Optional[AuthContext] = None) -> AsyncIterator[Session]:
+        """
+        Run a unit of work in one transaction.
+
+        With a user, queries run under RLS as that user; without one,
+        as the service role (background jobs only). On routes marked with
+        `replica_reads` the transaction is read-only and runs on the
+        replica when it has caught up with the org's last write.
+        """
+        if self._pool is None:
+            raise DatabaseNotConfigured("Database is not connected (DATABASE_URL not set)")
+        read_only = _replica_reads.get()
+        pool = self._replica if self._use_replica(user) else self._pool
+        assert pool is not None
+        async with pool.acquire(timeout=settings.DATABASE_ACQUIRE_TIMEOUT_SECONDS) as conn:
+            async with conn.transaction(readonly=read_only):
+                session = Session(conn)
+                search_path = f"{settings.DATABASE_SCHEMA}, public"
+                if user is None:
+                    await session.execute(SERVICE_CONTEXT_SQL, search_path)
+                else:
+                    await session.execute(
+                        RLS_CONTEXT_SQL, search_path, _claims(user), settings.DATABASE_RLS_ROLE
+                    )
+                yield session
+        if user is not None and not read_only and self._replica is not None:
+            self.record_write(user.org_id)
+
+
+async def replica_reads() -> None:
+    """
+    Route policy: the endpoint only reads, so its transactions are
+    read-only and may be served by the replica.
+
+        @router.get("/trends", dependencies=[Depends(replica_reads)])
+    """
+    _replica_reads.set(True)
+
+
+# Global database instance
+db = Database()
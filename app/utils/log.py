@@ -0,0 +1,234 @@
+"""
+Logging
+
+Structured logs, one JSON object per line on stdout, written off the
+event loop.
+
+Modules log through structlog:
+
+    logger = structlog.get_logger(__name__)
+    logger.warning("n8n_webhook_failed", workflow=workflow, error=str(exc))
+
+Pipeline:
+- structlog processors run in the caller: they add the level, timestamp
+  and the request's correlation ID, and drop sampled-out events
+- a QueueHandler puts the record on a bounded in-memory queue and
+  returns; if the queue is full the record is dropped and counted rather
+  than blocking the event loop
+- a QueueListener thread renders JSON and does the write
+- stdlib loggers (uvicorn, asyncpg, httpx) go through the same queue
+
+High-volume events are sampled: LOG_SAMPLE_RATES maps an event name to
+the fraction kept (e.g. every agent GPS sync, every Twilio status
+callback). Warnings and errors are always kept; kept sampled events
+carry `sample_rate` so counts can be scaled back up.
+
+RequestContextMiddleware binds a correlation ID for each request, taken
+from a well-formed X-Request-ID header or generated, and echoes it on
+the response. Query strings are redacted from uvicorn's access lines,
+since the live endpoints take ?access_token=. shutdown_logging() drains the queue; the app lifespan
+calls it last.
+"""
+
+import logging
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Dict, List, Optional
+
+import orjson
+import structlog
+from structlog.typing import EventDict, Processor
+
+from app.config import settings
+from app.utils.metrics import registry
+
+REQUEST_ID_HEADER = b"x-request-id"
+REQUEST_ID = re.compile(rb"^[A-Za-z0-9._-]{1,64}$")
+ALWAYS_KEPT = {"warning", "error", "critical", "exception"}
+
+LOGS_DROPPED = registry.counter(
+    "foodcartos_log_records_dropped_total",
+    "Log records dropped because the log queue was full.",
+)
+
+_listener: Optional[QueueListener] = None
+
+
+# ===========================================
+# Processors
+# ===========================================
+
+
+def sample_events(logger: Any, method: str, event: EventDict) -> EventDict:
+    """Keep LOG_SAMPLE_RATES[event] of a high-volume event's records."""
+    rate = settings.LOG_SAMPLE_RATES.get(event.get("event", ""))
+    if rate is None or method in ALWAYS_KEPT:
+        return event
+    if random.random() >= rate:
+        raise structlog.DropEvent
+    event["sample_rate"] = rate
+    return event
+
+
+def _record_time(logger: Any, method: str, event: EventDict) -> EventDict:
+    """Timestamp a stdlib record with when it was logged, not when it was written."""
+    created = datetime.fromtimestamp(event["_record"].created, timezone.utc)
+    event["timestamp"] = created.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    return event
+
+
+def _render_json(logger: Any, method: str, event: EventDict) -> str:
+    return orjson.dumps(event, default=str).decode()
+
+
+# ===========================================
+# Handler
+# ===========================================
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Enqueues records as they are. The stock prepare() renders the
+    message in the caller; here the listener thread's formatter does it.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOGS_DROPPED.inc()
+
+
+def configure_logging() -> None:
+    """Set up structlog and route all logging through the queue (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    shared: List[Processor] = [
+        structlog.contextvars.merge_contextvars,
+        structlog.stdlib.add_log_level,
+        structlog.stdlib.add_logger_name,
+        structlog.processors.TimeStamper(fmt="iso", utc=True),
+    ]
+    structlog.configure(
+        processors=[
+            structlog.stdlib.filter_by_level,
+            *shared,
+            sample_events,
+            structlog.processors.format_exc_info,  # While the exception is current
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+    renderer: Processor = _render_json
+    if settings.LOG_FORMAT == "console":
+        renderer = structlog.dev.ConsoleRenderer()
+    formatter = structlog.stdlib.ProcessorFormatter(
+        # Records from stdlib loggers: the correlation ID was copied onto
+        # the record in the caller (_bind_request_id); the rest runs here
+        foreign_pre_chain=[
+            structlog.stdlib.ExtraAdder(allow=("request_id",)),
+            structlog.stdlib.add_log_level,
+            structlog.stdlib.add_logger_name,
+            _record_time,
+        ],
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            structlog.processors.format_exc_info,
+            renderer,
+        ],
+    )
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(formatter)
+
+    handler = _NonBlockingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    handler.addFilter(_bind_request_id)
+    handler.addFilter(_redact_query)
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    # uvicorn installs its own stream handlers; send its logs through ours
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=False)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Write out everything still queued and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# ===========================================
+# Correlation IDs
+# ===========================================
+
+
+def _without_query(value: Any) -> Any:
+    if isinstance(value, str) and value.startswith("/") and "?" in value:
+        return value.partition("?")[0] + "?[redacted]"
+    return value
+
+
+def _redact_query(record: logging.LogRecord) -> bool:
+    """Redact query strings from uvicorn's request lines (?access_token= is a bearer token)."""
+    if record.name.startswith("uvicorn") and isinstance(record.args, tuple):
+        record.args = tuple(_without_query(arg) for arg in record.args)
+    return True
+
+
+def _bind_request_id(record: logging.LogRecord) -> bool:
+    """Copy the request's correlation ID onto stdlib records, in the calling thread."""
+    request_id = structlog.contextvars.get_contextvars().get("request_id")
+    if request_id is not None and not hasattr(record, "request_id"):
+        record.request_id = request_id
+    return True
+
+
+class RequestContextMiddleware:
+    """ASGI middleware binding a correlation ID to every log line of a request."""
+
+    def __init__(self, app: Callable[..., Any]):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER and REQUEST_ID.match(value):
+                request_id = value.decode()
+                break
+        if request_id is None:
+            request_id = uuid.uuid4().hex
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (REQUEST_ID_HEADER, request_id.encode()),
+                ]
+            await send(message)
+
+        with structlog.contextvars.bound_contextvars(request_id=request_id):
+            await self.app(scope, receive, send_wrapper)
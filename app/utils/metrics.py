@@ -0,0 +1,302 @@
+"""
+Metrics
+
+Request and application metrics in the Prometheus text exposition
+format, served on /metrics.
+
+MetricsMiddleware records, per route template (`/api/carts/{cart_id}`,
+never the raw path, so label cardinality stays bounded):
+- foodcartos_http_requests_total, by method, route and status
+- foodcartos_http_requests_in_flight
+- foodcartos_http_request_duration_seconds, a latency histogram
+
+Services record into the module-level metrics below as things happen
+(webhook lag). State that already lives in a service (queue depths, pool
+usage, cache hit counters) is read at scrape time by collectors
+registered with `registry.on_collect`, so the hot path pays nothing for it.
+"""
+
+import bisect
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Protocol, Sequence, Tuple
+
+import structlog
+
+# Seconds; dashboards poll, so most requests should land well under 100ms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Seconds between an event happening and the API processing it
+LAG_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+logger = structlog.get_logger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+class CacheStats(Protocol):
+    """A cache whose lookup counts are exported (CACHE_HITS, CACHE_MISSES)."""
+
+    hits: int
+    misses: int
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+# ===========================================
+# Metric Types
+# ===========================================
+
+
+class Metric:
+    """A counter or gauge: one value per label combination."""
+
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def clear(self) -> None:
+        self._values.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label combination."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                bucket_labels = _format_labels(
+                    (*self.labelnames, "le"), (*labels, _format_value(bound))
+                )
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            series_labels = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{series_labels} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{series_labels} {cumulative}")
+        return lines
+
+
+# ===========================================
+# Registry
+# ===========================================
+
+
+class Registry:
+    """The metrics served on /metrics, plus collectors run before each scrape."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Metric:
+        return self._add(Metric(name, documentation, "counter", labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Metric:
+        return self._add(Metric(name, documentation, "gauge", labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def _add(self, metric: Any) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def on_collect(self, collector: Callable[[], None]) -> None:
+        """Run `collector` before every scrape, to copy service state into gauges."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                # One broken collector shouldn't blank the whole scrape
+                logger.exception("metrics_collector_failed", collector=collector.__name__)
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# HTTP
+HTTP_REQUESTS = registry.counter(
+    "foodcartos_http_requests_total",
+    "HTTP requests by method, route template and status code.",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = registry.gauge(
+    "foodcartos_http_requests_in_flight",
+    "HTTP requests currently being served.",
+)
+HTTP_LATENCY = registry.histogram(
+    "foodcartos_http_request_duration_seconds",
+    "HTTP request latency by method and route template.",
+    ("method", "route"),
+)
+
+# Application
+QUEUE_DEPTH = registry.gauge(
+    "foodcartos_queue_depth",
+    "Items waiting in in-process ingestion and delivery queues.",
+    ("queue",),
+)
+WEBHOOK_LAG = registry.histogram(
+    "foodcartos_webhook_lag_seconds",
+    "Time from an event (payment, agent reading) to the API processing it.",
+    ("source",),
+    buckets=LAG_BUCKETS,
+)
+DB_POOL_CONNECTIONS = registry.gauge(
+    "foodcartos_db_pool_connections",
+    "Database pool connections by pool and state (in_use, idle, max).",
+    ("pool", "state"),
+)
+DB_REPLICA_LAG = registry.gauge(
+    "foodcartos_db_replica_lag_seconds",
+    "Primary history the read replica has not replayed yet (upper bound).",
+)
+# Gauges copied from each cache's own running counts at scrape time
+CACHE_HITS = registry.gauge(
+    "foodcartos_cache_hits",
+    "Cache lookups served from the cache, since the process started.",
+    ("cache",),
+)
+CACHE_MISSES = registry.gauge(
+    "foodcartos_cache_misses",
+    "Cache lookups that had to load or build the value, since the process started.",
+    ("cache",),
+)
+
+
+# ===========================================
+# Middleware
+# ===========================================
+
+
+def route_template(scope: Mapping[str, Any]) -> str:
+    """Path template of the route that served `scope`, prefix included."""
+    # FastAPI keeps routes of included routers unprefixed and records the
+    # prefixed one as the effective route; plain Starlette routes are full paths
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    template = getattr(context, "path_format", None) or getattr(scope.get("route"), "path", None)
+    return template or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording HTTP metrics.
+
+    The route label is the matched route's path template, read from the
+    scope after routing; requests that match no route share one label.
+    WebSocket connections and Server-Sent Event streams are long-lived
+    and left out of the latency histogram.
+    """
+
+    def __init__(self, app: Callable[..., Any]):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        streaming = False
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status_code, streaming
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                streaming = any(
+                    name.lower() == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", ())
+                )
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            template = route_template(scope)
+            method = scope["method"]
+            if not streaming:
+                HTTP_LATENCY.observe(time.perf_counter() - started, method, template)
+            HTTP_REQUESTS.inc(method, template, str(status_code))
+
+
+def observe_lag(source: str, occurred_at: Optional[float]) -> None:
+    """Record webhook lag for an event that happened at `occurred_at` (epoch seconds)."""
+    if occurred_at is not None:
+        WEBHOOK_LAG.observe(max(0.0, time.time() - occurred_at), source)
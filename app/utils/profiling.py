@@ -0,0 +1,302 @@
+"""
+Request Profiling
+
+Opt-in (PROFILING_ENABLED) wall-clock sampling of individual requests,
+for finding out why an endpoint is slow in production.
+
+A request is profiled when:
+- it carries `X-Profile: <PROFILING_TOKEN>`; the response then carries
+  `X-Profile-Id` naming the stored profile
+- it is picked by PROFILING_SAMPLE_RATE
+- its route has a threshold in PROFILING_SLOW_ROUTES; these are sampled
+  throughout and the profile is kept only if the request ran longer
+
+A background thread looks at the event loop every
+PROFILING_INTERVAL_SECONDS. When a profiled request's task is running it
+records the loop thread's Python stack; while the task is suspended it
+records the chain of coroutines it is awaiting under an `<awaiting>`
+root, so time spent waiting on the database or an HTTP call shows up as
+well as CPU time. Nothing is traced, so untouched requests pay only the
+trigger checks.
+
+Profiles are written to PROFILING_DIR in the collapsed-stack format
+(`frame;frame;frame count`) read by flamegraph.pl, speedscope and
+inferno; the newest PROFILING_MAX_FILES are kept.
+"""
+
+import asyncio
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from types import CodeType, FrameType
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
+
+import structlog
+from starlette.routing import compile_path
+
+from app.config import settings
+from app.utils.metrics import route_template
+
+logger = structlog.get_logger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILES_PATH = "/api/admin/profiles"  # Reading profiles isn't profiled
+# <UTC time to the millisecond>_<id>_<reason>_<method>_<route>_<duration>ms.folded
+PROFILE_NAME = re.compile(
+    r"^(?P<time>\d{8}T\d{9}Z)_(?P<id>[0-9a-f]{12})_(?P<reason>header|sampled|slow)"
+    r"_(?P<method>[A-Z]+)_(?P<route>[\w.-]*)_(?P<duration_ms>\d+)ms\.folded$"
+)
+
+_label_cache: Dict[Tuple[CodeType, int], str] = {}
+
+
+def _label(code: CodeType, lineno: int) -> str:
+    """`function (path:line)`, with paths shortened to the package or app."""
+    key = (code, lineno)
+    label = _label_cache.get(key)
+    if label is None:
+        path = code.co_filename
+        for marker in ("site-packages" + os.sep, os.getcwd() + os.sep):
+            if marker in path:
+                path = path.split(marker, 1)[1]
+                break
+        label = _label_cache[key] = f"{code.co_name} ({path}:{lineno})".replace(";", ":")
+    return label
+
+
+def _running_stack(frame: Optional[FrameType], root: Optional[CodeType]) -> List[str]:
+    """Labels of a thread's stack, outermost first, starting at the task's coroutine."""
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame.f_code, frame.f_lineno))
+        if frame.f_code is root:
+            break
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _awaiting_stack(coro: Any) -> List[str]:
+    """Labels of a suspended coroutine and everything it awaits, outermost first."""
+    labels = ["<awaiting>"]
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            if not hasattr(coro, "cr_frame") and not hasattr(coro, "gi_frame"):
+                labels.append(f"<{type(coro).__name__}>")  # A future
+            break
+        labels.append(_label(frame.f_code, frame.f_lineno))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return labels
+
+
+class Profile:
+    """Stack samples of one request."""
+
+    def __init__(self, task: "asyncio.Task[Any]", reason: str, method: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.task = task
+        self.reason = reason
+        self.method = method
+        self.started_at = datetime.now(timezone.utc)
+        self.stacks: "Counter[str]" = Counter()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Sampler:
+    """Background thread sampling the event loop for in-flight profiles."""
+
+    def __init__(self, interval: float):
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._active: Dict[int, Profile] = {}
+        self._wake = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self, reason: str, method: str) -> Profile:
+        task = asyncio.current_task()
+        assert task is not None  # Called from the request's task
+        profile = Profile(task, reason, method)
+        with self._lock:
+            if self._thread is None:
+                self._loop = asyncio.get_running_loop()
+                self._loop_thread = threading.get_ident()
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+            self._active[id(profile)] = profile
+        self._wake.set()
+        return profile
+
+    def end(self, profile: Profile) -> None:
+        with self._lock:
+            self._active.pop(id(profile), None)
+
+    def sample(self) -> None:
+        """Record one stack for every active profile."""
+        with self._lock:
+            if not self._active:
+                return
+            running = asyncio.current_task(self._loop)
+            frame = sys._current_frames().get(self._loop_thread)
+            for profile in self._active.values():
+                coro = profile.task.get_coro()
+                if profile.task is running:
+                    stack = _running_stack(frame, getattr(coro, "cr_code", None))
+                else:
+                    stack = _awaiting_stack(coro)
+                profile.stacks[";".join(stack)] += 1
+
+    def _run(self) -> None:
+        while True:
+            if not self._active:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            time.sleep(self._interval)
+            self.sample()
+
+
+# ===========================================
+# Storage
+# ===========================================
+
+
+def _route_slug(route: str) -> str:
+    return re.sub(r"[^\w-]+", ".", route).strip(".")
+
+
+def _write(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".part"
+    with open(tmp, "w") as f:
+        f.write(content)
+    os.replace(tmp, path)
+    # Keep the newest files; names sort by time
+    names = sorted(name for name in os.listdir(settings.PROFILING_DIR) if PROFILE_NAME.match(name))
+    for name in names[: max(0, len(names) - settings.PROFILING_MAX_FILES)]:
+        os.unlink(os.path.join(settings.PROFILING_DIR, name))
+
+
+async def save(profile: Profile, route: str, duration: float) -> str:
+    """Write a profile to PROFILING_DIR; returns its file name."""
+    name = (
+        f"{profile.started_at:%Y%m%dT%H%M%S}{profile.started_at.microsecond // 1000:03d}Z"
+        f"_{profile.id}_{profile.reason}"
+        f"_{profile.method}_{_route_slug(route)}_{int(duration * 1000)}ms.folded"
+    )
+    await asyncio.to_thread(_write, os.path.join(settings.PROFILING_DIR, name), profile.folded())
+    return name
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Stored profiles, newest first."""
+    if not os.path.isdir(settings.PROFILING_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(settings.PROFILING_DIR), reverse=True):
+        match = PROFILE_NAME.match(name)
+        if match is None:
+            continue
+        profiles.append(
+            {
+                "name": name,
+                "id": match["id"],
+                "reason": match["reason"],
+                "method": match["method"],
+                "route": match["route"],
+                "duration_ms": int(match["duration_ms"]),
+                "created_at": datetime.strptime(match["time"], "%Y%m%dT%H%M%S%fZ").replace(
+                    tzinfo=timezone.utc
+                ),
+                "bytes": os.path.getsize(os.path.join(settings.PROFILING_DIR, name)),
+            }
+        )
+    return profiles
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Path of a stored profile by file name or id, if it exists."""
+    for profile in list_profiles():
+        if name in (profile["name"], profile["id"]):
+            return os.path.join(settings.PROFILING_DIR, profile["name"])
+    return None
+
+
+def token_matches(value: Optional[str]) -> bool:
+    """Whether `value` is the configured PROFILING_TOKEN (never true when unset)."""
+    return (
+        bool(settings.PROFILING_TOKEN)
+        and value is not None
+        and hmac.compare_digest(value.encode(), settings.PROFILING_TOKEN.encode())
+    )
+
+
+# ===========================================
+# Middleware
+# ===========================================
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests picked by header, sampling or slow route."""
+
+    def __init__(self, app: Callable[..., Any]):
+        self.app = app
+        self.sampler = Sampler(settings.PROFILING_INTERVAL_SECONDS)
+        self._slow_routes: List[Tuple[Pattern[str], float]] = [
+            (compile_path(route)[0], threshold)
+            for route, threshold in settings.PROFILING_SLOW_ROUTES.items()
+        ]
+
+    def _trigger(self, scope: Dict[str, Any]) -> Tuple[Optional[str], Optional[float]]:
+        """(reason, slow threshold) for a request, or (None, None) to leave it alone."""
+        if scope["path"].startswith(PROFILES_PATH):
+            return None, None
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER and token_matches(value.decode("latin-1")):
+                return "header", None
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return "sampled", None
+        for pattern, threshold in self._slow_routes:
+            if pattern.match(scope["path"]):
+                return "slow", threshold
+        return None, None
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        reason, threshold = self._trigger(scope)
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = self.sampler.begin(reason, scope["method"])
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start" and reason == "header":
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.sampler.end(profile)
+            duration = time.perf_counter() - started
+            if threshold is None or duration >= threshold:
+                try:
+                    await save(profile, route_template(scope), duration)
+                except OSError as exc:
+                    logger.warning("profile_save_failed", profile_id=profile.id, error=str(exc))
@@ -0,0 +1,220 @@
+"""
+Responses
+
+A fast path for large list endpoints (transactions, quality checks,
+carts, locations).
+
+Returning plain dicts from an endpoint with a `response_model` makes
+FastAPI validate every row into the model and serialize it again, which
+dominates the request for a few thousand rows. When the data layer
+already produces rows shaped like the model, return them through
+`fast_list` instead:
+
+    @router.get("/", response_model=List[Transaction])
+    async def list_transactions(...):
+        return fast_list(rows, Transaction)
+
+The `response_model` stays for the OpenAPI schema; the rows are written
+with orjson as they are. With DEBUG on, rows are still checked against
+the model (every field present, every value valid), so a query that
+drifts from its model fails in development instead of shipping.
+
+CompressionMiddleware compresses responses above COMPRESSION_MIN_BYTES,
+with brotli when the client accepts it and the `brotli` package is
+installed, and gzip otherwise.
+"""
+
+import zlib
+from decimal import Decimal
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Type
+
+import orjson
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z  # "Z" for UTC, like pydantic
+
+
+def _default(value: Any) -> Any:
+    """Types orjson doesn't serialize itself."""
+    if isinstance(value, Decimal):  # asyncpg NUMERIC; the models declare float
+        return float(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(Response):
+    """JSON response rendered with orjson, without validation."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+def _check_rows(rows: List[Dict[str, Any]], model: Type[BaseModel]) -> None:
+    fields = set(model.model_fields)
+    for index, row in enumerate(rows):
+        if set(row) != fields:
+            missing, extra = fields - set(row), set(row) - fields
+            raise ValueError(
+                f"Row {index} doesn't match {model.__name__}: "
+                f"missing {sorted(missing)}, extra {sorted(extra)}"
+            )
+        model.model_validate(row)
+
+
+def fast_list(
+    rows: Iterable[Dict[str, Any]],
+    model: Type[BaseModel],
+    headers: Optional[Dict[str, str]] = None,
+) -> FastJSONResponse:
+    """Rows already shaped like `model`, serialized without re-validation."""
+    rows = list(rows)
+    if settings.DEBUG:
+        _check_rows(rows, model)
+    return FastJSONResponse(rows, headers=headers)
+
+
+# ===========================================
+# Compression
+# ===========================================
+
+
+# Never worth compressing, or (event streams) must not be buffered
+UNCOMPRESSED_TYPES = ("text/event-stream", "image/", "video/", "audio/")
+
+
+class _Gzip:
+    encoding = "gzip"
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, more_body: bool) -> bytes:
+        mode = zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH
+        return self._compressor.compress(data) + self._compressor.flush(mode)
+
+
+class _Brotli:
+    encoding = "br"
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, more_body: bool) -> bytes:
+        data = self._compressor.process(data)
+        return data + (self._compressor.flush() if more_body else self._compressor.finish())
+
+
+class _CompressionResponder:
+    """
+    Wraps one response: holds back http.response.start until the first
+    body chunk shows whether the response is worth compressing, then
+    sends it compressed (streamed chunk by chunk) or as it was.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int, codec: Callable[[], Any]):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.codec = codec
+        self.start: Optional[Message] = None
+        self.compressor: Any = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            self.passthrough = "content-encoding" in headers or headers.get(
+                "content-type", ""
+            ).startswith(UNCOMPRESSED_TYPES)
+            if self.passthrough:
+                await self.send(message)
+            else:
+                self.start = message
+            return
+
+        if self.passthrough:
+            await self.send(message)
+            return
+        start, self.start = self.start, None
+        if message["type"] != "http.response.body":
+            if start is not None:
+                await self.send(start)
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if start is not None:
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            self.compressor = self.codec()
+            body = self.compressor.compress(body, more_body)
+            headers = MutableHeaders(raw=list(start["headers"]))
+            headers["Content-Encoding"] = self.compressor.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await self.send({**start, "headers": headers.raw})
+        else:
+            body = self.compressor.compress(body, more_body)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least `minimum_size` bytes: brotli when
+    accepted and available, else gzip. Already-encoded responses, media
+    and event streams are passed through.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        # Responses are compressed on every request, not once ahead of
+        # time: favour speed over the last few percent of size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = Headers(scope=scope).get("accept-encoding", "")
+        codec: Callable[[], Any]
+        if brotli is not None and "br" in accepted:
+            codec = partial(_Brotli, self.brotli_quality)
+        elif "gzip" in accepted:
+            codec = partial(_Gzip, self.gzip_level)
+        else:
+            await self.app(scope, receive, send)
+            return
+        await _CompressionResponder(self.app, self.minimum_size, codec)(scope, receive, send)
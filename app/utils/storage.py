@@ -0,0 +1,345 @@
+"""
+Photo Storage
+
+Quality check photos are stored content-addressed: the key is the SHA-256
+of the processed JPEG, so identical bytes are stored once no matter how
+many checks reference them. Review screens and leaderboards ask for
+smaller sizes, which are generated on first use into a size-bounded,
+LRU-evicted derivative cache.
+
+Backends:
+- supabase: Supabase Storage bucket (default)
+- local: Files on local disk, served by the API (development, self-hosting)
+"""
+
+import asyncio
+import os
+import re
+import shutil
+import tempfile
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Union
+
+import httpx
+
+from app.config import settings
+
+# Derivative name -> max width in pixels
+DERIVATIVE_WIDTHS = {
+    "thumb": 320,
+    "review": 1024,
+}
+
+_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class StorageNotConfigured(RuntimeError):
+    """Raised when no storage backend credentials are set."""
+
+
+def is_photo_hash(value: str) -> bool:
+    return bool(_HASH_PATTERN.match(value))
+
+
+def photo_key(photo_hash: str) -> str:
+    """Object key for a photo; the two-character prefix keeps directories small."""
+    return f"{photo_hash[:2]}/{photo_hash}.jpg"
+
+
+async def _file_chunks(path: str, chunk_size: int) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+# ===========================================
+# Backends
+# ===========================================
+
+
+class SupabaseStorage:
+    """Supabase Storage bucket, accessed with the service key."""
+
+    def __init__(self, url: str, service_key: str, bucket: str):
+        self._base = f"{url.rstrip('/')}/storage/v1/object"
+        self._public_base = f"{self._base}/public/{bucket}"
+        self._bucket = bucket
+        self._headers = {
+            "Authorization": f"Bearer {service_key}",
+            "apikey": service_key,
+        }
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=self._headers,
+                timeout=httpx.Timeout(30.0, connect=5.0),
+                verify=settings.VERIFY_SSL,
+            )
+        return self._client
+
+    def url_for(self, photo_hash: str) -> str:
+        return f"{self._public_base}/{photo_key(photo_hash)}"
+
+    async def put_file(self, path: str, photo_hash: str) -> str:
+        """Stream a local file into the bucket unless it's already there."""
+        key = photo_key(photo_hash)
+        client = self._get_client()
+
+        existing = await client.head(f"{self._public_base}/{key}")
+        if existing.status_code != 200:
+            response = await client.post(
+                f"{self._base}/{self._bucket}/{key}",
+                content=_file_chunks(path, settings.PHOTO_CHUNK_BYTES),
+                headers={"Content-Type": "image/jpeg", "Cache-Control": "max-age=31536000"},
+            )
+            response.raise_for_status()
+        return self.url_for(photo_hash)
+
+    async def fetch_original(self, photo_hash: str, dst_path: str) -> bool:
+        """Download an original to local disk; False if it doesn't exist."""
+        async with self._get_client().stream("GET", self.url_for(photo_hash)) as response:
+            if response.status_code == 404:
+                return False
+            response.raise_for_status()
+            with open(dst_path, "wb") as f:
+                async for chunk in response.aiter_bytes(settings.PHOTO_CHUNK_BYTES):
+                    await asyncio.to_thread(f.write, chunk)
+        return True
+
+    def local_path(self, photo_hash: str) -> Optional[str]:
+        return None  # Originals live remotely
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class LocalStorage:
+    """
+    Photos on local disk, standing in for Supabase Storage.
+
+    Files are served by GET /api/quality/photos/{photo_hash}, which
+    supports range requests and lets the server use sendfile.
+    """
+
+    def __init__(self, root: str):
+        self._root = root
+
+    def url_for(self, photo_hash: str) -> str:
+        return f"{settings.API_BASE_URL.rstrip('/')}/api/quality/photos/{photo_hash}"
+
+    def local_path(self, photo_hash: str) -> Optional[str]:
+        path = os.path.join(self._root, photo_key(photo_hash))
+        return path if os.path.exists(path) else None
+
+    async def put_file(self, path: str, photo_hash: str) -> str:
+        """Move a processed photo into place unless the same bytes are already stored."""
+        dst = os.path.join(self._root, photo_key(photo_hash))
+        if not os.path.exists(dst):
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            # Copy to a temp name then rename, so readers never see a partial file
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst), suffix=".part")
+            os.close(fd)
+            await asyncio.to_thread(shutil.copyfile, path, tmp)
+            os.replace(tmp, dst)
+        return self.url_for(photo_hash)
+
+    async def fetch_original(self, photo_hash: str, dst_path: str) -> bool:
+        src = self.local_path(photo_hash)
+        if src is None:
+            return False
+        await asyncio.to_thread(shutil.copyfile, src, dst_path)
+        return True
+
+    async def close(self) -> None:
+        pass
+
+
+PhotoStorage = Union[SupabaseStorage, LocalStorage]
+
+
+# ===========================================
+# Derivative cache
+# ===========================================
+
+# (src_path, dst_path, max_width) -> awaitable that writes the derivative
+Renderer = Callable[[str, str, int], Awaitable[None]]
+
+
+class DerivativeCache:
+    """
+    Lazily generated photo sizes on local disk, bounded by total bytes.
+
+    Least recently served files are evicted first. Concurrent requests for
+    the same missing derivative share one render. For remote backends the
+    downloaded original is cached here too (size "original").
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self._root = root
+        self._max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # path -> bytes, LRU order
+        self._total = 0
+        self._pending: Dict[str, "asyncio.Future[Optional[str]]"] = {}
+        self.hits = 0
+        self.misses = 0
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """Rebuild the LRU from disk, oldest access first."""
+        found = []
+        for dirpath, _, filenames in os.walk(self._root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if name.endswith(".part"):
+                    os.unlink(path)
+                    continue
+                stat = os.stat(path)
+                found.append((stat.st_atime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self._total += size
+        self._evict()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def _path(self, photo_hash: str, size: str) -> str:
+        return os.path.join(self._root, size, photo_key(photo_hash))
+
+    def _add(self, path: str) -> None:
+        size = os.path.getsize(path)
+        self._entries[path] = size
+        self._total += size
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._total > self._max_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    async def get(
+        self,
+        storage: PhotoStorage,
+        photo_hash: str,
+        size: str,
+        render: Renderer,
+    ) -> Optional[str]:
+        """Local path of `photo_hash` at `size`, generating it if needed."""
+        if size == "original":
+            local = storage.local_path(photo_hash)
+            if local is not None:
+                return local
+
+        path = self._path(photo_hash, size)
+        if path in self._entries and os.path.exists(path):
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return path
+
+        pending = self._pending.get(path)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future: "asyncio.Future[Optional[str]]" = asyncio.get_running_loop().create_future()
+        self._pending[path] = future
+        try:
+            result = await self._build(storage, photo_hash, size, path, render)
+        except asyncio.CancelledError:
+            # Waiters are cancelled too rather than left on a future nobody resolves
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()
+            raise
+        finally:
+            self._pending.pop(path, None)
+        future.set_result(result)
+        return result
+
+    async def _build(
+        self,
+        storage: PhotoStorage,
+        photo_hash: str,
+        size: str,
+        path: str,
+        render: Renderer,
+    ) -> Optional[str]:
+        if size == "original":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".part"
+            if not await storage.fetch_original(photo_hash, tmp):
+                return None
+            os.replace(tmp, path)
+            self._add(path)
+            return path
+
+        original = await self.get(storage, photo_hash, "original", render)
+        if original is None:
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".part"
+        await render(original, tmp, DERIVATIVE_WIDTHS[size])
+        os.replace(tmp, path)
+        self._add(path)
+        return path
+
+
+# ===========================================
+# Instances
+# ===========================================
+
+_storage: Optional[PhotoStorage] = None
+_derivatives: Optional[DerivativeCache] = None
+
+
+def get_storage() -> PhotoStorage:
+    """The configured photo storage backend (STORAGE_PROVIDER)."""
+    global _storage
+    if _storage is None:
+        if settings.STORAGE_PROVIDER == "local":
+            _storage = LocalStorage(settings.LOCAL_STORAGE_DIR)
+        else:
+            if not settings.SUPABASE_URL or not settings.SUPABASE_SERVICE_KEY:
+                raise StorageNotConfigured("Set SUPABASE_URL and SUPABASE_SERVICE_KEY")
+            _storage = SupabaseStorage(
+                settings.SUPABASE_URL,
+                settings.SUPABASE_SERVICE_KEY,
+                settings.PHOTO_BUCKET,
+            )
+    return _storage
+
+
+def get_derivatives() -> DerivativeCache:
+    global _derivatives
+    if _derivatives is None:
+        os.makedirs(settings.PHOTO_DERIVATIVE_DIR, exist_ok=True)
+        _derivatives = DerivativeCache(
+            settings.PHOTO_DERIVATIVE_DIR,
+            settings.PHOTO_DERIVATIVE_CACHE_BYTES,
+        )
+    return _derivatives
+
+
+def loaded_derivatives() -> Optional[DerivativeCache]:
+    """The derivative cache if a photo route has opened it (for metrics)."""
+    return _derivatives
+
+
+async def close_storage() -> None:
+    if _storage is not None:
+        await _storage.close()
@@ -0,0 +1,99 @@
+"""
+Fleet Status Benchmark
+
+Compares what an owner dashboard pays to show the whole fleet:
+- Polling GET /api/carts/{cart_id}/status once per cart
+- One GET /api/carts/status for the org
+- Hydrating a cold store from FLEET_STATUS_SQL rows
+
+Runs the app in-process over an ASGI transport, so timings are the
+API's own overhead without network latency. Requests carry an HS256
+access token signed with a throwaway secret.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import httpx
+from jose import jwt
+
+from app.config import settings
+from app.main import app
+from app.services.live_status import LiveStatusStore, live_status
+
+FLEET_SIZES = (10, 100, 1000)
+ROUNDS = 5
+
+
+def bench_token(org_id: str, role: str = "owner") -> str:
+    """An access token for `org_id`, as Supabase Auth would issue it."""
+    if not settings.SUPABASE_JWT_SECRET:
+        settings.SUPABASE_JWT_SECRET = "benchmark-secret"
+    claims = {
+        "sub": f"{org_id}_user",
+        "aud": settings.AUTH_JWT_AUDIENCE,
+        "exp": int(time.time()) + 3600,
+        "org_id": org_id,
+        "role": role,
+    }
+    return jwt.encode(claims, settings.SUPABASE_JWT_SECRET, algorithm="HS256")
+
+
+def fake_rows(org_id: str, count: int):
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "cart_id": f"{org_id}_cart_{i}",
+            "last_seen": now,
+            "latitude": 38.35 + i / 10000,
+            "longitude": -121.98,
+            "last_transaction": now,
+            "today_revenue": 100.0 + i,
+            "completed_checks": i % 4,
+        }
+        for i in range(count)
+    ]
+
+
+async def timed(coro_factory, rounds: int = ROUNDS) -> float:
+    """Best-of-N wall time in milliseconds."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await coro_factory()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+async def main():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'carts':>6} {'per-cart polling':>18} {'fleet endpoint':>16} {'hydrate':>10}")
+        for size in FLEET_SIZES:
+            org_id = f"org_{size}"
+            rows = fake_rows(org_id, size)
+            live_status.hydrate(org_id, rows, required_checks=3)
+            cart_ids = [row["cart_id"] for row in rows]
+            client.headers["Authorization"] = f"Bearer {bench_token(org_id)}"
+
+            async def poll_each():
+                for cart_id in cart_ids:
+                    response = await client.get(f"/api/carts/{cart_id}/status")
+                    response.raise_for_status()
+
+            async def fleet():
+                response = await client.get("/api/carts/status")
+                response.raise_for_status()
+
+            async def hydrate():
+                LiveStatusStore().hydrate(org_id, rows, required_checks=3)
+
+            per_cart_ms = await timed(poll_each, rounds=1 if size >= 1000 else ROUNDS)
+            fleet_ms = await timed(fleet)
+            hydrate_ms = await timed(hydrate)
+            print(f"{size:>6} {per_cart_ms:>15.1f} ms {fleet_ms:>13.1f} ms {hydrate_ms:>7.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
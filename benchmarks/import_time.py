@@ -0,0 +1,101 @@
+"""
+Import Time Budget
+
+Measures how long `import app.main` takes (what every worker pays at
+boot and every autoscaled instance pays on a cold start) with
+`python -X importtime`, in a fresh interpreter per run, and exits 1 when:
+- the best of `--runs` exceeds `--budget-ms`
+- a heavy library is imported at startup (pandas, numpy, Pillow,
+  squareup, twilio, pyowm, supabase); import these inside the
+  functions that use them
+
+Prints the slowest modules imported directly by the app, so a
+regression points at its cause:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget-ms 800
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("pandas", "numpy", "PIL", "square", "twilio", "pyowm", "supabase")
+
+# "import time: <self us> | <cumulative us> | <indent><module>"
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def measure(target: str) -> Tuple[int, List[Tuple[int, str]], List[str]]:
+    """(target cumulative us, [(cumulative us, module)] of its direct imports, all modules)."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Children are listed before their parent, indented one level (two spaces) deeper
+    entries = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            entries.append((len(match[3]) // 2, int(match[2]), match[4]))
+    total, children = 0, []
+    for index, (depth, cumulative, module) in enumerate(entries):
+        if module == target:
+            total = cumulative
+            for child_depth, child_cumulative, child in reversed(entries[:index]):
+                if child_depth <= depth:
+                    break
+                if child_depth == depth + 1:
+                    children.append((child_cumulative, child))
+            break
+    return total, sorted(children, reverse=True), [module for _, _, module in entries]
+
+
+def main(args: argparse.Namespace) -> int:
+    runs = [measure(args.module) for _ in range(args.runs)]
+    total, children, modules = min(runs)
+    print(
+        f"import {args.module}: {total / 1000:.0f} ms (best of {args.runs}), budget {args.budget_ms:.0f} ms"
+    )
+    print(f"\n{'cumulative':>12}  module")
+    for cumulative, module in children[: args.top]:
+        print(f"{cumulative / 1000:>9.1f} ms  {module}")
+
+    failures = []
+    if total / 1000 > args.budget_ms:
+        failures.append(f"{total / 1000:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    loaded: Dict[str, None] = {}
+    for module in modules:
+        if module.split(".")[0] in HEAVY:
+            loaded[module.split(".")[0]] = None
+    if loaded:
+        failures.append(f"heavy libraries imported at startup: {', '.join(loaded)}")
+
+    if failures:
+        print("\nFAIL: " + "; ".join(failures))
+        return 1
+    print("\nOK")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.environ.get("IMPORT_BUDGET_MS", 1000)),
+        help="Allowed import time (env IMPORT_BUDGET_MS)",
+    )
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest direct imports to list")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,89 @@
+"""
+Reused Photo Lookup Benchmark
+
+Measures how fast a new photo's perceptual hash is checked against an
+org's stored hashes, for index sizes up to hundreds of thousands:
+- Build time for the multi-index hash table
+- p50 / p99 lookup latency, for near-duplicates and for fresh photos
+- A linear scan over every stored hash, for comparison
+
+Lookups are checked against the linear scan, so a wrong index fails loudly.
+"""
+
+import random
+import statistics
+import time
+from datetime import date
+
+from app.config import settings
+from app.services.photo_duplicates import HammingIndex, PhotoFingerprint
+
+INDEX_SIZES = (10_000, 100_000, 300_000)
+QUERIES = 2_000
+SCAN_QUERIES = 20
+
+
+def near(value: int, rng: random.Random, max_flips: int) -> int:
+    """`value` with up to `max_flips` random bits flipped (a re-shot or re-encode)."""
+    for bit in rng.sample(range(64), rng.randint(0, max_flips)):
+        value ^= 1 << bit
+    return value
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    rng = random.Random(42)
+    radius = settings.PHOTO_DUPLICATE_MAX_DISTANCE
+    today = date.today()
+    print(f"Radius: {radius} bits")
+    print(
+        f"{'hashes':>8} {'build':>8} {'dup p50':>9} {'dup p99':>9}"
+        f" {'fresh p50':>10} {'fresh p99':>10} {'linear scan':>12}"
+    )
+
+    for size in INDEX_SIZES:
+        hashes = [rng.getrandbits(64) for _ in range(size)]
+        index = HammingIndex(radius)
+
+        start = time.perf_counter()
+        for i, value in enumerate(hashes):
+            index.add(PhotoFingerprint(f"qc_{i}", "cart", "emp", "garlic_butter", today, value))
+        build = time.perf_counter() - start
+
+        duplicate_queries = [near(rng.choice(hashes), rng, radius) for _ in range(QUERIES // 2)]
+        fresh_queries = [rng.getrandbits(64) for _ in range(QUERIES // 2)]
+
+        timings = {}
+        for name, queries in (("dup", duplicate_queries), ("fresh", fresh_queries)):
+            samples = []
+            for query in queries:
+                start = time.perf_counter()
+                index.search(query)
+                samples.append(time.perf_counter() - start)
+            timings[name] = samples
+
+        scan_samples = []
+        for query in duplicate_queries[:SCAN_QUERIES]:
+            start = time.perf_counter()
+            expected = sorted(
+                i for i, value in enumerate(hashes) if (value ^ query).bit_count() <= radius
+            )
+            scan_samples.append(time.perf_counter() - start)
+            found = sorted(int(m.fingerprint.check_id[3:]) for m in index.search(query))
+            assert found == expected, f"index returned {found}, scan found {expected}"
+
+        us = 1_000_000
+        print(
+            f"{size:>8} {build:>7.2f}s"
+            f" {percentile(timings['dup'], 50) * us:>7.1f}us {percentile(timings['dup'], 99) * us:>7.1f}us"
+            f" {percentile(timings['fresh'], 50) * us:>8.1f}us {percentile(timings['fresh'], 99) * us:>8.1f}us"
+            f" {statistics.median(scan_samples) * 1000:>9.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
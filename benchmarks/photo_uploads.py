@@ -0,0 +1,98 @@
+"""
+Photo Upload Benchmark
+
+Pushes concurrent 5MP camera shots through the quality check photo
+pipeline (spool to disk, resize and re-encode in the process pool) and
+reports, per concurrency level:
+- Photos per second, and per worker process
+- Worst event loop stall while photos were processing
+- Peak RSS of the API process and of the worker processes
+
+Storage upload is not included; it is network-bound and streamed.
+"""
+
+import asyncio
+import io
+import os
+import resource
+import tempfile
+import time
+
+from fastapi import UploadFile
+from PIL import Image
+
+from app.config import settings
+from app.services import photos
+
+CONCURRENCY = (1, 4, 16)
+PHOTOS_PER_LEVEL = 32
+
+
+def camera_shot() -> bytes:
+    """A 2592x1944 (5MP) JPEG with enough detail to be realistic to decode."""
+    image = Image.effect_mandelbrot((2592, 1944), (-2.0, -1.2, 1.0, 1.2), 64).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=92)
+    return buffer.getvalue()
+
+
+async def loop_lag(stop: asyncio.Event) -> float:
+    """Largest delay seen by a 10ms ticker (how long the loop was blocked)."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        worst = max(worst, time.perf_counter() - start - 0.01)
+    return worst
+
+
+async def upload_one(data: bytes, limit: asyncio.Semaphore) -> None:
+    async with limit:
+        upload = UploadFile(file=io.BytesIO(data), filename="check.jpg")
+        fd, dst = tempfile.mkstemp(suffix=".jpg")
+        os.close(fd)
+        try:
+            await photos.process_upload(upload, dst)
+        finally:
+            os.unlink(dst)
+
+
+def peak_rss_mb(who: int) -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+async def main():
+    data = camera_shot()
+    print(f"Input: {len(data) / 1024:.0f} KiB JPEG, {settings.PHOTO_WORKERS} worker processes")
+
+    # Warm the pool so process start-up isn't counted
+    await upload_one(data, asyncio.Semaphore(1))
+
+    print(f"{'concurrent':>10} {'photos/s':>9} {'per worker':>11} {'max loop stall':>15}")
+    for concurrency in CONCURRENCY:
+        limit = asyncio.Semaphore(concurrency)
+        stop = asyncio.Event()
+        lag = asyncio.create_task(loop_lag(stop))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(upload_one(data, limit) for _ in range(PHOTOS_PER_LEVEL)))
+        elapsed = time.perf_counter() - start
+
+        stop.set()
+        stall_ms = await lag * 1000
+        rate = PHOTOS_PER_LEVEL / elapsed
+        print(
+            f"{concurrency:>10} {rate:>9.1f} {rate / settings.PHOTO_WORKERS:>11.1f}"
+            f" {stall_ms:>12.1f} ms"
+        )
+
+    photos.shutdown_pool()
+    print(
+        f"Peak RSS: API process {peak_rss_mb(resource.RUSAGE_SELF):.0f} MiB, "
+        f"largest worker {peak_rss_mb(resource.RUSAGE_CHILDREN):.0f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
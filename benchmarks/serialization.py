@@ -0,0 +1,113 @@
+"""
+Serialization Benchmark
+
+What it costs to send 10k transactions (GET /api/transactions/ at a
+large `limit`), through a FastAPI app over an ASGI transport:
+- response_model: dicts returned as-is, validated and serialized by FastAPI
+- fast_list: the same rows through app.utils.responses.fast_list (orjson,
+  no re-validation), with DEBUG off as in production
+- fast_list + gzip: the same, with CompressionMiddleware and a client
+  sending Accept-Encoding: gzip (brotli too, if installed)
+
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --rows 50000
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+import httpx
+from fastapi import FastAPI
+
+from app.config import settings
+from app.routers.transactions import Transaction
+from app.utils.responses import CompressionMiddleware, brotli, fast_list
+
+ROUNDS = 5
+
+
+def fake_transactions(count: int) -> List[Dict[str, Any]]:
+    start = datetime(2024, 6, 1, 11, tzinfo=timezone.utc)
+    return [
+        {
+            "id": f"txn_{i}",
+            "square_id": f"sq_{i:08x}",
+            "cart_id": f"cart_{i % 6}",
+            "location_id": f"loc_{i % 4}",
+            "amount": 10.0 + (i % 7) * 4.5,
+            "items": [
+                {"name": "Dirty Water Dog", "quantity": 1 + i % 3, "price": 10.00},
+                {"name": "Soda", "quantity": 1, "price": 2.50},
+            ],
+            "timestamp": start + timedelta(seconds=37 * i),
+            "payment_method": "card" if i % 5 else "cash",
+        }
+        for i in range(count)
+    ]
+
+
+def bench_app(rows: List[Dict[str, Any]], minimum_size: int) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=minimum_size)
+
+    @app.get("/validated", response_model=List[Transaction])
+    async def validated():
+        return rows
+
+    @app.get("/fast", response_model=List[Transaction])
+    async def fast():
+        return fast_list(rows, Transaction)
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, encoding: str) -> Dict[str, Any]:
+    """Best-of-ROUNDS time, and the bytes on the wire."""
+    best, size = float("inf"), 0
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        # Stream, so httpx doesn't spend time decompressing inside the timing
+        async with client.stream("GET", path, headers={"Accept-Encoding": encoding}) as response:
+            body = b"".join([chunk async for chunk in response.aiter_raw()])
+        best = min(best, time.perf_counter() - start)
+        size = len(body)
+        assert response.status_code == 200, response.status_code
+    return {"ms": best * 1000, "bytes": size}
+
+
+async def main(args: argparse.Namespace) -> None:
+    settings.DEBUG = False  # fast_list checks rows against the model in DEBUG
+    rows = fake_transactions(args.rows)
+    app = bench_app(rows, settings.COMPRESSION_MIN_BYTES)
+    cases = [
+        ("response_model", "/validated", "identity"),
+        ("fast_list", "/fast", "identity"),
+        ("fast_list + gzip", "/fast", "gzip"),
+    ]
+    if brotli is not None:
+        cases.append(("fast_list + brotli", "/fast", "br"))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        results = [(name, await measure(client, path, encoding)) for name, path, encoding in cases]
+
+    per_10k = 10_000 / args.rows
+    baseline = results[0][1]["ms"]
+    print(f"{args.rows:,} transactions, best of {ROUNDS}\n")
+    print(f"{'':<20} {'ms / 10k':>10} {'speedup':>8} {'KB':>8}")
+    for name, result in results:
+        print(
+            f"{name:<20} {result['ms'] * per_10k:>10.1f} "
+            f"{baseline / result['ms']:>7.1f}x {result['bytes'] / 1024:>8.0f}"
+        )
+    if brotli is None:
+        print("\n(brotli not installed: gzip only)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000, help="Transactions per response")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,47 @@
+-- FoodCartOS GPS Trajectories (Compacted Location History)
+-- Run after 002_row_level_security.sql
+-- Raw gps_pings older than GPS_FULL_RESOLUTION_DAYS are simplified into
+-- one row per cart per day by app/services/trajectory.py
+
+SET search_path TO foodcartos, public;
+
+-- ===========================================
+-- GPS TRAJECTORIES
+-- ===========================================
+
+CREATE TABLE foodcartos.gps_trajectories (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    org_id UUID REFERENCES foodcartos.organizations(id) ON DELETE CASCADE,
+    cart_id UUID REFERENCES foodcartos.carts(id) ON DELETE CASCADE,
+    date DATE NOT NULL,
+    points JSONB NOT NULL,  -- [[lat, lng, unix_ts], ...] simplified track
+    point_count INTEGER NOT NULL,
+    raw_point_count INTEGER NOT NULL,  -- Pings the track was built from
+    distance_meters DECIMAL(10, 1),
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    UNIQUE(cart_id, date)  -- One track per cart per day
+);
+
+CREATE INDEX idx_gps_trajectories_org_id ON foodcartos.gps_trajectories(org_id);
+
+COMMENT ON TABLE foodcartos.gps_trajectories IS 'Simplified daily cart tracks (stationary runs collapsed, Douglas-Peucker)';
+
+-- Per-cart day scans for compaction and "latest fix" lookups
+CREATE INDEX idx_gps_pings_cart_timestamp ON foodcartos.gps_pings(cart_id, timestamp DESC);
+
+-- ===========================================
+-- ROW LEVEL SECURITY
+-- ===========================================
+
+ALTER TABLE foodcartos.gps_trajectories ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Owners/operators can view trajectories"
+ON foodcartos.gps_trajectories FOR SELECT
+USING (
+    org_id = foodcartos.get_user_org_id()
+    AND foodcartos.get_user_role() IN ('owner', 'operator')
+);
+
+CREATE POLICY "Service can create trajectories"
+ON foodcartos.gps_trajectories FOR INSERT
+WITH CHECK (TRUE);
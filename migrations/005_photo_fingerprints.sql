@@ -0,0 +1,21 @@
+-- FoodCartOS Reused Photo Detection
+-- Run after 004_photo_hashes.sql
+-- Perceptual hashes flag quality checks whose photo matches an earlier one
+
+SET search_path TO foodcartos, public;
+
+ALTER TABLE foodcartos.quality_checks
+    ADD COLUMN photo_dhash BIGINT,  -- 64-bit difference hash, stored signed
+    ADD COLUMN suspected_duplicate_of UUID REFERENCES foodcartos.quality_checks(id) ON DELETE SET NULL,
+    ADD COLUMN duplicate_distance SMALLINT;  -- Differing hash bits (0-64)
+
+-- Rebuilding an org's in-memory index (on its first submission after a restart) reads its recent hashes
+CREATE INDEX idx_quality_checks_org_timestamp ON foodcartos.quality_checks(org_id, timestamp)
+    WHERE photo_dhash IS NOT NULL;
+
+-- Owner review queue of suspicious submissions
+CREATE INDEX idx_quality_checks_suspected ON foodcartos.quality_checks(org_id)
+    WHERE suspected_duplicate_of IS NOT NULL;
+
+COMMENT ON COLUMN foodcartos.quality_checks.photo_dhash IS 'Perceptual difference hash of the photo; near-identical photos differ in few bits';
+COMMENT ON COLUMN foodcartos.quality_checks.suspected_duplicate_of IS 'Earlier check whose photo this one appears to reuse';
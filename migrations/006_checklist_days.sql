@@ -0,0 +1,44 @@
+-- FoodCartOS Daily Checklist State
+-- Run after 005_photo_fingerprints.sql
+-- One row per cart per day, maintained by app/services/checklist.py, so
+-- checklist reads never aggregate quality_checks
+
+SET search_path TO foodcartos, public;
+
+-- ===========================================
+-- QUALITY CHECKLIST DAYS
+-- ===========================================
+
+CREATE TABLE foodcartos.quality_checklist_days (
+    org_id UUID REFERENCES foodcartos.organizations(id) ON DELETE CASCADE,
+    cart_id UUID REFERENCES foodcartos.carts(id) ON DELETE CASCADE,
+    date DATE NOT NULL,
+    completed_mask BIGINT NOT NULL DEFAULT 0,  -- Bit i = check type i (organizations.settings -> quality -> check_types)
+    check_counts INTEGER[] NOT NULL DEFAULT '{}',  -- Non-rejected checks per bit
+    completion_time TIMESTAMPTZ,  -- When every required check was first covered
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (cart_id, date)
+);
+
+CREATE INDEX idx_quality_checklist_days_org_date ON foodcartos.quality_checklist_days(org_id, date);
+
+COMMENT ON TABLE foodcartos.quality_checklist_days IS 'Per-cart daily checklist completion bitmask';
+
+-- ===========================================
+-- ROW LEVEL SECURITY
+-- ===========================================
+
+ALTER TABLE foodcartos.quality_checklist_days ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view checklist days in their org"
+ON foodcartos.quality_checklist_days FOR SELECT
+USING (org_id = foodcartos.get_user_org_id());
+
+-- Submissions (employees) and reviews (owners) both move the mask
+CREATE POLICY "Users can record checklist progress in their org"
+ON foodcartos.quality_checklist_days FOR INSERT
+WITH CHECK (org_id = foodcartos.get_user_org_id());
+
+CREATE POLICY "Users can update checklist progress in their org"
+ON foodcartos.quality_checklist_days FOR UPDATE
+USING (org_id = foodcartos.get_user_org_id());
@@ -0,0 +1,11 @@
+-- FoodCartOS Content-Addressed Photos
+-- Run after 003_gps_trajectories.sql
+-- Quality check photos are stored under the SHA-256 of their bytes
+
+SET search_path TO foodcartos, public;
+
+ALTER TABLE foodcartos.quality_checks ADD COLUMN photo_hash TEXT;
+
+CREATE INDEX idx_quality_checks_photo_hash ON foodcartos.quality_checks(photo_hash);
+
+COMMENT ON COLUMN foodcartos.quality_checks.photo_hash IS 'SHA-256 of the stored JPEG (storage key); identical photos share one object';
@@ -0,0 +1,13 @@
+-- FoodCartOS Quality Score Records
+-- Run after 006_checklist_days.sql
+-- Checklist days record who ran the cart, making each row an employee's
+-- daily score record for app/services/quality_scores.py
+
+SET search_path TO foodcartos, public;
+
+ALTER TABLE foodcartos.quality_checklist_days
+    ADD COLUMN employee_id UUID REFERENCES foodcartos.users(id);
+
+-- Rebuilding leaderboards and streaks reads an org's recent days by employee
+CREATE INDEX idx_quality_checklist_days_employee_date
+    ON foodcartos.quality_checklist_days(employee_id, date);
@@ -0,0 +1,301 @@
+-- FoodCartOS Row Level Security Performance
+-- Run after 007_checklist_employee.sql
+-- The 002 helpers are VOLATILE plpgsql (SECURITY DEFINER), so Postgres
+-- calls them, and re-parses the JWT, for every row a policy checks.
+-- Here they become STABLE SQL functions the planner can inline, and every
+-- policy calls them as a scalar subquery, (SELECT foodcartos.get_user_org_id()),
+-- which is planned as an InitPlan: evaluated once per statement, then
+-- compared like a constant, so (org_id, timestamp) indexes can be used.
+
+SET search_path TO foodcartos, public;
+
+-- ===========================================
+-- HELPER FUNCTIONS
+-- ===========================================
+
+-- No SECURITY DEFINER or SET clauses: either would prevent inlining.
+-- auth.jwt() reads request.jwt.claims and needs no extra privileges.
+
+CREATE OR REPLACE FUNCTION foodcartos.get_user_org_id()
+RETURNS UUID AS $$
+    SELECT (auth.jwt()->>'org_id')::UUID
+$$ LANGUAGE sql STABLE SECURITY INVOKER;
+
+CREATE OR REPLACE FUNCTION foodcartos.get_user_role()
+RETURNS TEXT AS $$
+    SELECT auth.jwt()->>'role'
+$$ LANGUAGE sql STABLE SECURITY INVOKER;
+
+CREATE OR REPLACE FUNCTION foodcartos.get_user_id()
+RETURNS UUID AS $$
+    SELECT (auth.jwt()->>'sub')::UUID
+$$ LANGUAGE sql STABLE SECURITY INVOKER;
+
+-- ===========================================
+-- ORGANIZATIONS POLICIES
+-- ===========================================
+
+DROP POLICY "Users can view own organization" ON foodcartos.organizations;
+CREATE POLICY "Users can view own organization"
+ON foodcartos.organizations FOR SELECT
+USING (id = (SELECT foodcartos.get_user_org_id()));
+
+DROP POLICY "Owners can update own organization" ON foodcartos.organizations;
+CREATE POLICY "Owners can update own organization"
+ON foodcartos.organizations FOR UPDATE
+USING (
+    id = (SELECT foodcartos.get_user_org_id())
+    AND (SELECT foodcartos.get_user_role()) = 'owner'
+);
+
+-- ===========================================
+-- USERS POLICIES
+-- ===========================================
+
+DROP POLICY "Users can view org members" ON foodcartos.users;
+CREATE POLICY "Users can view org members"
+ON foodcartos.users FOR SELECT
+USING (org_id = (SELECT foodcartos.get_user_org_id()));
+
+DROP POLICY "Owners can create users" ON foodcartos.users;
+CREATE POLICY "Owners can create users"
+ON foodcartos.users FOR INSERT
+WITH CHECK (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (SELECT foodcartos.get_user_role()) = 'owner'
+);
+
+DROP POLICY "Users can update" ON foodcartos.users;
+CREATE POLICY "Users can update"
+ON foodcartos.users FOR UPDATE
+USING (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (
+        (SELECT foodcartos.get_user_role()) = 'owner'
+        OR id = (SELECT foodcartos.get_user_id())
+    )
+);
+
+DROP POLICY "Owners can delete users" ON foodcartos.users;
+CREATE POLICY "Owners can delete users"
+ON foodcartos.users FOR DELETE
+USING (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (SELECT foodcartos.get_user_role()) = 'owner'
+);
+
+-- ===========================================
+-- LOCATIONS POLICIES
+-- ===========================================
+
+DROP POLICY "Org members can view locations" ON foodcartos.locations;
+CREATE POLICY "Org members can view locations"
+ON foodcartos.locations FOR SELECT
+USING (org_id = (SELECT foodcartos.get_user_org_id()));
+
+DROP POLICY "Owners/operators can create locations" ON foodcartos.locations;
+CREATE POLICY "Owners/operators can create locations"
+ON foodcartos.locations FOR INSERT
+WITH CHECK (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (SELECT foodcartos.get_user_role()) IN ('owner', 'operator')
+);
+
+DROP POLICY "Owners/operators can update locations" ON foodcartos.locations;
+CREATE POLICY "Owners/operators can update locations"
+ON foodcartos.locations FOR UPDATE
+USING (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (SELECT foodcartos.get_user_role()) IN ('owner', 'operator')
+);
+
+-- ===========================================
+-- CARTS POLICIES
+-- ===========================================
+
+DROP POLICY "Org members can view carts" ON foodcartos.carts;
+CREATE POLICY "Org members can view carts"
+ON foodcartos.carts FOR SELECT
+USING (org_id = (SELECT foodcartos.get_user_org_id()));
+
+DROP POLICY "Owners can create carts" ON foodcartos.carts;
+CREATE POLICY "Owners can create carts"
+ON foodcartos.carts FOR INSERT
+WITH CHECK (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (SELECT foodcartos.get_user_role()) = 'owner'
+);
+
+DROP POLICY "Owners can update carts" ON foodcartos.carts;
+CREATE POLICY "Owners can update carts"
+ON foodcartos.carts FOR UPDATE
+USING (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (SELECT foodcartos.get_user_role()) = 'owner'
+);
+
+-- ===========================================
+-- DAILY ASSIGNMENTS POLICIES
+-- ===========================================
+
+DROP POLICY "Org members can view assignments" ON foodcartos.daily_assignments;
+CREATE POLICY "Org members can view assignments"
+ON foodcartos.daily_assignments FOR SELECT
+USING (org_id = (SELECT foodcartos.get_user_org_id()));
+
+DROP POLICY "Owners/operators can create assignments" ON foodcartos.daily_assignments;
+CREATE POLICY "Owners/operators can create assignments"
+ON foodcartos.daily_assignments FOR INSERT
+WITH CHECK (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (SELECT foodcartos.get_user_role()) IN ('owner', 'operator')
+);
+
+DROP POLICY "Authorized users can update assignments" ON foodcartos.daily_assignments;
+CREATE POLICY "Authorized users can update assignments"
+ON foodcartos.daily_assignments FOR UPDATE
+USING (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (
+        (SELECT foodcartos.get_user_role()) IN ('owner', 'operator')
+        OR employee_id = (SELECT foodcartos.get_user_id())
+    )
+);
+
+-- ===========================================
+-- TRANSACTIONS POLICIES
+-- ===========================================
+
+DROP POLICY "Users can view authorized transactions" ON foodcartos.transactions;
+CREATE POLICY "Users can view authorized transactions"
+ON foodcartos.transactions FOR SELECT
+USING (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (
+        (SELECT foodcartos.get_user_role()) = 'owner'
+        OR cart_id IN (
+            SELECT cart_id FROM foodcartos.daily_assignments
+            WHERE employee_id = (SELECT foodcartos.get_user_id())
+        )
+    )
+);
+
+-- ===========================================
+-- QUALITY CHECKS POLICIES
+-- ===========================================
+
+DROP POLICY "Users can view quality checks" ON foodcartos.quality_checks;
+CREATE POLICY "Users can view quality checks"
+ON foodcartos.quality_checks FOR SELECT
+USING (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (
+        (SELECT foodcartos.get_user_role()) IN ('owner', 'operator')
+        OR employee_id = (SELECT foodcartos.get_user_id())
+    )
+);
+
+DROP POLICY "Employees can create quality checks" ON foodcartos.quality_checks;
+CREATE POLICY "Employees can create quality checks"
+ON foodcartos.quality_checks FOR INSERT
+WITH CHECK (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND employee_id = (SELECT foodcartos.get_user_id())
+);
+
+DROP POLICY "Owners can update quality checks" ON foodcartos.quality_checks;
+CREATE POLICY "Owners can update quality checks"
+ON foodcartos.quality_checks FOR UPDATE
+USING (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (SELECT foodcartos.get_user_role()) = 'owner'
+);
+
+-- ===========================================
+-- GPS POLICIES
+-- ===========================================
+
+DROP POLICY "Owners/operators can view GPS" ON foodcartos.gps_pings;
+CREATE POLICY "Owners/operators can view GPS"
+ON foodcartos.gps_pings FOR SELECT
+USING (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (SELECT foodcartos.get_user_role()) IN ('owner', 'operator')
+);
+
+DROP POLICY "Owners/operators can view trajectories" ON foodcartos.gps_trajectories;
+CREATE POLICY "Owners/operators can view trajectories"
+ON foodcartos.gps_trajectories FOR SELECT
+USING (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (SELECT foodcartos.get_user_role()) IN ('owner', 'operator')
+);
+
+-- ===========================================
+-- SMS POLICIES
+-- ===========================================
+
+DROP POLICY "Owners/operators can view subscribers" ON foodcartos.sms_subscribers;
+CREATE POLICY "Owners/operators can view subscribers"
+ON foodcartos.sms_subscribers FOR SELECT
+USING (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (SELECT foodcartos.get_user_role()) IN ('owner', 'operator')
+);
+
+DROP POLICY "Owners/operators can manage subscribers" ON foodcartos.sms_subscribers;
+CREATE POLICY "Owners/operators can manage subscribers"
+ON foodcartos.sms_subscribers FOR ALL
+USING (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (SELECT foodcartos.get_user_role()) IN ('owner', 'operator')
+);
+
+DROP POLICY "Owners can view messages" ON foodcartos.sms_messages;
+CREATE POLICY "Owners can view messages"
+ON foodcartos.sms_messages FOR SELECT
+USING (
+    org_id = (SELECT foodcartos.get_user_org_id())
+    AND (SELECT foodcartos.get_user_role()) = 'owner'
+);
+
+-- ===========================================
+-- QUALITY CHECKLIST DAYS POLICIES
+-- ===========================================
+
+DROP POLICY "Users can view checklist days in their org" ON foodcartos.quality_checklist_days;
+CREATE POLICY "Users can view checklist days in their org"
+ON foodcartos.quality_checklist_days FOR SELECT
+USING (org_id = (SELECT foodcartos.get_user_org_id()));
+
+DROP POLICY "Users can record checklist progress in their org" ON foodcartos.quality_checklist_days;
+CREATE POLICY "Users can record checklist progress in their org"
+ON foodcartos.quality_checklist_days FOR INSERT
+WITH CHECK (org_id = (SELECT foodcartos.get_user_org_id()));
+
+DROP POLICY "Users can update checklist progress in their org" ON foodcartos.quality_checklist_days;
+CREATE POLICY "Users can update checklist progress in their org"
+ON foodcartos.quality_checklist_days FOR UPDATE
+USING (org_id = (SELECT foodcartos.get_user_org_id()));
+
+-- ===========================================
+-- INDEXES
+-- ===========================================
+
+-- Every policy filters on org_id and analytics filter on time, so a
+-- composite index serves both; the single-column org_id indexes it
+-- makes redundant are dropped to keep writes cheap.
+CREATE INDEX idx_transactions_org_timestamp ON foodcartos.transactions(org_id, timestamp);
+DROP INDEX foodcartos.idx_transactions_org_id;
+
+CREATE INDEX idx_gps_pings_org_timestamp ON foodcartos.gps_pings(org_id, timestamp);
+
+CREATE INDEX idx_sms_messages_org_created_at ON foodcartos.sms_messages(org_id, created_at);
+DROP INDEX foodcartos.idx_sms_messages_org_id;
+
+CREATE INDEX idx_assignments_org_date ON foodcartos.daily_assignments(org_id, date);
+DROP INDEX foodcartos.idx_assignments_org_id;
+
+-- The employee branch of the transactions policy looks up assigned carts
+CREATE INDEX idx_assignments_employee_cart ON foodcartos.daily_assignments(employee_id, cart_id);
+DROP INDEX foodcartos.idx_assignments_employee_id;
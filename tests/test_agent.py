@@ -0,0 +1,167 @@
+"""Cart agent: offline queue and sync against a stub API."""
+
+import io
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, List, Sequence
+
+import httpx
+import pytest
+
+from agent.__main__ import enqueue
+from agent.offline_queue import OfflineQueue
+from agent.sync import SyncFailed, Syncer
+
+
+class StubAPI:
+    """Stands in for POST /webhooks/agent/sync; answers from a list of status codes."""
+
+    def __init__(self, statuses: Sequence[int] = ()):
+        self.statuses = list(statuses)
+        self.requests: List[Dict[str, Any]] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/webhooks/agent/sync"
+        body = json.loads(request.content)
+        self.requests.append(body)
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status == 429:
+            return httpx.Response(429, headers={"Retry-After": "30"})
+        if status != 200:
+            return httpx.Response(status)
+        return httpx.Response(200, json={"status": "ok", "records_processed": len(body["data"])})
+
+
+@pytest.fixture
+def queue():
+    queue = OfflineQueue(":memory:", max_size=100)
+    yield queue
+    queue.close()
+
+
+def make_syncer(queue: OfflineQueue, api: StubAPI, batch_size: int = 10) -> Syncer:
+    client = httpx.Client(transport=httpx.MockTransport(api), base_url="http://api")
+    return Syncer(
+        queue,
+        client,
+        "pi_test",
+        interval=60,
+        batch_size=batch_size,
+        batch_bytes=64 * 1024,
+        backoff=2,
+        backoff_max=600,
+    )
+
+
+def pings(count: int) -> List[Dict[str, Any]]:
+    return [{"latitude": 38.35 + i / 1e4, "longitude": -121.98} for i in range(count)]
+
+
+def test_sync_sends_every_table_in_batches(queue):
+    queue.add("location_pings", pings(25))
+    queue.add("transactions", [{"square_id": "sq_1", "amount": 12.5, "items": [{"name": "Soda"}]}])
+    api = StubAPI()
+
+    assert make_syncer(queue, api).sync_once() == 26
+    assert [(body["type"], len(body["data"])) for body in api.requests] == [
+        ("transactions", 1),
+        ("gps", 10),
+        ("gps", 10),
+        ("gps", 5),
+    ]
+    assert api.requests[0]["data"][0]["items"] == [{"name": "Soda"}]
+    assert queue.pending_count() == 0
+
+
+def test_failed_batch_stays_queued(queue):
+    queue.add("location_pings", pings(15))
+    api = StubAPI([200, 500])
+    syncer = make_syncer(queue, api)
+
+    with pytest.raises(SyncFailed):
+        syncer.sync_once()
+    assert queue.pending_count() == 5
+
+    assert syncer.sync_once() == 5
+    assert api.requests[1]["data"] == api.requests[2]["data"]
+
+
+def test_partial_ack_is_a_failure(queue):
+    queue.add("location_pings", pings(3))
+    syncer = make_syncer(queue, StubAPI())
+    syncer.client = httpx.Client(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, json={})),
+        base_url="http://api",
+    )
+
+    with pytest.raises(SyncFailed):
+        syncer.sync_once()
+    assert queue.pending_count() == 3
+
+
+def test_backoff_respects_retry_after(queue):
+    queue.add("location_pings", pings(1))
+    syncer = make_syncer(queue, StubAPI([429]))
+
+    with pytest.raises(SyncFailed) as failed:
+        syncer.sync_once()
+    syncer.failures = 1
+    assert syncer.next_delay(failed.value.retry_after) == 30
+    syncer.failures = 0
+    assert syncer.next_delay() == 60
+
+
+def test_eviction_keeps_transactions_longest(queue):
+    queue.max_size = 10
+    queue.add("transactions", [{"square_id": f"sq_{i}", "amount": 10} for i in range(4)])
+    queue.add("location_pings", pings(4))
+    make_syncer(queue, StubAPI()).sync_once()
+    queue.add("location_pings", pings(6))  # 14 rows: the 8 synced ones go first
+    assert queue.evicted == 0
+    assert queue.pending_count() == 6
+
+    queue.add("transactions", [{"square_id": f"sq_new_{i}", "amount": 10} for i in range(6)])
+    assert queue.evicted == 2
+    assert [record["square_id"] for record in queue.pending("transactions", 10, 64 * 1024)] == [
+        f"sq_new_{i}" for i in range(6)
+    ]
+    assert len(queue.pending("location_pings", 10, 64 * 1024)) == 4
+
+
+def test_enqueue_reads_json_lines(queue):
+    lines = io.StringIO('{"latitude": 38.35, "longitude": -121.98}\n\nnot json\n[1]\n')
+
+    assert enqueue(queue, "location_pings", lines) == 2
+    [record] = queue.pending("location_pings", 10, 64 * 1024)
+    assert record["latitude"] == 38.35
+    assert record["timestamp"]
+
+
+def test_queue_error_backs_off(queue, monkeypatch):
+    syncer = make_syncer(queue, StubAPI())
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(queue, "pending", locked)
+    stop = threading.Event()
+    delays = []
+
+    def wait(delay):
+        delays.append(delay)
+        stop.set()
+
+    monkeypatch.setattr(stop, "wait", wait)
+    syncer.run(stop)
+    assert syncer.failures == 1
+    assert 1 <= delays[0] <= 2
+
+
+def test_enqueue_rejects_unstorable_values(queue):
+    lines = io.StringIO('{"latitude": {"deg": 38}, "longitude": -121.98}\n{"latitude": 38.35}\n')
+
+    assert enqueue(queue, "location_pings", lines) == 1
+    assert [record["latitude"] for record in queue.pending("location_pings", 10, 64 * 1024)] == [
+        38.35
+    ]